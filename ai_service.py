@@ -1,89 +1,231 @@
 from groq import Groq
+import contextvars
+import hashlib
 import logging
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import metrics
+import tracing
+from cache import MemoryCache, SQLiteCache
 from config import Config
+from breaker import CircuitOpenError, get_circuit_breaker
+from governor import UpstreamOverloadedError, get_upstream_governor
+from prompt_budget import estimate_tokens, fit_resume, get_prompt_budget_stats
+from token_policy import get_output_policy
+from retry import DeadlineExceededError, LatencyTracker, RetryPolicy
 import time
 
 logger = logging.getLogger(__name__)
 
-class ResumeRoaster:
-    """Handle AI interactions for resume roasting."""
-    
-    def __init__(self):
-        self.client = Groq(api_key=Config.GROQ_API_KEY)
-        self.model = Config.GROQ_MODEL
-        
-    def generate_roast(self, resume_text, roast_type="standard"):
-        """Generate a roast based on the resume text."""
+# Bump whenever a prompt changes so stale cached responses are never served
+PROMPT_VERSION = "2"
+
+ROAST_SYSTEM_PROMPT = "You are a witty and creative resume critic. Your job is to provide humorous but constructive feedback on resumes. Be clever and entertaining while pointing out areas for improvement."
+IMPROVE_SYSTEM_PROMPT = "You are a professional career counselor and resume expert. Provide detailed, actionable advice to help job seekers improve their resumes."
+ANALYZE_SYSTEM_PROMPT = "You are a witty and creative resume critic who is also a professional career counselor. First roast the resume with humorous but constructive feedback, then give detailed, actionable advice to improve it."
+
+# Section markers for the combined roast + suggestions response
+ROAST_MARKER = "===ROAST==="
+SUGGESTIONS_MARKER = "===SUGGESTIONS==="
+_SECTION_PATTERN = re.compile(r'^[#*\s]*={3}\s*(ROAST|SUGGESTIONS)\s*={3}[*\s]*$', re.IGNORECASE | re.MULTILINE)
+
+def parse_analysis(text):
+    """Split a combined response into (roast, suggestions); a missing part is None.
+
+    When the model leaves out the ROAST marker, the text before the first
+    marker (all of it, if there is none) is taken as the roast.
+    """
+    text = text or ""
+    matches = list(_SECTION_PATTERN.finditer(text))
+    sections = {}
+    if not any(match.group(1).lower() == 'roast' for match in matches):
+        sections['roast'] = text[:matches[0].start() if matches else len(text)].strip() or None
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections[match.group(1).lower()] = text[match.end():end].strip() or None
+    return sections.get('roast'), sections.get('suggestions')
+
+def analysis_has_roast(text):
+    """Whether a combined response is worth caching: retries of one without a roast must reach the model."""
+    return parse_analysis(text)[0] is not None
+
+class DegradedResponse(str):
+    """Template text served in place of a model response while the AI service is down."""
+
+    degraded = True
+
+def is_degraded(*outputs):
+    """Whether any of the outputs is a template served while the AI service was down."""
+    return any(isinstance(output, DegradedResponse) for output in outputs)
+
+FALLBACK_NOTICE = "⚠️ Template response: our AI roaster is temporarily unavailable, so this is not a personalised review. Please try again in a few minutes.\n\n"
+
+def fallback_roast(resume_text, roast_type="standard"):
+    """Clearly-labelled canned roast used while the circuit breaker is open."""
+    return DegradedResponse(
+        FALLBACK_NOTICE +
+        f"🔥 Mock Roast ({roast_type} style):\n\nWell, well, well... someone decided to share their resume! "
+        f"While the roasting AI is catching its breath, we can tell you that any resume submitted here shows "
+        f"courage. That's already better than most! Your {len(resume_text)} characters of professional history "
+        f"await proper roasting once the AI is back. For now, consider this a gentle warm-up! 😊"
+    )
+
+def fallback_suggestions(resume_text):
+    """Clearly-labelled generic advice used while the circuit breaker is open."""
+    return DegradedResponse(
+        FALLBACK_NOTICE +
+        "General resume tips while you wait:\n\n"
+        "1. Lead each role with measurable achievements rather than duties.\n"
+        "2. Keep formatting simple (standard headings, no tables or text boxes) so ATS software can read it.\n"
+        "3. Mirror the skills and keywords from the job descriptions you are targeting.\n"
+        "4. Keep it to one or two pages and cut anything older than 10-15 years unless it is essential.\n"
+        "5. Proofread, then ask someone else to proofread."
+    )
+
+def make_cache_key(resume_text, roast_type, model, temperature, max_tokens, prompt_version=PROMPT_VERSION):
+    """Build a content-addressed key for a generation request."""
+    parts = [prompt_version, model, roast_type, repr(float(temperature)), str(max_tokens), resume_text]
+    return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+
+def create_cache(backend=None):
+    """Create the response cache selected by Config.CACHE_BACKEND."""
+    backend = (backend or Config.CACHE_BACKEND).lower()
+    if backend == 'memory':
+        return MemoryCache()
+    if backend == 'sqlite':
         try:
-            prompt = self._build_prompt(resume_text, roast_type)
-            
-            start_time = time.time()
-            
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a witty and creative resume critic. Your job is to provide humorous but constructive feedback on resumes. Be clever and entertaining while pointing out areas for improvement."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                model=self.model,
-                temperature=Config.MODEL_TEMPERATURE,
-                max_tokens=Config.MAX_TOKENS,
-                top_p=1,
-                stop=None,
-                stream=False,
-            )
-            
-            processing_time = time.time() - start_time
-            logger.info(f"Roast generated in {processing_time:.2f} seconds")
-            
-            if chat_completion.choices:
-                return chat_completion.choices[0].message.content
+            return SQLiteCache()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Falling back to in-memory response cache: {str(e)}")
+            return MemoryCache()
+    return None
+
+class _InFlightCall:
+    """Result slot shared by every caller waiting on one upstream call."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run fn once per key at a time; concurrent callers share its outcome."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
             else:
-                raise ValueError("No response generated from AI model")
-                
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
         except Exception as e:
-            logger.error(f"Error generating roast: {str(e)}")
-            raise ValueError(f"Failed to generate roast: {str(e)}")
-    
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {'coalesced': self.coalesced, 'in_flight': len(self._calls)}
+
+class ResumePrompts:
+    """Prompt construction shared by the sync and async roasters.
+
+    Every builder fits the resume into PROMPT_TOKEN_BUDGET first; cache keys
+    stay on the sanitized text, which determines the fitted text.
+    """
+
+    @metrics.timed('prompt_build')
+    @tracing.traced('prompt_build')
     def _build_prompt(self, resume_text, roast_type):
         """Build the prompt based on roast type."""
-        
+        metrics.set_labels(roast_type=roast_type)
+        resume_text = fit_resume(resume_text)
+
         base_prompt = f"Here's a resume to analyze:\n\n{resume_text}\n\n"
-        
+
+        return base_prompt + self._roast_instructions(roast_type)
+
+    def _roast_instructions(self, roast_type):
+        """Return the roast-style instructions appended after the resume."""
         if roast_type == "gentle":
-            return base_prompt + """
+            return """
             Please provide a gentle, humorous critique of this resume. Be witty but kind, 
             pointing out areas for improvement with a light touch. Focus on constructive 
             feedback wrapped in humor.
             """
         elif roast_type == "savage":
-            return base_prompt + """
+            return """
             Absolutely roast this resume! Be brutally honest, hilariously harsh, and 
             creatively savage. Point out every flaw, gap, and questionable choice. 
             Don't hold back - make it funny but devastating.
             """
         elif roast_type == "professional":
-            return base_prompt + """
+            return """
             Provide a professional yet humorous analysis of this resume. Balance 
             constructive criticism with witty observations. Be clever and insightful 
             while maintaining a somewhat professional tone.
             """
         else:  # standard
-            return base_prompt + """
+            return """
             Roast this resume with a perfect balance of humor and insight. Be funny 
             and creative while pointing out flaws and areas for improvement. Make it 
             entertaining but genuinely helpful.
             """
-    
-    def generate_improvement_suggestions(self, resume_text):
-        """Generate constructive improvement suggestions."""
-        try:
-            prompt = f"""
+
+    @metrics.timed('prompt_build')
+    @tracing.traced('prompt_build')
+    def _build_analysis_prompt(self, resume_text, roast_type):
+        """Build the single prompt asking for both the roast and the suggestions."""
+        metrics.set_labels(roast_type=roast_type)
+        resume_text = fit_resume(resume_text)
+        return f"""Here's a resume to analyze:
+
+{resume_text}
+
+Reply in two parts. Start each part with its marker on a line of its own.
+
+{ROAST_MARKER}
+{" ".join(self._roast_instructions(roast_type).split())}
+
+{SUGGESTIONS_MARKER}
+Provide specific, actionable improvement suggestions, focusing on:
+1. Content improvements (missing sections, better descriptions)
+2. Formatting and structure suggestions
+3. Skills and experience presentation
+4. Industry-specific recommendations
+5. ATS (Applicant Tracking System) optimization tips
+
+Keep this part constructive and implementable, without the jokes.
+"""
+
+    @metrics.timed('prompt_build')
+    @tracing.traced('prompt_build')
+    def _build_improvement_prompt(self, resume_text):
+        """Build the prompt for improvement suggestions."""
+        resume_text = fit_resume(resume_text)
+        return f"""
             Please analyze this resume and provide specific, actionable improvement suggestions:
 
             {resume_text}
@@ -97,31 +239,504 @@ class ResumeRoaster:
 
             Provide concrete, implementable advice without being overly critical.
             """
-            
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a professional career counselor and resume expert. Provide detailed, actionable advice to help job seekers improve their resumes."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                model=self.model,
+
+    def _cache_key(self, resume_text, roast_type, temperature, max_tokens, model=None):
+        # max_tokens here is the configured budget, not the adaptive one, so keys stay stable
+        return make_cache_key(resume_text, roast_type, model or self.model, temperature, max_tokens)
+
+
+class ResumeRoaster(ResumePrompts):
+    """Handle AI interactions for resume roasting."""
+
+    def __init__(self, cache=None, governor=None, breaker=None, output_policy=None):
+        # Retries are handled by _call_upstream so they respect the request deadline
+        self.client = Groq(api_key=Config.GROQ_API_KEY, max_retries=0)
+        self.model = Config.GROQ_MODEL
+        self.cache = cache if cache is not None else create_cache()
+        self.governor = governor if governor is not None else get_upstream_governor()
+        self.breaker = breaker if breaker is not None else get_circuit_breaker()
+        self.output_policy = output_policy if output_policy is not None else get_output_policy()
+        self.single_flight = SingleFlight()
+        self._usage_lock = threading.Lock()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retry_policy = RetryPolicy()
+        self.latency = LatencyTracker()
+        self.hedge = Config.UPSTREAM_HEDGE
+        self._hedge_pool = None
+        self._fanout_pool = None
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    def generate_roast(self, resume_text, roast_type="standard", timeout=None):
+        """Generate a roast based on the resume text.
+
+        timeout is the deadline in seconds for the whole call, retries
+        included (defaults to Config.UPSTREAM_TIMEOUT_SECONDS).
+        """
+        try:
+            prompt = self._build_prompt(resume_text, roast_type)
+            budget = self.output_policy.choose('roast', roast_type, Config.MAX_TOKENS)
+
+            start_time = time.time()
+
+            roast = self._complete(
+                ROAST_SYSTEM_PROMPT,
+                prompt,
+                temperature=Config.MODEL_TEMPERATURE,
+                max_tokens=budget.max_tokens,
+                cache_key=self._cache_key(resume_text, roast_type, Config.MODEL_TEMPERATURE, Config.MAX_TOKENS,
+                                          budget.model),
+                timeout=timeout,
+                model=budget.model,
+                output_key=budget.key,
+            )
+
+            processing_time = time.time() - start_time
+            logger.info(f"Roast generated in {processing_time:.2f} seconds")
+
+            if roast is not None:
+                return roast
+            else:
+                raise ValueError("No response generated from AI model")
+
+        except CircuitOpenError:
+            if not Config.CIRCUIT_FALLBACK:
+                raise
+            logger.warning("AI service unavailable, serving template roast")
+            return fallback_roast(resume_text, roast_type)
+        except UpstreamOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating roast: {str(e)}")
+            raise ValueError(f"Failed to generate roast: {str(e)}")
+
+    def generate_analysis(self, resume_text, roast_type="standard", timeout=None):
+        """Generate the roast and the improvement suggestions in one model call.
+
+        The resume is sent once instead of twice. Returns a dict with 'roast'
+        and 'suggestions'; if the model leaves out the suggestions section they
+        are requested separately, within the same deadline.
+        """
+        deadline = self._deadline(timeout)
+        try:
+            prompt = self._build_analysis_prompt(resume_text, roast_type)
+            budget = self.output_policy.choose('analyze', roast_type, Config.MAX_TOKENS * 2)  # room for both parts
+
+            start_time = time.time()
+
+            response = self._complete(
+                ANALYZE_SYSTEM_PROMPT,
+                prompt,
+                temperature=Config.MODEL_TEMPERATURE,
+                max_tokens=budget.max_tokens,
+                cache_key=self._cache_key(resume_text, f"analyze:{roast_type}", Config.MODEL_TEMPERATURE,
+                                          Config.MAX_TOKENS * 2, budget.model),
+                timeout=self._remaining(deadline),
+                model=budget.model,
+                output_key=budget.key,
+                cacheable=analysis_has_roast,
+            )
+
+            processing_time = time.time() - start_time
+            logger.info(f"Analysis generated in {processing_time:.2f} seconds")
+
+            roast, suggestions = parse_analysis(response)
+            if roast is None:
+                raise ValueError("No response generated from AI model")
+            if suggestions is None:
+                logger.warning("Combined response had no suggestions section, requesting them separately")
+                suggestions = self.generate_improvement_suggestions(resume_text, timeout=self._remaining(deadline))
+
+            return {'roast': roast, 'suggestions': suggestions}
+
+        except CircuitOpenError:
+            if not Config.CIRCUIT_FALLBACK:
+                raise
+            logger.warning("AI service unavailable, serving template analysis")
+            return {'roast': fallback_roast(resume_text, roast_type), 'suggestions': fallback_suggestions(resume_text)}
+        except UpstreamOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating analysis: {str(e)}")
+            raise ValueError(f"Failed to analyze resume: {str(e)}")
+
+    def generate_roast_and_suggestions(self, resume_text, roast_type="standard", timeout=None):
+        """Run generate_roast and generate_improvement_suggestions concurrently.
+
+        Wall-clock time is that of the slower call rather than the sum of both.
+        Returns a dict with 'roast' and 'suggestions' (None for a side that
+        failed) and 'errors' mapping each failed side to its exception.
+        """
+        if self._fanout_pool is None:
+            with self._usage_lock:
+                if self._fanout_pool is None:
+                    self._fanout_pool = ThreadPoolExecutor(max_workers=Config.UPSTREAM_CONCURRENCY_MAX,
+                                                           thread_name_prefix='fanout')
+
+        # Run in a copy of this context so the suggestions call is counted in the request's metrics
+        suggestions_future = self._fanout_pool.submit(contextvars.copy_context().run,
+                                                      self.generate_improvement_suggestions, resume_text, timeout)
+        result = {'roast': None, 'suggestions': None, 'errors': {}}
+        try:
+            result['roast'] = self.generate_roast(resume_text, roast_type, timeout)
+        except Exception as e:
+            result['errors']['roast'] = e
+        try:
+            result['suggestions'] = suggestions_future.result()
+        except Exception as e:
+            result['errors']['suggestions'] = e
+        return result
+
+    def generate_improvement_suggestions(self, resume_text, timeout=None):
+        """Generate constructive improvement suggestions within an optional deadline."""
+        try:
+            prompt = self._build_improvement_prompt(resume_text)
+            budget = self.output_policy.choose('improve', None, Config.MAX_TOKENS)
+
+            suggestions = self._complete(
+                IMPROVE_SYSTEM_PROMPT,
+                prompt,
                 temperature=0.5,  # Lower temperature for more focused advice
-                max_tokens=Config.MAX_TOKENS,
-                top_p=1,
-                stop=None,
-                stream=False,
+                max_tokens=budget.max_tokens,
+                cache_key=self._cache_key(resume_text, "improve", 0.5, Config.MAX_TOKENS, budget.model),
+                timeout=timeout,
+                model=budget.model,
+                output_key=budget.key,
             )
-            
-            if chat_completion.choices:
-                return chat_completion.choices[0].message.content
+
+            if suggestions is not None:
+                return suggestions
             else:
                 raise ValueError("No suggestions generated from AI model")
-                
+
+        except CircuitOpenError:
+            if not Config.CIRCUIT_FALLBACK:
+                raise
+            logger.warning("AI service unavailable, serving template suggestions")
+            return fallback_suggestions(resume_text)
+        except UpstreamOverloadedError:
+            raise
         except Exception as e:
             logger.error(f"Error generating suggestions: {str(e)}")
             raise ValueError(f"Failed to generate suggestions: {str(e)}")
+
+    def stream_roast(self, resume_text, roast_type="standard", timeout=None):
+        """Generate a roast, yielding text chunks as the model produces them."""
+        try:
+            prompt = self._build_prompt(resume_text, roast_type)
+            budget = self.output_policy.choose('roast', roast_type, Config.MAX_TOKENS)
+            yield from self._stream_complete(
+                ROAST_SYSTEM_PROMPT,
+                prompt,
+                temperature=Config.MODEL_TEMPERATURE,
+                max_tokens=budget.max_tokens,
+                cache_key=self._cache_key(resume_text, roast_type, Config.MODEL_TEMPERATURE, Config.MAX_TOKENS,
+                                          budget.model),
+                timeout=timeout,
+                model=budget.model,
+                output_key=budget.key,
+            )
+        except CircuitOpenError:
+            if not Config.CIRCUIT_FALLBACK:
+                raise
+            logger.warning("AI service unavailable, serving template roast")
+            yield fallback_roast(resume_text, roast_type)
+        except UpstreamOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming roast: {str(e)}")
+            raise ValueError(f"Failed to generate roast: {str(e)}")
+
+    def stream_improvement_suggestions(self, resume_text, timeout=None):
+        """Generate improvement suggestions, yielding text chunks as they arrive."""
+        try:
+            prompt = self._build_improvement_prompt(resume_text)
+            budget = self.output_policy.choose('improve', None, Config.MAX_TOKENS)
+            yield from self._stream_complete(
+                IMPROVE_SYSTEM_PROMPT,
+                prompt,
+                temperature=0.5,
+                max_tokens=budget.max_tokens,
+                cache_key=self._cache_key(resume_text, "improve", 0.5, Config.MAX_TOKENS, budget.model),
+                timeout=timeout,
+                model=budget.model,
+                output_key=budget.key,
+            )
+        except CircuitOpenError:
+            if not Config.CIRCUIT_FALLBACK:
+                raise
+            logger.warning("AI service unavailable, serving template suggestions")
+            yield fallback_suggestions(resume_text)
+        except UpstreamOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming suggestions: {str(e)}")
+            raise ValueError(f"Failed to generate suggestions: {str(e)}")
+
+    def get_stats(self):
+        """Return counters for the layers wrapped around the model."""
+        return {
+            'cache': self.cache.stats() if self.cache else None,
+            'single_flight': self.single_flight.stats(),
+            'upstream': self.governor.stats(),
+            'upstream_calls': self.call_stats(),
+            'circuit': self.breaker.stats(),
+            'tokens': self.token_usage(),
+            'prompt_budget': get_prompt_budget_stats().stats(),
+            'output_lengths': self.output_policy.stats(),
+        }
+
+    def call_stats(self):
+        """Return retry and hedging counters for tuning the upstream settings."""
+        p95 = self.latency.percentile(95)
+        with self._usage_lock:
+            return {
+                'attempts': self.attempts,
+                'retries': self.retries,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'deadline_exceeded': self.deadline_exceeded,
+                'p95_latency_seconds': round(p95, 3) if p95 is not None else None,
+            }
+
+    def _count(self, counter):
+        with self._usage_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def token_usage(self):
+        """Return prompt and completion tokens reported by the model so far."""
+        with self._usage_lock:
+            return {'prompt_tokens': self.prompt_tokens, 'completion_tokens': self.completion_tokens}
+
+    def _record_usage(self, usage):
+        if usage is None:
+            return
+        metrics.add_tokens(usage.prompt_tokens, usage.completion_tokens)
+        with self._usage_lock:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+
+    def _deadline(self, timeout):
+        return time.monotonic() + (timeout or Config.UPSTREAM_TIMEOUT_SECONDS)
+
+    @tracing.traced('llm')
+    def _complete(self, system_prompt, prompt, temperature, max_tokens, cache_key=None, timeout=None,
+                  model=None, output_key=None, cacheable=None):
+        """Run one chat completion, serving repeated requests from the cache.
+
+        Identical requests that arrive while a call is in flight wait for it
+        and share its response instead of issuing their own. The completion
+        length is recorded under output_key for the adaptive max_tokens policy.
+        Responses cut off at max_tokens, or rejected by the optional
+        cacheable(content) predicate, are returned but not cached.
+        """
+        deadline = self._deadline(timeout)
+        tracing.set_attributes(model=model or self.model, max_tokens=max_tokens, output_key=output_key)
+        if cache_key and self.cache:
+            cached = self.cache.get(cache_key)
+            tracing.set_attributes(cache_hit=cached is not None)
+            if cached is not None:
+                logger.info("Serving response from cache")
+                return cached
+
+        def generate():
+            start_time = time.time()
+            chat_completion = self._call_upstream(system_prompt, prompt, temperature, max_tokens, deadline, model)
+            generation_time = time.time() - start_time
+            usage = getattr(chat_completion, 'usage', None)
+            self._record_usage(usage)
+
+            if not chat_completion.choices:
+                return None
+
+            choice = chat_completion.choices[0]
+            content = choice.message.content
+            truncated = getattr(choice, 'finish_reason', None) == 'length'
+            tracing.set_attributes(finish_reason=getattr(choice, 'finish_reason', None))
+            if usage is not None:
+                tracing.set_attributes(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+                self.output_policy.record(output_key, usage.completion_tokens, truncated)
+            # A truncated response reflects this call's adaptive max_tokens, which the key does not include
+            if cache_key and self.cache and content and not truncated and (cacheable is None or cacheable(content)):
+                self.cache.set(cache_key, content, generation_time)
+            return content
+
+        if not cache_key:
+            return generate()
+        return self.single_flight.do(cache_key, generate)
+
+    def _stream_complete(self, system_prompt, prompt, temperature, max_tokens, cache_key=None, timeout=None,
+                         model=None, output_key=None):
+        """Stream one chat completion; the assembled response is cached at the end unless truncated.
+
+        Failures before the first chunk are retried like non-streamed calls;
+        once text has been sent the error is passed on.
+        """
+        if cache_key and self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("Serving streamed response from cache")
+                yield cached
+                return
+
+        deadline = self._deadline(timeout)
+        start_time = time.time()
+        start_ns = time.time_ns()
+        parts = []
+        finish_reason = None
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                remaining = self._remaining(deadline)
+                # The slot is held until the stream is drained (or the client goes away)
+                with self.breaker.guard(), self.governor.slot(timeout=remaining):
+                    self._count('attempts')
+                    stream = self._create(system_prompt, prompt, temperature, max_tokens, stream=True,
+                                          timeout=self._remaining(deadline), model=model)
+                    for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        finish_reason = getattr(chunk.choices[0], 'finish_reason', None) or finish_reason
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+                break
+            except Exception as e:
+                if parts:
+                    raise
+                self._backoff(attempt, e, deadline)
+        generation_time = time.time() - start_time
+
+        content = "".join(parts)
+        if not content:
+            raise ValueError("No response generated from AI model")
+        logger.info(f"Streamed response completed in {generation_time:.2f} seconds")
+        # Streamed chunks carry no usage, so the lengths are estimated
+        completion_tokens = estimate_tokens(content)
+        metrics.add_stage('upstream', generation_time)
+        metrics.add_tokens(estimate_tokens(system_prompt) + estimate_tokens(prompt), completion_tokens)
+        # A span cannot be held open across the yields, so the stream is recorded once drained
+        tracing.add_span('upstream', start_ns, time.time_ns(), streamed=True, model=model or self.model,
+                         max_tokens=max_tokens, attempts=attempt, completion_tokens=completion_tokens,
+                         finish_reason=finish_reason)
+        if finish_reason == 'length':
+            # Estimates stay out of the length stats; a truncated stream is known to be max_tokens long
+            self.output_policy.record(output_key, max_tokens, True)
+        elif cache_key and self.cache:
+            self.cache.set(cache_key, content, generation_time)
+
+    @metrics.timed('upstream')
+    @tracing.traced('upstream')
+    def _call_upstream(self, system_prompt, prompt, temperature, max_tokens, deadline, model=None):
+        """Call the model, retrying transient errors with jittered backoff until the deadline."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if self.hedge:
+                    hedge_after = self.latency.percentile(Config.UPSTREAM_HEDGE_PERCENTILE,
+                                                          Config.UPSTREAM_HEDGE_MIN_SAMPLES)
+                    if hedge_after is not None:
+                        return self._hedged_create(system_prompt, prompt, temperature, max_tokens,
+                                                   deadline, hedge_after, model)
+                return self._timed_create(system_prompt, prompt, temperature, max_tokens, deadline, model)
+            except Exception as e:
+                self._backoff(attempt, e, deadline)
+
+    def _backoff(self, attempt, error, deadline):
+        """Sleep before the next attempt, or re-raise error if it should not be retried."""
+        if isinstance(error, UpstreamOverloadedError) or not self.retry_policy.should_retry(attempt, error):
+            raise error
+        delay = self.retry_policy.delay(attempt, error)
+        if time.monotonic() + delay >= deadline:
+            self._count('deadline_exceeded')
+            raise DeadlineExceededError() from error
+        self._count('retries')
+        logger.warning(f"Upstream call failed ({str(error)}), retrying in {delay:.2f}s")
+        time.sleep(delay)
+
+    def _remaining(self, deadline):
+        """Seconds left before the deadline; raise DeadlineExceededError if none."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._count('deadline_exceeded')
+            raise DeadlineExceededError()
+        return remaining
+
+    @tracing.traced('upstream.attempt')
+    def _timed_create(self, system_prompt, prompt, temperature, max_tokens, deadline, model=None):
+        """One governed, non-streamed request bounded by the deadline."""
+        remaining = self._remaining(deadline)
+        queued_ns = time.time_ns()
+        with self.breaker.guard(), self.governor.slot(timeout=remaining):
+            tracing.add_span('upstream.queue_wait', queued_ns, time.time_ns())
+            self._count('attempts')
+            start_time = time.monotonic()
+            chat_completion = self._create(system_prompt, prompt, temperature, max_tokens,
+                                           timeout=self._remaining(deadline), model=model)
+            self.latency.record(time.monotonic() - start_time)
+        return chat_completion
+
+    def _hedged_create(self, system_prompt, prompt, temperature, max_tokens, deadline, hedge_after, model=None):
+        """Send the request, plus a duplicate if it is still running after hedge_after seconds.
+
+        Whichever copy succeeds first wins; the other is left to finish in the background.
+        """
+        if self._hedge_pool is None:
+            with self._usage_lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(max_workers=Config.UPSTREAM_CONCURRENCY_MAX * 2,
+                                                          thread_name_prefix='hedge')
+
+        args = (system_prompt, prompt, temperature, max_tokens, deadline, model)
+        # The copies run in the request's context so their spans join its trace
+        primary = self._hedge_pool.submit(contextvars.copy_context().run, self._timed_create, *args)
+        done, _ = wait([primary], timeout=min(hedge_after, self._remaining(deadline)))
+        if done:
+            return primary.result()
+
+        self._count('hedges')
+        hedge = self._hedge_pool.submit(contextvars.copy_context().run, self._timed_create, *args)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=self._remaining(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                self._count('deadline_exceeded')
+                raise DeadlineExceededError()
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _create(self, system_prompt, prompt, temperature, max_tokens, stream=False, timeout=None, model=None):
+        """Issue the upstream chat completion request."""
+        options = {'timeout': timeout} if timeout is not None else {}
+        return self.client.chat.completions.create(
+            **options,
+            messages=[
+                {
+                    "role": "system",
+                    "content": system_prompt
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            model=model or self.model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=1,
+            stop=None,
+            stream=stream,
+        )
@@ -1,11 +1,24 @@
+import functools
+import math
 import os
+import json
 import logging
-from flask import Flask, request, render_template, jsonify, flash, redirect, url_for
+import sqlite3
+import time
+import metrics
+import tracing
+from flask import Flask, Response, request, render_template, jsonify, flash, redirect, url_for, stream_with_context
 from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
-from utils import setup_logging, log_request
-from file_processor import extract_text_from_file, allowed_file, sanitize_text
-from ai_service import ResumeRoaster
+from utils import REQUEST_ID_HEADER, get_request_id, log_request, logging_stats, new_request_id, setup_logging
+from file_processor import allowed_file, get_upload_cache
+from extraction import extract_uploaded_file, get_extraction_pool
+from ai_service import DegradedResponse, ResumeRoaster, is_degraded
+from governor import UpstreamOverloadedError
+from jobs import JobManager, JobQueueFullError
+from batch import expand_uploads, roast_batch
+from rate_limiter import client_key, create_rate_limiter
 
 # Setup logging
 logger = setup_logging()
@@ -13,12 +26,137 @@ logger = setup_logging()
 app = Flask(__name__)
 app.config.from_object(Config)
 
+if Config.TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.TRUSTED_PROXIES)
+
 # Validate configuration
 Config.validate_config()
 
 # Initialize AI service
 roaster = ResumeRoaster()
 
+# Background pool for /api/jobs
+job_manager = JobManager()
+
+# Per-client token buckets, one budget per route group
+rate_limiter = create_rate_limiter()
+RATE_LIMITS = {
+    'roast': Config.RATE_LIMIT_ROAST_PER_MINUTE,
+    'improve': Config.RATE_LIMIT_IMPROVE_PER_MINUTE,
+    'analyze': Config.RATE_LIMIT_ANALYZE_PER_MINUTE,
+    'form': Config.RATE_LIMIT_FORM_PER_MINUTE,
+    'batch': Config.RATE_LIMIT_BATCH_PER_MINUTE,
+}
+
+def _check_rate_limit(bucket, cost=1):
+    """Spend `cost` tokens from the client's bucket; return seconds to wait if it has too few."""
+    per_minute = RATE_LIMITS[bucket]
+    if rate_limiter is None or per_minute <= 0:
+        return None
+
+    key = f"{bucket}:{client_key(request.remote_addr, request.headers.get('X-API-Key'))}"
+    try:
+        allowed, retry_after = rate_limiter.acquire(key, per_minute, cost)
+    except sqlite3.Error as e:
+        # Fail open: a busy limiter store must not take the site down
+        logger.warning(f"Rate limiter unavailable: {str(e)}")
+        return None
+
+    return None if allowed else retry_after
+
+def _rate_limited_response(bucket, retry_after):
+    """Build the 429 response for a client that is over budget."""
+    headers = {'Retry-After': str(max(1, math.ceil(retry_after)))}
+    message = "Too many requests. Please wait a moment and try again."
+    logger.warning(f"Rate limit exceeded for {bucket} from {request.remote_addr}")
+    if bucket == 'form':
+        return render_template('index.html', error=message), 429, headers
+    return jsonify({'error': message}), 429, headers
+
+def rate_limit(*buckets):
+    """Decorator applying the named rate limit budgets to POST requests.
+
+    A route making several model calls names one bucket per call and spends a
+    token from each, in order; the first empty bucket rejects the request.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if request.method == 'POST':
+                for bucket in buckets:
+                    retry_after = _check_rate_limit(bucket)
+                    if retry_after is not None:
+                        return _rate_limited_response(bucket, retry_after)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _overloaded_response(e):
+    """Build the 503 response for a model call shed by the upstream governor."""
+    return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+
+@app.before_request
+def assign_request_id():
+    """Tag the request's log records with the caller's X-Request-ID or a new id."""
+    new_request_id(request.headers.get(REQUEST_ID_HEADER))
+
+@app.after_request
+def add_request_id_header(response):
+    request_id = get_request_id()
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+# Endpoints that are not timed or traced themselves
+UNTRACKED_ENDPOINTS = ('metrics_endpoint', 'debug_traces', 'static')
+
+@app.before_request
+def start_request_metrics():
+    """Start collecting stage timings for the matched route (not /metrics or static files)."""
+    tracked = request.url_rule is not None and request.endpoint not in UNTRACKED_ENDPOINTS
+    metrics.start_request(request.url_rule.rule if tracked else None)
+
+@app.before_request
+def start_request_trace():
+    tracked = request.url_rule is not None and request.endpoint not in UNTRACKED_ENDPOINTS
+    tracing.start_trace(f"{request.method} {request.url_rule.rule}" if tracked else None,
+                        **({'http.method': request.method, 'http.route': request.url_rule.rule} if tracked else {}))
+
+@app.after_request
+def finish_request_trace(response):
+    trace = tracing.current_trace()
+    if trace is not None:
+        # Finish once the body has been sent, so streamed responses are timed in full
+        response.call_on_close(lambda: tracing.finish_trace(trace, response.status_code))
+    return response
+
+@app.after_request
+def finish_request_metrics(response):
+    request_metrics = metrics.current()
+    if request_metrics is not None:
+        if response.is_streamed:
+            # Streamed bodies are generated after this hook; count them once the stream closes
+            response.call_on_close(lambda: request_metrics.finish(response.status_code))
+        else:
+            request_metrics.finish(response.status_code)
+    return response
+
+@app.teardown_request
+def abandon_request_metrics(exc):
+    request_metrics = metrics.current()
+    if exc is not None and request_metrics is not None:
+        request_metrics.finish(500)
+
+@app.teardown_request
+def abandon_request_trace(exc):
+    if exc is not None:
+        tracing.finish_trace(tracing.current_trace(), 500, error=exc)
+
+def _uploaded_files():
+    """Return request.files, timing the multipart parse that reads the upload."""
+    with metrics.stage('upload_read'), tracing.span('upload_read'):
+        return request.files
+
 @app.errorhandler(RequestEntityTooLarge)
 def handle_file_too_large(e):
     """Handle file too large error."""
@@ -34,45 +172,47 @@ def handle_exception(e):
 
 @app.route('/', methods=['GET', 'POST'])
 @log_request
+@rate_limit('form')
 def index():
     """Main route for the resume roaster."""
     if request.method == 'GET':
         return render_template('index.html')
-    
+
     try:
         # Validate file upload
-        if 'resume' not in request.files:
+        if 'resume' not in _uploaded_files():
             return render_template('index.html', error="No file uploaded")
-        
+
         file = request.files['resume']
-        
+
         if file.filename == '':
             return render_template('index.html', error="No file selected")
-        
+
         if not allowed_file(file.filename):
             return render_template('index.html', 
                                  error="Unsupported file type. Please upload a .txt, .pdf, or .docx file.")
-        
+
         # Extract text from file
-        resume_text = extract_text_from_file(file)
-        resume_text = sanitize_text(resume_text)
-        
+        resume_text = extract_uploaded_file(file)
+
         if not resume_text:
             return render_template('index.html', error="Could not extract text from the file")
-        
+
         # Get roast type from form
         roast_type = request.form.get('roast_type', 'standard')
-        
+
         # Generate roast
         roast_output = roaster.generate_roast(resume_text, roast_type)
-        
+
         logger.info(f"Successfully generated roast for file: {file.filename}")
-        
+
         return render_template('index.html', 
                              roast_output=roast_output,
                              roast_type=roast_type,
                              success=True)
-        
+
+    except UpstreamOverloadedError as e:
+        return render_template('index.html', error=str(e)), 503, {'Retry-After': str(e.retry_after)}
     except ValueError as e:
         logger.warning(f"User input error: {str(e)}")
         return render_template('index.html', error=str(e))
@@ -80,78 +220,356 @@ def index():
         logger.error(f"Unexpected error in index route: {str(e)}")
         return render_template('index.html', error="An unexpected error occurred. Please try again.")
 
+def _get_uploaded_file():
+    """Return the validated resume upload from the current request."""
+    if 'resume' not in _uploaded_files():
+        raise ValueError('No file uploaded')
+
+    file = request.files['resume']
+
+    if file.filename == '':
+        raise ValueError('No file selected')
+
+    if not allowed_file(file.filename):
+        raise ValueError('Unsupported file type')
+
+    return file
+
+def _extract_resume_text():
+    """Validate the uploaded resume and return its sanitized text."""
+    file = _get_uploaded_file()
+
+    resume_text = extract_uploaded_file(file)
+
+    if not resume_text:
+        raise ValueError('Could not extract text from the file')
+
+    return resume_text
+
+def _sse_event(data, event=None):
+    """Format one Server-Sent Events message."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def _sse_response(chunks, done_payload):
+    """Relay generated text chunks to the client as Server-Sent Events."""
+    def generate():
+        degraded = False
+        try:
+            for chunk in chunks:
+                degraded = degraded or is_degraded(chunk)
+                yield _sse_event({'chunk': chunk})
+            yield _sse_event(dict(done_payload, degraded=degraded), event='done')
+        except ValueError as e:
+            yield _sse_event({'error': str(e)}, event='error')
+        except Exception as e:
+            logger.error(f"Streaming error: {str(e)}")
+            yield _sse_event({'error': 'An unexpected error occurred'}, event='error')
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
 @app.route('/api/roast', methods=['POST'])
 @log_request
+@rate_limit('roast')
 def api_roast():
     """API endpoint for roasting resumes."""
     try:
-        if 'resume' not in request.files:
-            return jsonify({'error': 'No file uploaded'}), 400
-        
-        file = request.files['resume']
-        
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Unsupported file type'}), 400
-        
-        resume_text = extract_text_from_file(file)
-        resume_text = sanitize_text(resume_text)
-        
-        if not resume_text:
-            return jsonify({'error': 'Could not extract text from the file'}), 400
-        
+        resume_text = _extract_resume_text()
+
         roast_type = request.form.get('roast_type', 'standard')
         roast_output = roaster.generate_roast(resume_text, roast_type)
-        
+
         return jsonify({
             'roast': roast_output,
             'roast_type': roast_type,
+            'degraded': isinstance(roast_output, DegradedResponse),
             'success': True
         })
-        
+
+    except UpstreamOverloadedError as e:
+        return _overloaded_response(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"API error: {str(e)}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+@app.route('/api/roast/stream', methods=['POST'])
+@log_request
+@rate_limit('roast')
+def api_roast_stream():
+    """Streaming variant of /api/roast using Server-Sent Events."""
+    try:
+        resume_text = _extract_resume_text()
+        roast_type = request.form.get('roast_type', 'standard')
+
+        return _sse_response(roaster.stream_roast(resume_text, roast_type),
+                             {'roast_type': roast_type, 'success': True})
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"API error: {str(e)}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+@app.route('/api/roast/batch', methods=['POST'])
+@log_request
+@rate_limit('batch')
+def api_roast_batch():
+    """Roast many resumes (files or zip archives), streaming NDJSON results as they complete."""
+    try:
+        files = _uploaded_files().getlist('resumes') + request.files.getlist('resume')
+        if not files:
+            return jsonify({'error': 'No files uploaded'}), 400
+
+        items = expand_uploads(files)
+        if not items:
+            return jsonify({'error': 'No resumes found in the upload'}), 400
+
+        # Every resume is a model call, paid for from the roast budget like a single roast
+        calls = sum('error' not in item for item in items)
+        roast_budget = RATE_LIMITS['roast']
+        if rate_limiter is not None and 0 < roast_budget < calls:
+            return jsonify({'error': f'Too many resumes for your rate limit ({roast_budget} roasts per minute)'}), 400
+        retry_after = _check_rate_limit('roast', cost=calls) if calls else None
+        if retry_after is not None:
+            return _rate_limited_response('roast', retry_after)
+
+        roast_type = request.form.get('roast_type', 'standard')
+
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"API error: {str(e)}")
         return jsonify({'error': 'An unexpected error occurred'}), 500
 
+    def generate():
+        start_time = time.time()
+        succeeded = degraded = 0
+        for result in roast_batch(items, roaster, roast_type):
+            succeeded += result['success']
+            degraded += result.get('degraded', False)
+            yield json.dumps(result) + "\n"
+        yield json.dumps({
+            'done': True,
+            'total': len(items),
+            'succeeded': succeeded,
+            'failed': len(items) - succeeded,
+            'degraded': degraded,
+            'elapsed_seconds': round(time.time() - start_time, 3),
+        }) + "\n"
+
+    logger.info(f"Starting batch of {len(items)} resumes")
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'X-Accel-Buffering': 'no',
+    })
+
 @app.route('/api/improve', methods=['POST'])
 @log_request
+@rate_limit('improve')
 def api_improve():
     """API endpoint for getting improvement suggestions."""
     try:
-        if 'resume' not in request.files:
-            return jsonify({'error': 'No file uploaded'}), 400
-        
-        file = request.files['resume']
-        
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Unsupported file type'}), 400
-        
-        resume_text = extract_text_from_file(file)
-        resume_text = sanitize_text(resume_text)
-        
-        if not resume_text:
-            return jsonify({'error': 'Could not extract text from the file'}), 400
-        
+        resume_text = _extract_resume_text()
+
         suggestions = roaster.generate_improvement_suggestions(resume_text)
-        
+
         return jsonify({
             'suggestions': suggestions,
+            'degraded': isinstance(suggestions, DegradedResponse),
+            'success': True
+        })
+
+    except UpstreamOverloadedError as e:
+        return _overloaded_response(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"API error: {str(e)}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+@app.route('/api/improve/stream', methods=['POST'])
+@log_request
+@rate_limit('improve')
+def api_improve_stream():
+    """Streaming variant of /api/improve using Server-Sent Events."""
+    try:
+        resume_text = _extract_resume_text()
+
+        return _sse_response(roaster.stream_improvement_suggestions(resume_text),
+                             {'success': True})
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"API error: {str(e)}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+@app.route('/api/analyze', methods=['POST'])
+@log_request
+@rate_limit('analyze')
+def api_analyze():
+    """Roast and improvement suggestions for one upload from a single model call."""
+    try:
+        resume_text = _extract_resume_text()
+
+        roast_type = request.form.get('roast_type', 'standard')
+        analysis = roaster.generate_analysis(resume_text, roast_type)
+
+        return jsonify({
+            'roast': analysis['roast'],
+            'suggestions': analysis['suggestions'],
+            'roast_type': roast_type,
+            'degraded': (isinstance(analysis['roast'], DegradedResponse)
+                         or isinstance(analysis['suggestions'], DegradedResponse)),
             'success': True
         })
-        
+
+    except UpstreamOverloadedError as e:
+        return _overloaded_response(e)
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"API error: {str(e)}")
         return jsonify({'error': 'An unexpected error occurred'}), 500
 
+@app.route('/api/roast-and-improve', methods=['POST'])
+@log_request
+@rate_limit('roast', 'improve')  # two model calls: one token from each budget
+def api_roast_and_improve():
+    """Run the roast and improvement prompts concurrently on one upload.
+
+    If one side fails the other is still returned, with the failure listed in 'errors'.
+    """
+    try:
+        resume_text = _extract_resume_text()
+
+        roast_type = request.form.get('roast_type', 'standard')
+        result = roaster.generate_roast_and_suggestions(resume_text, roast_type)
+
+    except UpstreamOverloadedError as e:
+        return _overloaded_response(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"API error: {str(e)}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+    errors = {}
+    for side, e in result['errors'].items():
+        if isinstance(e, ValueError):
+            errors[side] = str(e)
+        else:
+            logger.error(f"API error ({side}): {str(e)}")
+            errors[side] = 'An unexpected error occurred'
+
+    if result['roast'] is None and result['suggestions'] is None:
+        overloaded = [e for e in result['errors'].values() if isinstance(e, UpstreamOverloadedError)]
+        if overloaded:
+            return _overloaded_response(overloaded[0])
+        return jsonify({'error': errors['roast'], 'errors': errors}), 400
+
+    return jsonify({
+        'roast': result['roast'],
+        'suggestions': result['suggestions'],
+        'roast_type': roast_type,
+        'degraded': isinstance(result['roast'], DegradedResponse) or isinstance(result['suggestions'], DegradedResponse),
+        'partial': bool(errors),
+        'errors': errors,
+        'success': True
+    })
+
+def _run_resume_job(operation, filename, data, roast_type):
+    """Background job body: extract text from the upload and call the model."""
+    resume_text = get_extraction_pool().extract(filename, data)
+
+    if not resume_text:
+        raise ValueError('Could not extract text from the file')
+
+    if operation == 'improve':
+        result = {'suggestions': roaster.generate_improvement_suggestions(resume_text)}
+    elif operation == 'analyze':
+        result = dict(roaster.generate_analysis(resume_text, roast_type), roast_type=roast_type)
+    else:
+        result = {'roast': roaster.generate_roast(resume_text, roast_type), 'roast_type': roast_type}
+    result['degraded'] = is_degraded(*result.values())
+    return result
+
+@app.route('/api/jobs', methods=['POST'])
+@log_request
+def api_submit_job():
+    """Queue a roast or improvement job and return its id immediately."""
+    try:
+        file = _get_uploaded_file()
+
+        operation = request.form.get('operation', 'roast')
+        if operation not in ('roast', 'improve', 'analyze'):
+            return jsonify({'error': 'Unsupported operation'}), 400
+
+        retry_after = _check_rate_limit(operation)
+        if retry_after is not None:
+            return _rate_limited_response(operation, retry_after)
+
+        roast_type = request.form.get('roast_type', 'standard')
+        job_id = job_manager.submit(_run_resume_job, operation, file.filename, file.read(), roast_type)
+
+        return jsonify({
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': url_for('api_get_job', job_id=job_id),
+            'success': True
+        }), 202
+
+    except JobQueueFullError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"API error: {str(e)}")
+        return jsonify({'error': 'An unexpected error occurred'}), 500
+
+@app.route('/api/jobs/<job_id>')
+def api_get_job(job_id):
+    """Report a job's status, plus its result or error once finished."""
+    job = job_manager.get(job_id)
+
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+
+    return jsonify(job)
+
+@app.route('/api/stats')
+def api_stats():
+    """Expose cache and upstream counters for this worker."""
+    stats = roaster.get_stats()
+    stats['jobs'] = job_manager.stats()
+    stats['extraction'] = get_extraction_pool().stats()
+    upload_cache = get_upload_cache()
+    stats['extraction_cache'] = upload_cache.stats() if upload_cache else None
+    stats['logging'] = logging_stats()
+    return jsonify(stats)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics, summed over all workers in multiprocess mode."""
+    if not metrics.ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.route('/debug/traces')
+@app.route('/debug/traces/<trace_id>')
+def debug_traces(trace_id=None):
+    """Recent (or ?slow=1 slow) traces of this worker, or one trace's spans by trace or request id."""
+    if not tracing.debug_allowed(request.headers.get('X-Debug-Token')):
+        return jsonify({'error': 'Not found'}), 404
+    body, status = tracing.debug_view(trace_id, slow=request.args.get('slow') == '1',
+                                      limit=request.args.get('limit', 50, type=int))
+    return jsonify(body), status
+
 @app.route('/health')
 def health_check():
     """Health check endpoint."""
@@ -0,0 +1,400 @@
+"""
+ASGI configuration for Resume Roaster application.
+Serves the /, /api/roast, /api/improve, /api/roast/stream, /api/improve/stream,
+/metrics, /debug/traces and /health routes of the Flask app for high-concurrency
+deployments; batch, analyze and background job routes are Flask only. Uploads
+are read and model calls are awaited without blocking the event loop, so one
+worker holds many roasts in flight; text extraction still runs on the
+extraction worker processes.
+
+Usage:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 2
+    (behind a reverse proxy add --proxy-headers --forwarded-allow-ips=<proxy ip>)
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.templating import Jinja2Templates
+
+# Add the project directory to the Python path
+project_dir = Path(__file__).parent
+sys.path.insert(0, str(project_dir))
+
+import metrics
+import tracing
+from config import Config
+from utils import REQUEST_ID_HEADER, log_request, new_request_id, setup_logging
+from file_processor import allowed_file
+from extraction import get_extraction_pool
+from ai_service import DegradedResponse, is_degraded
+from async_ai_service import AsyncResumeRoaster
+from governor import UpstreamOverloadedError
+from rate_limiter import client_key, create_rate_limiter
+
+# Setup logging
+logger = setup_logging()
+
+# Validate configuration
+Config.validate_config()
+
+templates = Jinja2Templates(directory=str(project_dir / 'templates'))
+
+# Per-client token buckets, shared with the Flask app when the backend is sqlite
+rate_limiter = create_rate_limiter()
+RATE_LIMITS = {
+    'roast': Config.RATE_LIMIT_ROAST_PER_MINUTE,
+    'improve': Config.RATE_LIMIT_IMPROVE_PER_MINUTE,
+    'form': Config.RATE_LIMIT_FORM_PER_MINUTE,
+}
+
+# Threads that wait on the extraction worker processes; more would only queue for a worker
+extraction_executor = ThreadPoolExecutor(max_workers=max(1, Config.EXTRACTION_WORKERS),
+                                         thread_name_prefix='extraction')
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds MAX_CONTENT_LENGTH."""
+    
+    def __init__(self):
+        super().__init__("File too large. Please upload a file smaller than 16MB.")
+
+async def _check_rate_limit(request, bucket):
+    """Spend one token from the client's bucket; return seconds to wait if empty."""
+    per_minute = RATE_LIMITS[bucket]
+    if rate_limiter is None or per_minute <= 0:
+        return None
+    
+    remote_addr = request.client.host if request.client else None
+    key = f"{bucket}:{client_key(remote_addr, request.headers.get('X-API-Key'))}"
+    try:
+        # The sqlite backend can wait on a write lock; keep it off the event loop
+        allowed, retry_after = await asyncio.to_thread(rate_limiter.acquire, key, per_minute)
+    except sqlite3.Error as e:
+        # Fail open: a busy limiter store must not take the site down
+        logger.warning(f"Rate limiter unavailable: {str(e)}")
+        return None
+    
+    return None if allowed else retry_after
+
+def _rate_limited_response(request, bucket, retry_after):
+    """Build the 429 response for a client that is over budget."""
+    headers = {'Retry-After': str(max(1, math.ceil(retry_after)))}
+    message = "Too many requests. Please wait a moment and try again."
+    logger.warning(f"Rate limit exceeded for {bucket} from {request.client.host if request.client else None}")
+    if bucket == 'form':
+        return _render(request, status_code=429, headers=headers, error=message)
+    return JSONResponse({'error': message}, status_code=429, headers=headers)
+
+def rate_limit(bucket):
+    """Decorator applying the named rate limit budget to POST requests."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(request):
+            if request.method == 'POST':
+                retry_after = await _check_rate_limit(request, bucket)
+                if retry_after is not None:
+                    return _rate_limited_response(request, bucket, retry_after)
+            return await func(request)
+        return wrapper
+    return decorator
+
+def track_request(route):
+    """Decorator giving the request an id and recording its stage timings and total time under route."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(request):
+            request_id = new_request_id(request.headers.get(REQUEST_ID_HEADER))
+            request_metrics = metrics.start_request(route)
+            trace = tracing.start_trace(f"{request.method} {route}", **{'http.method': request.method,
+                                                                        'http.route': route})
+            try:
+                response = await func(request)
+            except Exception as e:
+                if request_metrics is not None:
+                    request_metrics.finish(500)
+                tracing.finish_trace(trace, 500, error=e)
+                raise
+            if request_metrics is not None:
+                request_metrics.finish(response.status_code)
+            tracing.finish_trace(trace, response.status_code)
+            response.headers[REQUEST_ID_HEADER] = request_id
+            return response
+        return wrapper
+    return decorator
+
+def _overloaded_response(e):
+    """Build the 503 response for a model call shed by the upstream limiter."""
+    return JSONResponse({'error': str(e)}, status_code=503, headers={'Retry-After': str(e.retry_after)})
+
+def _render(request, status_code=200, headers=None, **context):
+    """Render the index page."""
+    return templates.TemplateResponse(request, 'index.html', context, status_code=status_code, headers=headers)
+
+@asynccontextmanager
+async def _upload_form(request):
+    """Parse the multipart form, refusing bodies over MAX_CONTENT_LENGTH up front."""
+    length = request.headers.get('content-length')
+    if length and length.isdigit() and int(length) > Config.MAX_CONTENT_LENGTH:
+        raise UploadTooLargeError()
+    try:
+        with metrics.stage('upload_read'), tracing.span('upload_read'):
+            form = await request.form(max_files=1, max_fields=10)
+    except HTTPException as e:
+        raise ValueError(e.detail)
+    try:
+        yield form
+    finally:
+        await form.close()
+
+async def _extract_resume_text(form):
+    """Validate the uploaded resume and return its sanitized text."""
+    file = form.get('resume')
+    if file is None or isinstance(file, str):
+        raise ValueError('No file uploaded')
+    
+    if not file.filename:
+        raise ValueError('No file selected')
+    
+    if not allowed_file(file.filename):
+        raise ValueError('Unsupported file type')
+    
+    with metrics.stage('upload_read'), tracing.span('upload_read'):
+        data = await file.read()
+    if len(data) > Config.MAX_CONTENT_LENGTH:
+        raise UploadTooLargeError()
+    
+    loop = asyncio.get_running_loop()
+    # run_in_executor does not carry context variables over; the copy keeps the request's metrics
+    resume_text = await loop.run_in_executor(extraction_executor, contextvars.copy_context().run,
+                                             get_extraction_pool().extract, os.path.basename(file.filename), data)
+    
+    if not resume_text:
+        raise ValueError('Could not extract text from the file')
+    
+    return resume_text
+
+@track_request('/')
+@log_request
+@rate_limit('form')
+async def index(request):
+    """Main route for the resume roaster."""
+    if request.method == 'GET':
+        return _render(request)
+    
+    try:
+        async with _upload_form(request) as form:
+            resume_text = await _extract_resume_text(form)
+            roast_type = form.get('roast_type', 'standard')
+        
+        roast_output = await request.app.state.roaster.generate_roast(resume_text, roast_type)
+        
+        logger.info("Successfully generated roast")
+        
+        return _render(request, roast_output=roast_output, roast_type=roast_type, success=True)
+    
+    except UpstreamOverloadedError as e:
+        return _render(request, status_code=503, headers={'Retry-After': str(e.retry_after)}, error=str(e))
+    except UploadTooLargeError as e:
+        return _render(request, status_code=413, error=str(e))
+    except ValueError as e:
+        logger.warning(f"User input error: {str(e)}")
+        return _render(request, error=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in index route: {str(e)}")
+        return _render(request, error="An unexpected error occurred. Please try again.")
+
+@track_request('/api/roast')
+@log_request
+@rate_limit('roast')
+async def api_roast(request):
+    """API endpoint for roasting resumes."""
+    try:
+        async with _upload_form(request) as form:
+            resume_text = await _extract_resume_text(form)
+            roast_type = form.get('roast_type', 'standard')
+        
+        roast_output = await request.app.state.roaster.generate_roast(resume_text, roast_type)
+        
+        return JSONResponse({
+            'roast': roast_output,
+            'roast_type': roast_type,
+            'degraded': isinstance(roast_output, DegradedResponse),
+            'success': True
+        })
+    
+    except UpstreamOverloadedError as e:
+        return _overloaded_response(e)
+    except UploadTooLargeError as e:
+        return JSONResponse({'error': str(e)}, status_code=413)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"API error: {str(e)}")
+        return JSONResponse({'error': 'An unexpected error occurred'}, status_code=500)
+
+@track_request('/api/improve')
+@log_request
+@rate_limit('improve')
+async def api_improve(request):
+    """API endpoint for getting improvement suggestions."""
+    try:
+        async with _upload_form(request) as form:
+            resume_text = await _extract_resume_text(form)
+        
+        suggestions = await request.app.state.roaster.generate_improvement_suggestions(resume_text)
+        
+        return JSONResponse({
+            'suggestions': suggestions,
+            'degraded': isinstance(suggestions, DegradedResponse),
+            'success': True
+        })
+    
+    except UpstreamOverloadedError as e:
+        return _overloaded_response(e)
+    except UploadTooLargeError as e:
+        return JSONResponse({'error': str(e)}, status_code=413)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"API error: {str(e)}")
+        return JSONResponse({'error': 'An unexpected error occurred'}, status_code=500)
+
+def _sse_event(data, event=None):
+    """Format one Server-Sent Events message."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def _sse_response(chunks, done_payload):
+    """Relay generated text chunks to the client as Server-Sent Events."""
+    async def generate():
+        degraded = False
+        try:
+            async for chunk in chunks:
+                degraded = degraded or is_degraded(chunk)
+                yield _sse_event({'chunk': chunk})
+            yield _sse_event(dict(done_payload, degraded=degraded), event='done')
+        except ValueError as e:
+            yield _sse_event({'error': str(e)}, event='error')
+        except Exception as e:
+            logger.error(f"Streaming error: {str(e)}")
+            yield _sse_event({'error': 'An unexpected error occurred'}, event='error')
+    
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+@track_request('/api/roast/stream')
+@log_request
+@rate_limit('roast')
+async def api_roast_stream(request):
+    """Streaming variant of /api/roast using Server-Sent Events."""
+    try:
+        async with _upload_form(request) as form:
+            resume_text = await _extract_resume_text(form)
+            roast_type = form.get('roast_type', 'standard')
+        
+        return _sse_response(request.app.state.roaster.stream_roast(resume_text, roast_type),
+                             {'roast_type': roast_type, 'success': True})
+    
+    except UploadTooLargeError as e:
+        return JSONResponse({'error': str(e)}, status_code=413)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"API error: {str(e)}")
+        return JSONResponse({'error': 'An unexpected error occurred'}, status_code=500)
+
+@track_request('/api/improve/stream')
+@log_request
+@rate_limit('improve')
+async def api_improve_stream(request):
+    """Streaming variant of /api/improve using Server-Sent Events."""
+    try:
+        async with _upload_form(request) as form:
+            resume_text = await _extract_resume_text(form)
+        
+        return _sse_response(request.app.state.roaster.stream_improvement_suggestions(resume_text),
+                             {'success': True})
+    
+    except UploadTooLargeError as e:
+        return JSONResponse({'error': str(e)}, status_code=413)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"API error: {str(e)}")
+        return JSONResponse({'error': 'An unexpected error occurred'}, status_code=500)
+
+async def metrics_endpoint(request):
+    """Prometheus metrics, summed over all workers in multiprocess mode."""
+    if not metrics.ENABLED:
+        return JSONResponse({'error': 'Metrics are disabled'}, status_code=404)
+    body, content_type = metrics.render()
+    return Response(body, headers={'Content-Type': content_type})
+
+async def debug_traces(request):
+    """Recent (or ?slow=1 slow) traces of this worker, or one trace's spans by trace or request id."""
+    if not tracing.debug_allowed(request.headers.get('X-Debug-Token')):
+        return JSONResponse({'error': 'Not found'}, status_code=404)
+    try:
+        limit = int(request.query_params.get('limit', 50))
+    except ValueError:
+        limit = 50
+    body, status = tracing.debug_view(request.path_params.get('trace_id'),
+                                      slow=request.query_params.get('slow') == '1', limit=limit)
+    return JSONResponse(body, status_code=status)
+
+async def health_check(request):
+    """Health check endpoint."""
+    return JSONResponse({'status': 'healthy', 'timestamp': str(time.time())})
+
+async def handle_exception(request, exc):
+    """Handle general exceptions."""
+    logger.error(f"Unhandled exception: {str(exc)}")
+    return _render(request, status_code=500, error="An unexpected error occurred. Please try again.")
+
+@asynccontextmanager
+async def lifespan(app):
+    # The roaster's connection pool belongs to the server's event loop
+    app.state.roaster = AsyncResumeRoaster()
+    try:
+        yield
+    finally:
+        await app.state.roaster.aclose()
+        extraction_executor.shutdown(wait=False)
+
+app = Starlette(
+    debug=Config.DEBUG,
+    routes=[
+        Route('/', index, methods=['GET', 'POST']),
+        Route('/api/roast', api_roast, methods=['POST']),
+        Route('/api/roast/stream', api_roast_stream, methods=['POST']),
+        Route('/api/improve', api_improve, methods=['POST']),
+        Route('/api/improve/stream', api_improve_stream, methods=['POST']),
+        Route('/metrics', metrics_endpoint),
+        Route('/debug/traces', debug_traces),
+        Route('/debug/traces/{trace_id}', debug_traces),
+        Route('/health', health_check),
+    ],
+    exception_handlers={Exception: handle_exception},
+    lifespan=lifespan,
+)
+
+# Application entry point
+application = app
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
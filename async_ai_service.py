@@ -0,0 +1,498 @@
+"""
+Async counterpart of ResumeRoaster built on the groq package's AsyncGroq client.
+
+One AsyncResumeRoaster owns a single httpx connection pool shared by all of
+its calls, so one process (an ASGI worker or a batch script) can keep
+hundreds of model calls in flight without a thread per call. Prompts, cache
+keys, the response cache, the circuit breaker and the retry policy are the
+same ones the synchronous ResumeRoaster uses.
+
+An instance belongs to the event loop it is first used on.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+import httpx
+from groq import AsyncGroq
+from ai_service import (
+    ANALYZE_SYSTEM_PROMPT,
+    IMPROVE_SYSTEM_PROMPT,
+    ROAST_SYSTEM_PROMPT,
+    ResumePrompts,
+    analysis_has_roast,
+    create_cache,
+    fallback_roast,
+    fallback_suggestions,
+    parse_analysis,
+)
+import metrics
+import tracing
+from breaker import CircuitOpenError, get_circuit_breaker
+from config import Config
+from governor import UpstreamOverloadedError, is_patient
+from prompt_budget import estimate_tokens, get_prompt_budget_stats
+from retry import DeadlineExceededError, LatencyTracker, RetryPolicy
+from token_policy import get_output_policy
+
+logger = logging.getLogger(__name__)
+
+class AsyncResumeRoaster(ResumePrompts):
+    """Handle AI interactions for resume roasting without blocking the event loop."""
+
+    def __init__(self, cache=None, breaker=None, max_in_flight=None, http_client=None, output_policy=None):
+        self.max_in_flight = max_in_flight or Config.ASYNC_MAX_IN_FLIGHT
+        self.http_client = http_client or httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight),
+            timeout=Config.UPSTREAM_TIMEOUT_SECONDS,
+        )
+        # Retries are handled by _call_upstream so they respect the request deadline
+        self.client = AsyncGroq(api_key=Config.GROQ_API_KEY, max_retries=0, http_client=self.http_client)
+        self.model = Config.GROQ_MODEL
+        self.cache = cache if cache is not None else create_cache()
+        self.breaker = breaker if breaker is not None else get_circuit_breaker()
+        self.output_policy = output_policy if output_policy is not None else get_output_policy()
+        self.retry_policy = RetryPolicy()
+        self.latency = LatencyTracker()
+        self._semaphore = None
+        self._waiting = 0
+        self._active = 0
+        self._in_flight = {}
+        self.coalesced = 0
+        self.shed = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.attempts = 0
+        self.retries = 0
+        self.deadline_exceeded = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Close the shared connection pool."""
+        await self.http_client.aclose()
+
+    async def generate_roast(self, resume_text, roast_type="standard", timeout=None):
+        """Generate a roast based on the resume text."""
+        async def generate():
+            budget = self.output_policy.choose('roast', roast_type, Config.MAX_TOKENS)
+            start_time = time.time()
+            roast = await self._complete(
+                ROAST_SYSTEM_PROMPT,
+                self._build_prompt(resume_text, roast_type),
+                temperature=Config.MODEL_TEMPERATURE,
+                max_tokens=budget.max_tokens,
+                cache_key=self._cache_key(resume_text, roast_type, Config.MODEL_TEMPERATURE, Config.MAX_TOKENS,
+                                          budget.model),
+                timeout=timeout,
+                model=budget.model,
+                output_key=budget.key,
+            )
+            logger.info(f"Roast generated in {time.time() - start_time:.2f} seconds")
+            if roast is None:
+                raise ValueError("No response generated from AI model")
+            return roast
+
+        return await self._guard(generate(), "Failed to generate roast",
+                                 lambda: fallback_roast(resume_text, roast_type))
+
+    async def generate_improvement_suggestions(self, resume_text, timeout=None):
+        """Generate constructive improvement suggestions."""
+        async def generate():
+            budget = self.output_policy.choose('improve', None, Config.MAX_TOKENS)
+            suggestions = await self._complete(
+                IMPROVE_SYSTEM_PROMPT,
+                self._build_improvement_prompt(resume_text),
+                temperature=0.5,
+                max_tokens=budget.max_tokens,
+                cache_key=self._cache_key(resume_text, "improve", 0.5, Config.MAX_TOKENS, budget.model),
+                timeout=timeout,
+                model=budget.model,
+                output_key=budget.key,
+            )
+            if suggestions is None:
+                raise ValueError("No suggestions generated from AI model")
+            return suggestions
+
+        return await self._guard(generate(), "Failed to generate suggestions",
+                                 lambda: fallback_suggestions(resume_text))
+
+    async def generate_analysis(self, resume_text, roast_type="standard", timeout=None):
+        """Generate the roast and the improvement suggestions in one model call.
+
+        Suggestions missing from the response are requested within the same deadline.
+        """
+        deadline = time.monotonic() + (timeout or Config.UPSTREAM_TIMEOUT_SECONDS)
+
+        async def generate():
+            budget = self.output_policy.choose('analyze', roast_type, Config.MAX_TOKENS * 2)
+            response = await self._complete(
+                ANALYZE_SYSTEM_PROMPT,
+                self._build_analysis_prompt(resume_text, roast_type),
+                temperature=Config.MODEL_TEMPERATURE,
+                max_tokens=budget.max_tokens,
+                cache_key=self._cache_key(resume_text, f"analyze:{roast_type}", Config.MODEL_TEMPERATURE,
+                                          Config.MAX_TOKENS * 2, budget.model),
+                timeout=self._remaining(deadline),
+                model=budget.model,
+                output_key=budget.key,
+                cacheable=analysis_has_roast,
+            )
+            roast, suggestions = parse_analysis(response)
+            if roast is None:
+                raise ValueError("No response generated from AI model")
+            if suggestions is None:
+                logger.warning("Combined response had no suggestions section, requesting them separately")
+                suggestions = await self.generate_improvement_suggestions(resume_text,
+                                                                          timeout=self._remaining(deadline))
+            return {'roast': roast, 'suggestions': suggestions}
+
+        return await self._guard(generate(), "Failed to analyze resume", lambda: {
+            'roast': fallback_roast(resume_text, roast_type),
+            'suggestions': fallback_suggestions(resume_text),
+        })
+
+    async def generate_roast_and_suggestions(self, resume_text, roast_type="standard", timeout=None):
+        """Run the roast and improvement prompts concurrently.
+
+        Returns the same dict as ResumeRoaster.generate_roast_and_suggestions.
+        """
+        roast, suggestions = await asyncio.gather(
+            self.generate_roast(resume_text, roast_type, timeout),
+            self.generate_improvement_suggestions(resume_text, timeout),
+            return_exceptions=True,
+        )
+        result = {'roast': None, 'suggestions': None, 'errors': {}}
+        for side, value in (('roast', roast), ('suggestions', suggestions)):
+            if isinstance(value, Exception):
+                result['errors'][side] = value
+            else:
+                result[side] = value
+        return result
+
+    async def stream_roast(self, resume_text, roast_type="standard", timeout=None):
+        """Generate a roast, yielding text chunks as the model produces them."""
+        try:
+            budget = self.output_policy.choose('roast', roast_type, Config.MAX_TOKENS)
+            async for chunk in self._stream_complete(
+                ROAST_SYSTEM_PROMPT,
+                self._build_prompt(resume_text, roast_type),
+                temperature=Config.MODEL_TEMPERATURE,
+                max_tokens=budget.max_tokens,
+                cache_key=self._cache_key(resume_text, roast_type, Config.MODEL_TEMPERATURE, Config.MAX_TOKENS,
+                                          budget.model),
+                timeout=timeout,
+                model=budget.model,
+                output_key=budget.key,
+            ):
+                yield chunk
+        except CircuitOpenError:
+            if not Config.CIRCUIT_FALLBACK:
+                raise
+            logger.warning("AI service unavailable, serving template roast")
+            yield fallback_roast(resume_text, roast_type)
+        except UpstreamOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming roast: {str(e)}")
+            raise ValueError(f"Failed to generate roast: {str(e)}")
+
+    async def stream_improvement_suggestions(self, resume_text, timeout=None):
+        """Generate improvement suggestions, yielding text chunks as they arrive."""
+        try:
+            budget = self.output_policy.choose('improve', None, Config.MAX_TOKENS)
+            async for chunk in self._stream_complete(
+                IMPROVE_SYSTEM_PROMPT,
+                self._build_improvement_prompt(resume_text),
+                temperature=0.5,
+                max_tokens=budget.max_tokens,
+                cache_key=self._cache_key(resume_text, "improve", 0.5, Config.MAX_TOKENS, budget.model),
+                timeout=timeout,
+                model=budget.model,
+                output_key=budget.key,
+            ):
+                yield chunk
+        except CircuitOpenError:
+            if not Config.CIRCUIT_FALLBACK:
+                raise
+            logger.warning("AI service unavailable, serving template suggestions")
+            yield fallback_suggestions(resume_text)
+        except UpstreamOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming suggestions: {str(e)}")
+            raise ValueError(f"Failed to generate suggestions: {str(e)}")
+
+    def get_stats(self):
+        """Return counters for the layers wrapped around the model."""
+        p95 = self.latency.percentile(95)
+        return {
+            'cache': self.cache.stats() if self.cache else None,
+            'single_flight': {'coalesced': self.coalesced, 'in_flight': len(self._in_flight)},
+            'upstream': {
+                'limit': self.max_in_flight,
+                'in_flight': self._active,
+                'queued': self._waiting,
+                'queue_capacity': Config.UPSTREAM_QUEUE_SIZE,
+                'shed': self.shed,
+            },
+            'upstream_calls': {
+                'attempts': self.attempts,
+                'retries': self.retries,
+                'deadline_exceeded': self.deadline_exceeded,
+                'p95_latency_seconds': round(p95, 3) if p95 is not None else None,
+            },
+            'circuit': self.breaker.stats(),
+            'tokens': self.token_usage(),
+            'prompt_budget': get_prompt_budget_stats().stats(),
+            'output_lengths': self.output_policy.stats(),
+        }
+
+    def token_usage(self):
+        """Return prompt and completion tokens reported by the model so far."""
+        return {'prompt_tokens': self.prompt_tokens, 'completion_tokens': self.completion_tokens}
+
+    def _record_usage(self, usage):
+        if usage is None:
+            return
+        metrics.add_tokens(usage.prompt_tokens, usage.completion_tokens)
+        self.prompt_tokens += usage.prompt_tokens or 0
+        self.completion_tokens += usage.completion_tokens or 0
+
+    async def _guard(self, coro, failure_message, fallback):
+        """Await a generation, applying the same error handling as ResumeRoaster."""
+        try:
+            return await coro
+        except CircuitOpenError:
+            if not Config.CIRCUIT_FALLBACK:
+                raise
+            logger.warning("AI service unavailable, serving template response")
+            return fallback()
+        except UpstreamOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"{failure_message}: {str(e)}")
+            raise ValueError(f"{failure_message}: {str(e)}")
+
+    @tracing.traced('llm')
+    async def _complete(self, system_prompt, prompt, temperature, max_tokens, cache_key=None, timeout=None,
+                        model=None, output_key=None, cacheable=None):
+        """Run one chat completion, serving repeated requests from the cache.
+
+        Identical requests that arrive while a call is in flight await the
+        same task instead of issuing their own. Responses cut off at
+        max_tokens, or rejected by the optional cacheable(content) predicate,
+        are returned but not cached.
+        """
+        deadline = time.monotonic() + (timeout or Config.UPSTREAM_TIMEOUT_SECONDS)
+        tracing.set_attributes(model=model or self.model, max_tokens=max_tokens, output_key=output_key)
+        if cache_key and self.cache:
+            # The cache may be SQLite; keep its I/O off the event loop
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            tracing.set_attributes(cache_hit=cached is not None)
+            if cached is not None:
+                logger.info("Serving response from cache")
+                return cached
+
+        if not cache_key:
+            return await self._generate(system_prompt, prompt, temperature, max_tokens, None, deadline,
+                                        model, output_key, cacheable)
+
+        task = self._in_flight.get(cache_key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(
+                self._generate(system_prompt, prompt, temperature, max_tokens, cache_key, deadline,
+                               model, output_key, cacheable)
+            )
+            self._in_flight[cache_key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(cache_key, None))
+        # One waiter being cancelled must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def _generate(self, system_prompt, prompt, temperature, max_tokens, cache_key, deadline,
+                        model=None, output_key=None, cacheable=None):
+        start_time = time.time()
+        chat_completion = await self._call_upstream(system_prompt, prompt, temperature, max_tokens, deadline,
+                                                    model)
+        generation_time = time.time() - start_time
+        usage = getattr(chat_completion, 'usage', None)
+        self._record_usage(usage)
+
+        if not chat_completion.choices:
+            return None
+
+        choice = chat_completion.choices[0]
+        content = choice.message.content
+        truncated = getattr(choice, 'finish_reason', None) == 'length'
+        tracing.set_attributes(finish_reason=getattr(choice, 'finish_reason', None))
+        if usage is not None:
+            tracing.set_attributes(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+            # Recording writes to SQLite when samples are persisted; keep that off the event loop
+            await asyncio.to_thread(self.output_policy.record, output_key, usage.completion_tokens, truncated)
+        # A truncated response reflects this call's adaptive max_tokens, which the key does not include
+        if cache_key and self.cache and content and not truncated and (cacheable is None or cacheable(content)):
+            await asyncio.to_thread(self.cache.set, cache_key, content, generation_time)
+        return content
+
+    async def _stream_complete(self, system_prompt, prompt, temperature, max_tokens, cache_key=None, timeout=None,
+                               model=None, output_key=None):
+        """Stream one chat completion; the assembled response is cached at the end unless truncated."""
+        deadline = time.monotonic() + (timeout or Config.UPSTREAM_TIMEOUT_SECONDS)
+        if cache_key and self.cache:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                logger.info("Serving streamed response from cache")
+                yield cached
+                return
+
+        start_time = time.time()
+        start_ns = time.time_ns()
+        parts = []
+        finish_reason = None
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                remaining = self._remaining(deadline)
+                with self.breaker.guard():
+                    async with self._slot(remaining):
+                        self.attempts += 1
+                        stream = await self._create(system_prompt, prompt, temperature, max_tokens, stream=True,
+                                                    timeout=self._remaining(deadline), model=model)
+                        async for chunk in stream:
+                            if not chunk.choices:
+                                continue
+                            finish_reason = getattr(chunk.choices[0], 'finish_reason', None) or finish_reason
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                parts.append(delta)
+                                yield delta
+                break
+            except Exception as e:
+                if parts:
+                    raise
+                await self._backoff(attempt, e, deadline)
+        generation_time = time.time() - start_time
+
+        content = "".join(parts)
+        if not content:
+            raise ValueError("No response generated from AI model")
+        logger.info(f"Streamed response completed in {generation_time:.2f} seconds")
+        # Streamed chunks carry no usage, so the lengths are estimated
+        completion_tokens = estimate_tokens(content)
+        metrics.add_stage('upstream', generation_time)
+        metrics.add_tokens(estimate_tokens(system_prompt) + estimate_tokens(prompt), completion_tokens)
+        tracing.add_span('upstream', start_ns, time.time_ns(), streamed=True, model=model or self.model,
+                         max_tokens=max_tokens, attempts=attempt, completion_tokens=completion_tokens,
+                         finish_reason=finish_reason)
+        if finish_reason == 'length':
+            # Estimates stay out of the length stats; a truncated stream is known to be max_tokens long
+            await asyncio.to_thread(self.output_policy.record, output_key, max_tokens, True)
+        elif cache_key and self.cache:
+            await asyncio.to_thread(self.cache.set, cache_key, content, generation_time)
+
+    @metrics.timed('upstream')
+    @tracing.traced('upstream')
+    async def _call_upstream(self, system_prompt, prompt, temperature, max_tokens, deadline, model=None):
+        """Call the model, retrying transient errors with jittered backoff until the deadline."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await self._timed_create(system_prompt, prompt, temperature, max_tokens, deadline, model)
+            except Exception as e:
+                await self._backoff(attempt, e, deadline)
+
+    async def _backoff(self, attempt, error, deadline):
+        """Sleep before the next attempt, or re-raise error if it should not be retried."""
+        if isinstance(error, UpstreamOverloadedError) or not self.retry_policy.should_retry(attempt, error):
+            raise error
+        delay = self.retry_policy.delay(attempt, error)
+        if time.monotonic() + delay >= deadline:
+            self.deadline_exceeded += 1
+            raise DeadlineExceededError() from error
+        self.retries += 1
+        logger.warning(f"Upstream call failed ({str(error)}), retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    def _remaining(self, deadline):
+        """Seconds left before the deadline; raise DeadlineExceededError if none."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self.deadline_exceeded += 1
+            raise DeadlineExceededError()
+        return remaining
+
+    @asynccontextmanager
+    async def _slot(self, timeout):
+        """Hold one of max_in_flight upstream slots; shed the call if the wait queue is full.
+
+        Inside governor.patient_calls() the call waits until timeout instead.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        if self._semaphore.locked() and is_patient():
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                raise UpstreamOverloadedError()
+        elif self._semaphore.locked():
+            if self._waiting >= Config.UPSTREAM_QUEUE_SIZE:
+                self.shed += 1
+                raise UpstreamOverloadedError()
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(),
+                                       min(timeout, Config.UPSTREAM_QUEUE_TIMEOUT_SECONDS))
+            except asyncio.TimeoutError:
+                self.shed += 1
+                raise UpstreamOverloadedError()
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+
+    @tracing.traced('upstream.attempt')
+    async def _timed_create(self, system_prompt, prompt, temperature, max_tokens, deadline, model=None):
+        """One limited, non-streamed request bounded by the deadline."""
+        remaining = self._remaining(deadline)
+        queued_ns = time.time_ns()
+        with self.breaker.guard():
+            async with self._slot(remaining):
+                tracing.add_span('upstream.queue_wait', queued_ns, time.time_ns())
+                self.attempts += 1
+                start_time = time.monotonic()
+                chat_completion = await self._create(system_prompt, prompt, temperature, max_tokens,
+                                                     timeout=self._remaining(deadline), model=model)
+                self.latency.record(time.monotonic() - start_time)
+        return chat_completion
+
+    async def _create(self, system_prompt, prompt, temperature, max_tokens, stream=False, timeout=None, model=None):
+        """Issue the upstream chat completion request."""
+        options = {'timeout': timeout} if timeout is not None else {}
+        return await self.client.chat.completions.create(
+            **options,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            model=model or self.model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=1,
+            stop=None,
+            stream=stream,
+        )
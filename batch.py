@@ -0,0 +1,145 @@
+import functools
+import logging
+import os
+import queue
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from ai_service import is_degraded
+from config import Config
+from file_processor import allowed_file
+from extraction import get_extraction_pool
+from governor import patient_calls
+
+logger = logging.getLogger(__name__)
+
+class _BatchLimits:
+    """Running item count and uncompressed size of a batch; raises ValueError once either is over its limit."""
+    
+    def __init__(self, max_files, max_bytes):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.files = 0
+        self.bytes = 0
+    
+    def add(self, size=0):
+        self.files += 1
+        self.bytes += size
+        if self.files > self.max_files:
+            raise ValueError(f'Too many resumes in one batch (limit {self.max_files})')
+        if self.bytes > self.max_bytes:
+            raise ValueError(f'Batch too large (limit {self.max_bytes // (1024 * 1024)}MB uncompressed)')
+
+def expand_uploads(files, max_files=None, max_bytes=None):
+    """Expand uploaded files and zip archives into batch items.
+    
+    Each item is a dict with a filename and either a `read` callable returning
+    the raw bytes or an error. Nothing is read or decompressed here; a batch
+    with more than max_files items or more than max_bytes of uncompressed zip
+    members raises ValueError as soon as the zip directory shows it.
+    """
+    limits = _BatchLimits(Config.BATCH_MAX_FILES if max_files is None else max_files,
+                          Config.BATCH_MAX_TOTAL_BYTES if max_bytes is None else max_bytes)
+    items = []
+    for file in files:
+        if not file or not file.filename:
+            continue
+        if file.filename.lower().endswith('.zip'):
+            items.extend(_expand_zip(file.filename, file.stream, limits))
+            continue
+        limits.add()
+        if allowed_file(file.filename):
+            items.append({'filename': file.filename, 'read': file.read})
+        else:
+            items.append({'filename': file.filename, 'error': 'Unsupported file type'})
+    return items
+
+def _expand_zip(archive_name, stream, limits):
+    """Yield batch items for every resume inside a zip archive, sized from its directory alone."""
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        limits.add()
+        yield {'filename': archive_name, 'error': 'Invalid zip archive'}
+        return
+    
+    # The archive stays open for the items' readers; the upload's stream is closed with the request
+    for info in archive.infolist():
+        basename = os.path.basename(info.filename)
+        if info.is_dir() or not basename or basename.startswith('.') or info.filename.startswith('__MACOSX/'):
+            continue
+        
+        filename = f"{archive_name}/{info.filename}"
+        if not allowed_file(basename):
+            limits.add()
+            yield {'filename': filename, 'error': 'Unsupported file type'}
+        elif info.file_size > Config.MAX_CONTENT_LENGTH:
+            limits.add()
+            yield {'filename': filename, 'error': 'File too large'}
+        else:
+            # file_size caps what zipfile will decompress, so a member cannot inflate past it
+            limits.add(info.file_size)
+            yield {'filename': filename, 'read': functools.partial(archive.read, info)}
+
+def _extract(item):
+    """Extract and sanitize the text of one batch item on the shared process pool."""
+    resume_text = get_extraction_pool().extract(os.path.basename(item['filename']), item['read']())
+    if not resume_text:
+        raise ValueError('Could not extract text from the file')
+    return resume_text
+
+def _error_message(e):
+    if isinstance(e, ValueError):
+        return str(e)
+    logger.error(f"Batch item failed: {str(e)}")
+    return 'An unexpected error occurred'
+
+def roast_batch(items, roaster, roast_type='standard', concurrency=None, extract_workers=None):
+    """Roast every item, yielding one result dict per item as it completes.
+    
+    Text extraction (dispatched to the shared extraction processes) and model
+    calls run on separate pools so parsing keeps the model pool fed; at most `concurrency` model calls are in flight.
+    Model calls wait for an upstream slot instead of being shed under load.
+    Failures are reported per item and never abort the batch.
+    """
+    concurrency = concurrency or Config.BATCH_CONCURRENCY
+    extract_workers = extract_workers or max(1, get_extraction_pool().workers)
+    results = queue.Queue()
+    extract_pool = ThreadPoolExecutor(max_workers=extract_workers, thread_name_prefix='batch-extract')
+    llm_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-llm')
+    
+    def finish(index, item, **fields):
+        results.put(dict(index=index, filename=item['filename'], **fields))
+    
+    def generate(index, item, resume_text):
+        try:
+            # No user waits on one item, so it queues for the upstream until its deadline
+            with patient_calls():
+                roast = roaster.generate_roast(resume_text, roast_type)
+            finish(index, item, success=True, roast=roast, roast_type=roast_type, degraded=is_degraded(roast))
+        except Exception as e:
+            finish(index, item, success=False, error=_error_message(e))
+    
+    def extract(index, item):
+        try:
+            resume_text = _extract(item)
+        except Exception as e:
+            finish(index, item, success=False, error=_error_message(e))
+            return
+        try:
+            llm_pool.submit(generate, index, item, resume_text)
+        except RuntimeError:
+            # The batch was abandoned and the pool shut down
+            pass
+    
+    try:
+        for index, item in enumerate(items):
+            if 'error' in item:
+                finish(index, item, success=False, error=item['error'])
+            else:
+                extract_pool.submit(extract, index, item)
+        
+        for _ in range(len(items)):
+            yield results.get()
+    finally:
+        extract_pool.shutdown(wait=False, cancel_futures=True)
+        llm_pool.shutdown(wait=False, cancel_futures=True)
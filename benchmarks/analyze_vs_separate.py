@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Combined analysis benchmark
+Compares one generate_analysis call against the two separate calls the page
+used to make (generate_roast, then generate_improvement_suggestions) on the
+same resume: prompt/completion tokens and wall-clock latency. The response
+cache is disabled so every run reaches the model.
+
+Usage:
+    python benchmarks/analyze_vs_separate.py resume.pdf [--repeat 3] [--roast-type savage]
+    python benchmarks/analyze_vs_separate.py resume.pdf --estimate   # prompt sizes only, no API calls
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ai_service import ANALYZE_SYSTEM_PROMPT, IMPROVE_SYSTEM_PROMPT, ROAST_SYSTEM_PROMPT, ResumeRoaster
+from extraction import ExtractionPool
+from prompt_budget import estimate_tokens
+
+def estimate_prompts(roaster, resume_text, roast_type):
+    """Approximate prompt tokens for both modes from the prompt builders."""
+    separate = (estimate_tokens(ROAST_SYSTEM_PROMPT) + estimate_tokens(roaster._build_prompt(resume_text, roast_type)) +
+                estimate_tokens(IMPROVE_SYSTEM_PROMPT) + estimate_tokens(roaster._build_improvement_prompt(resume_text)))
+    combined = estimate_tokens(ANALYZE_SYSTEM_PROMPT) + estimate_tokens(roaster._build_analysis_prompt(resume_text, roast_type))
+    return separate, combined
+
+def run_mode(roaster, fn, repeat):
+    """Run fn repeat times; return mean latency and mean tokens per run."""
+    latencies = []
+    before = roaster.token_usage()
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start_time)
+    after = roaster.token_usage()
+    return {
+        'latency': statistics.mean(latencies),
+        'prompt_tokens': (after['prompt_tokens'] - before['prompt_tokens']) / repeat,
+        'completion_tokens': (after['completion_tokens'] - before['completion_tokens']) / repeat,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare combined and separate roast/improve calls.")
+    parser.add_argument('resume', help="Resume file (.pdf, .docx or .txt)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--roast-type', choices=['gentle', 'standard', 'savage', 'professional'], default='standard')
+    parser.add_argument('--estimate', action='store_true', help="Only estimate prompt tokens; no API calls")
+    args = parser.parse_args()
+    
+    with open(args.resume, 'rb') as f:
+        data = f.read()
+    pool = ExtractionPool(workers=0)
+    resume_text = pool.extract(os.path.basename(args.resume), data)
+    
+    roaster = ResumeRoaster()
+    roaster.cache = None
+    
+    separate, combined = estimate_prompts(roaster, resume_text, args.roast_type)
+    print(f"Resume: {len(resume_text)} characters after sanitizing")
+    print(f"Estimated prompt tokens: separate {separate}, combined {combined} "
+          f"({(1 - combined / separate) * 100:.0f}% fewer)")
+    if args.estimate:
+        return
+    
+    results = {
+        'separate': run_mode(roaster, lambda: (roaster.generate_roast(resume_text, args.roast_type),
+                                               roaster.generate_improvement_suggestions(resume_text)), args.repeat),
+        'combined': run_mode(roaster, lambda: roaster.generate_analysis(resume_text, args.roast_type), args.repeat),
+    }
+    
+    print(f"\n{'mode':<10} {'latency':>10} {'prompt tok':>12} {'completion tok':>16}")
+    for mode, result in results.items():
+        print(f"{mode:<10} {result['latency']:>9.2f}s {result['prompt_tokens']:>12.0f} {result['completion_tokens']:>16.0f}")
+    
+    separate, combined = results['separate'], results['combined']
+    print(f"\nCombined saves {(1 - combined['latency'] / separate['latency']) * 100:.0f}% latency and "
+          f"{(1 - combined['prompt_tokens'] / separate['prompt_tokens']) * 100:.0f}% prompt tokens")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+ASGI vs WSGI load benchmark
+Starts the current production setup (gunicorn, 4 sync workers, wsgi.py) and
+the ASGI app (uvicorn, asgi.py) one after the other against the same fake
+model endpoint (benchmarks/fake_groq.py), fires the same concurrent upload
+load at each and prints throughput and latency percentiles side by side. The fake answers every chat
+completion after a fixed delay, so the numbers measure how many roasts each
+server keeps in flight, not the model. Response caching and rate limiting
+are switched off and every request uploads a different resume.
+
+Usage:
+    python benchmarks/asgi_vs_wsgi.py [--requests 200] [--concurrency 50] [--upstream-latency 2]
+    python benchmarks/asgi_vs_wsgi.py --upstream-url http://localhost:9000   # use another upstream
+"""
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from corpus import build_corpus
+from load_test import app_command, run_load, server_env, start_server, stop_server
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare gunicorn (WSGI) and uvicorn (ASGI) under upload load.")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--route', choices=['roast', 'improve'], default='roast')
+    parser.add_argument('--upstream-latency', type=float, default=2.0, help="Seconds the fake model takes per call")
+    parser.add_argument('--upstream-url', help="Model endpoint to use instead of the built-in fake")
+    parser.add_argument('--gunicorn-workers', type=int, default=4)
+    parser.add_argument('--uvicorn-workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=5100, help="First of three consecutive ports to use")
+    args = parser.parse_args()
+    
+    upstream_port, wsgi_port, asgi_port = args.port, args.port + 1, args.port + 2
+    env = server_env(args.upstream_url or f"http://127.0.0.1:{upstream_port}")
+    corpus = build_corpus(args.requests, file_types=('txt',))
+    
+    upstream = None
+    if not args.upstream_url:
+        # Fixed latency and output length, so only the server differs between runs
+        upstream = start_server([sys.executable, 'benchmarks/fake_groq.py', '--port', str(upstream_port),
+                                 '--latency', f'fixed:{args.upstream_latency}', '--output-tokens', 'fixed:160',
+                                 '--tokens-per-second', '1e9'], os.environ, upstream_port, '/stats')
+    
+    servers = {
+        f'gunicorn x{args.gunicorn_workers}': (app_command('gunicorn', args.gunicorn_workers, wsgi_port), wsgi_port),
+        f'uvicorn x{args.uvicorn_workers}': (app_command('uvicorn', args.uvicorn_workers, asgi_port), asgi_port),
+    }
+    
+    results = {}
+    try:
+        for name, (command, port) in servers.items():
+            print(f"Running {args.requests} requests at concurrency {args.concurrency} against {name}...")
+            process = start_server(command, env, port)
+            try:
+                results[name] = asyncio.run(run_load(f"http://127.0.0.1:{port}", corpus, args.requests,
+                                                     args.concurrency, (args.route,)))
+            finally:
+                stop_server(process)
+    finally:
+        if upstream is not None:
+            stop_server(upstream)
+    
+    print(f"\n{'server':<14} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}  statuses")
+    for name, result in results.items():
+        print(f"{name:<14} {result['throughput']:>8.2f} {result['p50']:>7.2f}s {result['p95']:>7.2f}s "
+              f"{result['p99']:>7.2f}s  {result['statuses']}")
+
+if __name__ == '__main__':
+    main()
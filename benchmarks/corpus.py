@@ -0,0 +1,142 @@
+"""
+Synthetic resume corpus for the benchmarks
+Builds PDF, DOCX and TXT resumes from a seed, so every run uploads the same
+bytes and no real resumes are needed. PDFs are written directly (one
+Helvetica text object per page) to avoid a PDF generation dependency.
+"""
+import io
+import random
+import struct
+import zlib
+import docx
+
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Okafor', 'Novak', 'Silva', 'Kowalski', 'Haddad', 'Larsen', 'Ito']
+TITLES = ['Software Engineer', 'Data Analyst', 'Product Manager', 'DevOps Engineer', 'Marketing Specialist',
+          'QA Engineer', 'Backend Developer', 'Frontend Developer', 'Data Scientist', 'Project Coordinator']
+COMPANIES = ['Acme Corp', 'Globex', 'Initech', 'Umbrella Labs', 'Hooli', 'Stark Industries', 'Wayne Enterprises',
+             'Soylent', 'Vandelay Imports', 'Tyrell Systems']
+SKILLS = ['Python', 'SQL', 'JavaScript', 'Docker', 'Kubernetes', 'AWS', 'React', 'Go', 'Excel', 'Tableau',
+          'Terraform', 'Java', 'Spark', 'Figma', 'Jira', 'Linux', 'PostgreSQL', 'Redis', 'GraphQL', 'Rust']
+VERBS = ['Led', 'Built', 'Designed', 'Migrated', 'Automated', 'Reduced', 'Improved', 'Launched', 'Maintained',
+         'Coordinated']
+OBJECTS = ['the billing pipeline', 'an internal dashboard', 'the onboarding flow', 'nightly ETL jobs',
+           'the public API', 'customer reporting', 'the deployment process', 'a recommendation service',
+           'legacy cron scripts', 'the mobile checkout']
+
+FILE_TYPES = ('pdf', 'docx', 'txt')
+
+def resume_sections(rng, jobs=3, bullets=4):
+    """Return [(heading, lines)] for one made-up candidate."""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    title = rng.choice(TITLES)
+    sections = [(name, [f"{title} | {name.split()[0].lower()}{rng.randint(1, 999)}@example.com",
+                        f"{rng.randint(1, 20)} years of experience"])]
+    sections.append(('Summary', [f"{title} who enjoys {rng.choice(OBJECTS)} and "
+                                 f"{rng.choice(SKILLS)}, looking for the next challenge."]))
+    experience = []
+    year = 2024
+    for _ in range(jobs):
+        start = year - rng.randint(1, 4)
+        experience.append(f"{rng.choice(TITLES)}, {rng.choice(COMPANIES)} ({start} - {year})")
+        for _ in range(bullets):
+            experience.append(f"- {rng.choice(VERBS)} {rng.choice(OBJECTS)} using {rng.choice(SKILLS)}, "
+                              f"cutting costs by {rng.randint(5, 60)}%")
+        year = start
+    sections.append(('Experience', experience))
+    sections.append(('Skills', [', '.join(rng.sample(SKILLS, 8))]))
+    sections.append(('Education', [f"B.Sc. Computer Science, State University ({year - 4} - {year})"]))
+    return sections
+
+def filler_lines(rng, count):
+    """Return count resume-like bullet lines, for documents of arbitrary length."""
+    return [f"- {rng.choice(VERBS)} {rng.choice(OBJECTS)} at {rng.choice(COMPANIES)} using "
+            f"{rng.choice(SKILLS)} and {rng.choice(SKILLS)}, cutting costs by {rng.randint(5, 60)}%"
+            for _ in range(count)]
+
+def resume_lines(sections):
+    lines = []
+    for heading, body in sections:
+        lines.append(heading)
+        lines.extend(body)
+        lines.append('')
+    return lines
+
+def make_txt(sections, encoding='utf-8'):
+    return "\n".join(resume_lines(sections)).encode(encoding)
+
+def _pdf_escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def make_pdf(pages):
+    """Build a PDF with one page per list of text lines."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, lines in enumerate(pages):
+        content = ("BT /F1 10 Tf 50 780 Td 12 TL "
+                   + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET").encode('latin-1', 'replace')
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode())
+        objects.append(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+    
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+def make_resume_pdf(sections, lines_per_page=60):
+    lines = resume_lines(sections)
+    return make_pdf([lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]])
+
+def make_png(rng, width=256, height=256):
+    """Build an uncompressible RGB PNG from rng so embedded images carry real weight."""
+    rows = b''.join(b'\x00' + rng.randbytes(width * 3) for _ in range(height))
+    
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+def make_docx(sections, tables=False, images=()):
+    """Build a DOCX; tables puts the skills into a table, images are PNG bytes to embed."""
+    document = docx.Document()
+    for heading, body in sections:
+        document.add_heading(heading, level=2)
+        if tables and heading == 'Skills':
+            skills = body[0].split(', ')
+            table = document.add_table(rows=(len(skills) + 3) // 4, cols=4)
+            for i, skill in enumerate(skills):
+                table.cell(i // 4, i % 4).text = skill
+            continue
+        for line in body:
+            document.add_paragraph(line)
+    for image in images:
+        document.add_picture(io.BytesIO(image))
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def build_corpus(count, seed=0, file_types=FILE_TYPES):
+    """Return count distinct (filename, bytes) resumes, cycling through file_types."""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        sections = resume_sections(rng, jobs=rng.randint(2, 5), bullets=rng.randint(2, 5))
+        file_type = file_types[i % len(file_types)]
+        if file_type == 'pdf':
+            data = make_resume_pdf(sections)
+        elif file_type == 'docx':
+            data = make_docx(sections, tables=i % 2 == 0)
+        else:
+            data = make_txt(sections)
+        corpus.append((f"resume{i}.{file_type}", data))
+    return corpus
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+DOCX extraction benchmark
+Compares the python-docx path with the streaming lxml path, with and without
+the sanitize_text character budget, on generated resumes of growing size.
+
+Usage:
+    python benchmarks/docx_extraction.py [--repeat 5]
+"""
+import argparse
+import io
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import docx
+from corpus import make_png
+from file_processor import (
+    MAX_TEXT_LENGTH,
+    _collect_within_budget,
+    iter_docx_paragraphs,
+    iter_docx_paragraphs_python_docx,
+)
+
+def make_docx(sections, images):
+    """Generate a resume-like DOCX with headings, bullet text, tables and images."""
+    document = docx.Document()
+    png = make_png(random.Random(0))
+    for section in range(sections):
+        document.add_heading(f'Experience {section}', level=2)
+        for line in range(8):
+            document.add_paragraph(
+                f'Led project {section}.{line}, improving throughput by {line * 7}% using Python and SQL.'
+            )
+        table = document.add_table(rows=3, cols=3)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = f'Skill {section} detail'
+    for _ in range(images):
+        document.add_picture(io.BytesIO(png))
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def measure(fn, data, repeat):
+    """Return (best seconds, peak traced bytes, characters extracted)."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = fn(io.BytesIO(data))
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(io.BytesIO(data))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, len(text)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DOCX text extraction paths.")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    extractors = {
+        'python-docx': lambda f: "\n".join(iter_docx_paragraphs_python_docx(f)),
+        'streaming': lambda f: "\n".join(iter_docx_paragraphs(f)),
+        'streaming+budget': lambda f: "\n".join(
+            _collect_within_budget(iter_docx_paragraphs(f), MAX_TEXT_LENGTH, 'DOCX')
+        ),
+    }
+    
+    print(f"{'document':<24}{'extractor':<20}{'best ms':>10}{'peak KB':>10}{'chars':>9}")
+    for sections, images in [(2, 0), (10, 2), (50, 10), (200, 20)]:
+        data = make_docx(sections, images)
+        label = f"{sections} sections/{images} img"
+        for name, fn in extractors.items():
+            seconds, peak, chars = measure(fn, data, args.repeat)
+            print(f"{label:<24}{name:<20}{seconds * 1000:>10.1f}{peak / 1024:>10.0f}{chars:>9}")
+        print(f"{'':<24}({len(data) / 1024:.0f} KB file)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Extraction benchmark suite
+Generates a deterministic corpus (1-100 page PDFs, DOCX with tables and
+images, large and oddly encoded TXT) and measures each file_processor
+extractor on it: extract_text_from_pdf/docx/txt without and with the
+RESUME_MAX_CHARS budget, and sanitize_text on the extracted text.
+
+For every case it reports the best and median time over --repeat runs, the
+peak traced memory of one run (tracemalloc), the memory still held after it
+(caches, leaks) and the net change in allocated memory blocks. CPython has
+no cumulative allocation counter, so peak and retained memory are what
+stand in for allocations.
+
+Results can be written to JSON and compared with an earlier run; cases whose
+median time or peak memory grew by more than --threshold percent are listed
+and the exit status is 1, so the suite can gate a change.
+
+Usage:
+    python benchmarks/extraction_suite.py [--repeat 5] [--filter pdf] [--output before.json]
+    python benchmarks/extraction_suite.py --compare before.json [--threshold 20] [--output after.json]
+"""
+import argparse
+import gc
+import io
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from corpus import filler_lines, make_docx, make_pdf, make_png, resume_sections, resume_lines
+from file_processor import (
+    MAX_TEXT_LENGTH,
+    extract_text_from_docx,
+    extract_text_from_pdf,
+    extract_text_from_txt,
+    sanitize_text,
+)
+
+# Differences below these are noise however large the percentage
+MIN_TIME_DELTA_MS = 0.5
+MIN_MEMORY_DELTA_KB = 64
+
+def _pdf(rng, pages):
+    return make_pdf([filler_lines(rng, 60) for _ in range(pages)])
+
+def _docx(rng, sections=1, images=0, tables=False):
+    content = resume_sections(rng)
+    for i in range(sections - 1):
+        content.append((f'Project {i}', filler_lines(rng, 8)))
+        content.append(('Skills', [', '.join(rng.sample(['Python', 'SQL', 'Go', 'AWS', 'Excel', 'Docker',
+                                                          'React', 'Linux'], 8))]))
+    return make_docx(content, tables=tables, images=[make_png(rng) for _ in range(images)])
+
+def _text(rng, size):
+    """Resume text of at least size characters."""
+    lines = resume_lines(resume_sections(rng))
+    while sum(len(line) + 1 for line in lines) < size:
+        lines.extend(filler_lines(rng, 100))
+    return "\n".join(lines)
+
+def _accented(rng, size):
+    names = ['José Núñez', 'Zoë Müller', 'François Lefèvre', 'Søren Ærø', 'Inês Conceição']
+    return "\n".join(f"{rng.choice(names)}: {line}" for line in _text(rng, size).split("\n"))
+
+def _whitespace(rng, size):
+    return "\r\n".join(f"\t{line}   \t  " + " " * rng.randint(0, 40) for line in _text(rng, size).split("\n"))
+
+CASES = {
+    'pdf-1p': ('pdf', lambda rng: _pdf(rng, 1)),
+    'pdf-10p': ('pdf', lambda rng: _pdf(rng, 10)),
+    'pdf-50p': ('pdf', lambda rng: _pdf(rng, 50)),
+    'pdf-100p': ('pdf', lambda rng: _pdf(rng, 100)),
+    'docx-resume': ('docx', lambda rng: _docx(rng)),
+    'docx-tables': ('docx', lambda rng: _docx(rng, sections=20, tables=True)),
+    'docx-5-images': ('docx', lambda rng: _docx(rng, images=5)),
+    'docx-20-images': ('docx', lambda rng: _docx(rng, sections=20, images=20, tables=True)),
+    'docx-200-sections': ('docx', lambda rng: _docx(rng, sections=200, tables=True)),
+    'txt-100kb-utf8': ('txt', lambda rng: _text(rng, 100_000).encode('utf-8')),
+    'txt-4mb-utf8': ('txt', lambda rng: _text(rng, 4_000_000).encode('utf-8')),
+    'txt-1mb-latin1': ('txt', lambda rng: _accented(rng, 1_000_000).encode('latin-1')),
+    # Valid UTF-8 until the last byte, so it is decoded twice
+    'txt-1mb-late-invalid': ('txt', lambda rng: _text(rng, 1_000_000).encode('utf-8') + b'\xff'),
+    'txt-1mb-utf16': ('txt', lambda rng: _accented(rng, 1_000_000).encode('utf-16')),
+    'txt-100kb-cp1252': ('txt', lambda rng: _text(rng, 100_000).replace(' - ', ' – ')
+                         .replace('using', '“using”').encode('cp1252')),
+    'txt-1mb-whitespace': ('txt', lambda rng: _whitespace(rng, 1_000_000).encode('utf-8')),
+}
+
+EXTRACTORS = {
+    'pdf': {
+        'extract': lambda data: extract_text_from_pdf(io.BytesIO(data)),
+        'extract+budget': lambda data: extract_text_from_pdf(io.BytesIO(data), max_chars=MAX_TEXT_LENGTH),
+    },
+    'docx': {
+        'extract': lambda data: extract_text_from_docx(io.BytesIO(data)),
+        'extract+budget': lambda data: extract_text_from_docx(io.BytesIO(data), max_chars=MAX_TEXT_LENGTH),
+    },
+    'txt': {
+        'extract': lambda data: extract_text_from_txt(io.BytesIO(data)),
+    },
+}
+
+def build_corpus(seed, pattern=None):
+    """Return {case: (file type, bytes)}; each case has its own rng so filtering keeps bytes identical."""
+    return {name: (file_type, build(random.Random(f"{seed}:{name}")))
+            for name, (file_type, build) in CASES.items() if not pattern or pattern in name}
+
+def _net_blocks(fn):
+    """Change in allocated memory blocks across one call of fn."""
+    gc.collect()
+    before = sys.getallocatedblocks()
+    fn()
+    gc.collect()
+    return sys.getallocatedblocks() - before
+
+def measure(fn, repeat):
+    """Time fn repeat times, then trace one more run's memory."""
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start_time)
+    chars = len(result)
+    del result
+    
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The measurement itself allocates a few blocks; a no-op call gives that baseline
+    blocks = _net_blocks(fn) - _net_blocks(lambda: None)
+    return {
+        'best_ms': round(min(times) * 1000, 3),
+        'median_ms': round(statistics.median(times) * 1000, 3),
+        'peak_kb': round(peak / 1024, 1),
+        'retained_kb': round(retained / 1024, 1),
+        'blocks': blocks,
+        'chars': chars,
+    }
+
+def run(corpus, repeat):
+    results = {}
+    for name, (file_type, data) in corpus.items():
+        text = None
+        for extractor, fn in EXTRACTORS[file_type].items():
+            result = measure(lambda: fn(data), repeat)
+            results[f"{name}/{extractor}"] = dict(result, size_kb=round(len(data) / 1024, 1))
+            print_row(f"{name}/{extractor}", results[f"{name}/{extractor}"])
+            if extractor == 'extract':
+                text = fn(data)
+        result = measure(lambda: sanitize_text(text), repeat)
+        results[f"{name}/sanitize"] = dict(result, size_kb=round(len(text) / 1024, 1))
+        print_row(f"{name}/sanitize", results[f"{name}/sanitize"])
+    return results
+
+def print_row(key, result):
+    print(f"{key:<36}{result['size_kb']:>9.0f}{result['best_ms']:>10.2f}{result['median_ms']:>10.2f}"
+          f"{result['peak_kb']:>10.0f}{result['retained_kb']:>10.1f}{result['blocks']:>8}{result['chars']:>9}")
+
+def compare(previous, current, threshold):
+    """Print changes against an earlier run and return the keys that regressed."""
+    regressions = []
+    print(f"\n{'case':<36}{'median ms':>20}{'peak KB':>20}")
+    for key, result in current.items():
+        before = previous.get(key)
+        if before is None:
+            continue
+        changes = []
+        regressed = False
+        for metric, floor in (('median_ms', MIN_TIME_DELTA_MS), ('peak_kb', MIN_MEMORY_DELTA_KB)):
+            delta = result[metric] - before[metric]
+            percent = delta / before[metric] * 100 if before[metric] else 0.0
+            changes.append(f"{before[metric]:>8.1f} -> {result[metric]:<8.1f}{percent:>+4.0f}%")
+            if percent > threshold and delta > floor:
+                regressed = True
+        print(f"{key:<36}{'  '.join(changes)}" + ("  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark file_processor extractors on a generated corpus.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0, help="Corpus seed; keep it fixed across compared runs")
+    parser.add_argument('--filter', help="Only run cases whose name contains this")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=20.0, help="Percent growth reported as a regression")
+    args = parser.parse_args()
+    
+    # Budget stops and truncation warnings would be logged on every run
+    logging.getLogger('file_processor').setLevel(logging.ERROR)
+    
+    print("Generating corpus...")
+    corpus = build_corpus(args.seed, args.filter)
+    print(f"\n{'case':<36}{'size KB':>9}{'best ms':>10}{'median ms':>10}{'peak KB':>10}{'kept KB':>10}"
+          f"{'blocks':>8}{'chars':>9}")
+    results = run(corpus, args.repeat)
+    
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'max_text_length': MAX_TEXT_LENGTH,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if previous['meta'].get('seed') != args.seed:
+            print(f"Warning: {args.compare} used seed {previous['meta'].get('seed')}, this run {args.seed}")
+        regressions = compare(previous['results'], results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions over {args.threshold:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Fake Groq server
+Answers POST /openai/v1/chat/completions like the Groq API, streaming and
+non-streaming, so the app can be load tested without spending quota. Point
+the app at it with GROQ_BASE_URL=http://127.0.0.1:9000 (any GROQ_API_KEY).
+
+Each call waits a time to first token drawn from --latency, then "generates"
+a completion whose length is drawn from --output-tokens at
+--tokens-per-second; the length is cut at the request's max_tokens with
+finish_reason "length". --error-rate answers 500s, --rate-limit-rate and
+--max-concurrency answer 429s with a Retry-After header. GET /stats returns
+what the server has seen.
+
+Distributions are "fixed:V", "uniform:LOW,HIGH", "normal:MEAN,STDDEV",
+"lognormal:MEDIAN,SIGMA" or "exp:MEAN" (seconds, or tokens for lengths).
+
+Usage:
+    python benchmarks/fake_groq.py [--port 9000] [--latency lognormal:0.8,0.5] [--error-rate 0.01]
+        [--rate-limit-rate 0.02] [--max-concurrency 100] [--output-tokens normal:350,100] [--seed 1]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+WORDS = ('your resume reads like a terms of service page nobody asked for, the skills section lists '
+         'every tool you have ever opened once and the summary promises synergy with alarming confidence '
+         'consider quantifying impact trimming buzzwords and leading each bullet with a result').split()
+
+def parse_distribution(spec):
+    """Turn a distribution spec into a function sampling it from an rng."""
+    kind, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(',') if value]
+    samplers = {
+        'fixed': lambda rng, v: v[0],
+        'uniform': lambda rng, v: rng.uniform(v[0], v[1]),
+        'normal': lambda rng, v: rng.gauss(v[0], v[1]),
+        'lognormal': lambda rng, v: v[0] * math.exp(rng.gauss(0, v[1])),
+        'exp': lambda rng, v: rng.expovariate(1 / v[0]),
+    }
+    arity = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exp': 1}
+    if kind not in samplers or len(values) != arity[kind]:
+        raise ValueError(f"Invalid distribution '{spec}'")
+    return lambda rng: max(0.0, samplers[kind](rng, values))
+
+class FakeGroq:
+    """State and behaviour of one fake server."""
+    
+    def __init__(self, latency='lognormal:0.8,0.5', output_tokens='normal:350,100', tokens_per_second=500.0,
+                 error_rate=0.0, rate_limit_rate=0.0, max_concurrency=0, retry_after=1, seed=None):
+        self.latency = parse_distribution(latency)
+        self.output_tokens = parse_distribution(output_tokens)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.max_concurrency = max_concurrency
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.in_flight = 0
+        self.counts = {'requests': 0, 'completed': 0, 'streamed': 0, 'errors': 0, 'rate_limited': 0,
+                       'truncated': 0, 'peak_in_flight': 0}
+    
+    def _error(self, status_code, message, error_type, headers=None):
+        return JSONResponse({'error': {'message': message, 'type': error_type}}, status_code=status_code,
+                            headers=headers)
+    
+    async def chat_completions(self, request):
+        body = await request.json()
+        self.counts['requests'] += 1
+        
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            self.counts['rate_limited'] += 1
+            return self._error(429, 'Too many concurrent requests', 'rate_limit_exceeded',
+                               {'Retry-After': str(self.retry_after)})
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            self.counts['rate_limited'] += 1
+            return self._error(429, 'Rate limit reached', 'rate_limit_exceeded', {'Retry-After': str(self.retry_after)})
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.counts['errors'] += 1
+            return self._error(500, 'Internal server error', 'internal_server_error')
+        
+        wanted = max(1, int(self.output_tokens(self.rng)))
+        max_tokens = body.get('max_tokens') or wanted
+        tokens = min(wanted, max_tokens)
+        finish_reason = 'length' if wanted > max_tokens else 'stop'
+        if finish_reason == 'length':
+            self.counts['truncated'] += 1
+        first_token = self.latency(self.rng)
+        prompt_tokens = sum(len(str(message.get('content', '')).split()) for message in body.get('messages', []))
+        words = [self.rng.choice(WORDS) for _ in range(tokens)]
+        completion = {
+            'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+        }
+        
+        if body.get('stream'):
+            self.counts['streamed'] += 1
+            return StreamingResponse(self._stream(completion, words, first_token, finish_reason),
+                                     media_type='text/event-stream')
+        
+        self._enter()
+        try:
+            await asyncio.sleep(first_token + tokens / self.tokens_per_second)
+        finally:
+            self._exit()
+        self.counts['completed'] += 1
+        return JSONResponse(dict(completion, object='chat.completion', choices=[{
+            'index': 0,
+            'finish_reason': finish_reason,
+            'logprobs': None,
+            'message': {'role': 'assistant', 'content': ' '.join(words)},
+        }], usage={
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': tokens,
+            'total_tokens': prompt_tokens + tokens,
+        }))
+    
+    async def _stream(self, completion, words, first_token, finish_reason):
+        def event(delta, reason=None):
+            chunk = dict(completion, object='chat.completion.chunk',
+                         choices=[{'index': 0, 'delta': delta, 'finish_reason': reason, 'logprobs': None}])
+            return f"data: {json.dumps(chunk)}\n\n"
+        
+        self._enter()
+        try:
+            await asyncio.sleep(first_token)
+            yield event({'role': 'assistant', 'content': ''})
+            # Flush a few tokens at a time; one event per token would measure the event loop instead
+            batch = 8
+            for i in range(0, len(words), batch):
+                await asyncio.sleep(len(words[i:i + batch]) / self.tokens_per_second)
+                yield event({'content': ('' if i == 0 else ' ') + ' '.join(words[i:i + batch])})
+            yield event({}, finish_reason)
+            yield "data: [DONE]\n\n"
+            self.counts['completed'] += 1
+        finally:
+            self._exit()
+    
+    def _enter(self):
+        self.in_flight += 1
+        self.counts['peak_in_flight'] = max(self.counts['peak_in_flight'], self.in_flight)
+    
+    def _exit(self):
+        self.in_flight -= 1
+    
+    async def stats(self, request):
+        return JSONResponse(dict(self.counts, in_flight=self.in_flight))
+
+def create_app(**options):
+    """Build the fake server's ASGI app; options are FakeGroq arguments."""
+    fake = FakeGroq(**options)
+    return Starlette(routes=[
+        Route('/openai/v1/chat/completions', fake.chat_completions, methods=['POST']),
+        Route('/stats', fake.stats),
+    ])
+
+def add_arguments(parser, prefix=''):
+    """Add the fake server options to parser, optionally with a flag prefix."""
+    parser.add_argument(f'--{prefix}latency', default='lognormal:0.8,0.5',
+                        help="Time to first token distribution in seconds")
+    parser.add_argument(f'--{prefix}output-tokens', default='normal:350,100',
+                        help="Completion length distribution in tokens")
+    parser.add_argument(f'--{prefix}tokens-per-second', type=float, default=500.0)
+    parser.add_argument(f'--{prefix}error-rate', type=float, default=0.0, help="Share of calls answered with 500")
+    parser.add_argument(f'--{prefix}rate-limit-rate', type=float, default=0.0,
+                        help="Share of calls answered with 429")
+    parser.add_argument(f'--{prefix}max-concurrency', type=int, default=0,
+                        help="Answer 429 above this many calls in flight (0 = unlimited)")
+    parser.add_argument(f'--{prefix}retry-after', type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument(f'--{prefix}seed', type=int)
+
+def server_command(args, port, prefix=''):
+    """Build the command line that starts this server with parsed add_arguments options."""
+    command = ['benchmarks/fake_groq.py', '--port', str(port)]
+    for name in ('latency', 'output_tokens', 'tokens_per_second', 'error_rate', 'rate_limit_rate',
+                 'max_concurrency', 'retry_after', 'seed'):
+        value = getattr(args, prefix.replace('-', '_') + name)
+        if value is not None:
+            command += [f"--{name.replace('_', '-')}", str(value)]
+    return command
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Groq chat completions API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    add_arguments(parser)
+    args = parser.parse_args()
+    
+    import uvicorn
+    app = create_app(latency=args.latency, output_tokens=args.output_tokens,
+                     tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+                     rate_limit_rate=args.rate_limit_rate, max_concurrency=args.max_concurrency,
+                     retry_after=args.retry_after, seed=args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test
+Uploads a synthetic corpus of PDF, DOCX and TXT resumes (benchmarks/corpus.py)
+to /api/roast and /api/improve and reports throughput and p50/p95/p99 latency
+per route. Without --url it starts the app itself (uvicorn or gunicorn) on a
+fake Groq server (benchmarks/fake_groq.py), with response caching and rate
+limiting switched off, so the run measures the app and costs no quota.
+
+By default a fixed number of requests is kept in flight (--concurrency);
+--rate instead starts requests at a fixed arrival rate and counts time spent
+waiting for a connection as latency, which is what capacity planning needs.
+
+Usage:
+    python benchmarks/load_test.py [--server uvicorn|gunicorn] [--workers 2] [--requests 500] [--concurrency 50]
+    python benchmarks/load_test.py --rate 20 --upstream-latency lognormal:1.5,0.6 --upstream-rate-limit-rate 0.05
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --routes improve   # an already running app
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from corpus import FILE_TYPES, build_corpus
+import fake_groq
+
+PROJECT_DIR = Path(__file__).parent.parent
+ROAST_TYPES = ('standard', 'gentle', 'savage')
+
+def percentile(samples, q):
+    """Return the q-th percentile (0-100) of a non-empty list."""
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))]
+
+def start_server(command, env, port, path='/'):
+    """Start a server subprocess and wait until it answers."""
+    process = subprocess.Popen(command, cwd=PROJECT_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{command[0]} exited with status {process.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}{path}", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{command[0]} did not start on port {port}")
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def server_env(upstream_url, **overrides):
+    """Environment for an app server talking to upstream_url with caching and rate limiting off."""
+    # Keep fake outputs out of the real output length statistics
+    stats_path = os.path.join(tempfile.mkdtemp(prefix='load_test'), 'output_lengths.sqlite3')
+    return dict(os.environ, GROQ_API_KEY=os.getenv('GROQ_API_KEY', 'benchmark'), GROQ_BASE_URL=upstream_url,
+                CACHE_BACKEND='none', RATE_LIMIT_BACKEND='none', OUTPUT_STATS_PATH=stats_path, **overrides)
+
+def app_command(server, workers, port):
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                '--timeout', '60', 'wsgi:application']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--port', str(port), '--workers', str(workers),
+            '--log-level', 'warning']
+
+def summarize(latencies, elapsed):
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.mean(latencies),
+    }
+
+async def run_load(url, corpus, total, concurrency, routes=('roast',), rate=None):
+    """POST total uploads from corpus, spread over routes; return overall and per-route results."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {route: [] for route in routes}
+    statuses = {route: {} for route in routes}
+    degraded = {route: 0 for route in routes}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    
+    async def one(client, i):
+        route = routes[i % len(routes)]
+        filename, data = corpus[i % len(corpus)]
+        arrived = time.perf_counter()
+        async with semaphore:
+            # Closed loop: time the request itself; open loop: include the wait for a free slot
+            start_time = arrived if rate else time.perf_counter()
+            try:
+                response = await client.post(f"{url}/api/{route}", files={'resume': (filename, data)},
+                                             data={'roast_type': ROAST_TYPES[i % len(ROAST_TYPES)]})
+                status = response.status_code
+                if status == 200 and response.json().get('degraded'):
+                    degraded[route] += 1
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies[route].append(time.perf_counter() - start_time)
+            statuses[route][status] = statuses[route].get(status, 0) + 1
+    
+    start_time = time.perf_counter()
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        if rate:
+            tasks = []
+            for i in range(total):
+                tasks.append(asyncio.create_task(one(client, i)))
+                await asyncio.sleep(1 / rate)
+            await asyncio.gather(*tasks)
+        else:
+            await asyncio.gather(*(one(client, i) for i in range(total)))
+    elapsed = time.perf_counter() - start_time
+    
+    result = summarize([latency for route in routes for latency in latencies[route]], elapsed)
+    result['statuses'] = {}
+    result['routes'] = {}
+    for route in routes:
+        if latencies[route]:
+            result['routes'][route] = dict(summarize(latencies[route], elapsed), statuses=statuses[route],
+                                           degraded=degraded[route])
+        for status, count in statuses[route].items():
+            result['statuses'][status] = result['statuses'].get(status, 0) + count
+    return result
+
+def print_results(results):
+    print(f"\n{'route':<10} {'requests':>8} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}  statuses")
+    rows = list(results['routes'].items()) + [('all', results)]
+    for route, result in rows:
+        print(f"{route:<10} {result['requests']:>8} {result['throughput']:>8.2f} {result['p50']:>7.2f}s "
+              f"{result['p95']:>7.2f}s {result['p99']:>7.2f}s  {result['statuses']}"
+              + (f" degraded={result['degraded']}" if result.get('degraded') else ""))
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the upload API against a fake or real model.")
+    parser.add_argument('--url', help="Base URL of a running app; by default one is started")
+    parser.add_argument('--server', choices=['uvicorn', 'gunicorn'], default='uvicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50, help="Most requests in flight at once")
+    parser.add_argument('--rate', type=float, help="Start requests at this many per second (open loop)")
+    parser.add_argument('--routes', default='roast,improve', help="Comma-separated routes, used in turn")
+    parser.add_argument('--file-types', default=','.join(FILE_TYPES), help="Comma-separated corpus file types")
+    parser.add_argument('--corpus-size', type=int, help="Distinct resumes to upload (default: one per request)")
+    parser.add_argument('--seed', type=int, default=0, help="Corpus seed")
+    parser.add_argument('--upstream-url', help="Model endpoint to use instead of the fake server")
+    parser.add_argument('--port', type=int, default=5200, help="First of two consecutive ports to use")
+    parser.add_argument('--json', help="Also write the results to this file")
+    fake_groq.add_arguments(parser, prefix='upstream-')
+    args = parser.parse_args()
+    
+    routes = tuple(route.strip() for route in args.routes.split(',') if route.strip())
+    file_types = tuple(file_type.strip() for file_type in args.file_types.split(',') if file_type.strip())
+    print(f"Building {args.corpus_size or args.requests} synthetic resumes ({', '.join(file_types)})...")
+    corpus = build_corpus(args.corpus_size or args.requests, seed=args.seed, file_types=file_types)
+    
+    upstream_port, app_port = args.port, args.port + 1
+    processes = []
+    upstream_url = args.upstream_url or f"http://127.0.0.1:{upstream_port}"
+    try:
+        if not args.url and not args.upstream_url:
+            processes.append(start_server([sys.executable] + fake_groq.server_command(args, upstream_port, 'upstream-'),
+                                          os.environ, upstream_port, '/stats'))
+        url = args.url
+        if not url:
+            processes.append(start_server(app_command(args.server, args.workers, app_port),
+                                          server_env(upstream_url), app_port))
+            url = f"http://127.0.0.1:{app_port}"
+        
+        mode = f"at {args.rate} req/s" if args.rate else f"at concurrency {args.concurrency}"
+        print(f"Running {args.requests} requests {mode} against {url} ({', '.join(routes)})...")
+        results = asyncio.run(run_load(url, corpus, args.requests, args.concurrency, routes, args.rate))
+        if not args.url and not args.upstream_url:
+            results['upstream'] = httpx.get(f"{upstream_url}/stats").json()
+    finally:
+        for process in reversed(processes):
+            stop_server(process)
+    
+    print_results(results)
+    if 'upstream' in results:
+        print(f"\nFake upstream: {results['upstream']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(dict(results, args=vars(args)), f, indent=2, default=str)
+
+if __name__ == '__main__':
+    main()
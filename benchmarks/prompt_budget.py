@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Prompt budget report
+Extracts each resume the way the app does and prints the estimated resume
+tokens before and after prompt_budget compression, the sections dropped to
+fit PROMPT_TOKEN_BUDGET and the time compression took. No API calls are made.
+
+Usage:
+    python benchmarks/prompt_budget.py resumes/ [more files or directories] [--budget 1500]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import Config
+from extraction import ExtractionPool
+from prompt_budget import compress_resume
+
+RESUME_EXTENSIONS = ('.pdf', '.docx', '.txt')
+
+def find_files(paths):
+    """Expand directories into the resume files under them."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(RESUME_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def main():
+    parser = argparse.ArgumentParser(description="Report resume token counts before and after compression.")
+    parser.add_argument('paths', nargs='+', help="Resume files or directories")
+    parser.add_argument('--budget', type=int, default=Config.PROMPT_TOKEN_BUDGET)
+    args = parser.parse_args()
+    
+    pool = ExtractionPool(workers=0)
+    total_before = total_after = 0
+    print(f"{'file':<40} {'chars':>7} {'before':>7} {'after':>7} {'ms':>6}  dropped")
+    for path in find_files(args.paths):
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            text = pool.extract(os.path.basename(path), data)
+        except ValueError as e:
+            print(f"{os.path.basename(path)[:40]:<40} error: {e}")
+            continue
+        
+        start_time = time.perf_counter()
+        result = compress_resume(text, args.budget)
+        elapsed = (time.perf_counter() - start_time) * 1000
+        total_before += result.tokens_before
+        total_after += result.tokens_after
+        dropped = ', '.join(title for title in result.dropped_sections if title)
+        print(f"{os.path.basename(path)[:40]:<40} {len(text):>7} {result.tokens_before:>7} "
+              f"{result.tokens_after:>7} {elapsed:>6.1f}  {dropped}")
+    
+    if total_before:
+        print(f"\nBudget {args.budget}: ~{total_before} -> ~{total_after} resume tokens "
+              f"({(1 - total_after / total_before) * 100:.0f}% fewer)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Circuit breaker for the upstream model.
+
+After CIRCUIT_FAILURE_THRESHOLD consecutive upstream failures the circuit
+opens and calls fail fast with CircuitOpenError instead of each waiting for
+its own timeout. Once CIRCUIT_RESET_SECONDS have passed a limited number of
+half-open probe calls are let through: a success closes the circuit, a
+failure opens it for another cool-down.
+"""
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+from governor import UpstreamOverloadedError
+from retry import is_retryable
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(UpstreamOverloadedError):
+    """Raised instead of calling the model while the circuit is open."""
+    
+    def __init__(self, retry_after=1):
+        super().__init__("The AI service is temporarily unavailable. Please try again shortly.", retry_after)
+
+def is_upstream_failure(e):
+    """True for errors that suggest the provider is down rather than busy or refusing the request.
+    
+    Client timeouts count; running out of our own deadline while queued does not.
+    """
+    return getattr(e, 'status_code', None) != 429 and is_retryable(e)
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker shared by every upstream call in the process."""
+    
+    def __init__(self, failure_threshold=None, reset_timeout=None, half_open_max_calls=None):
+        self.failure_threshold = failure_threshold or Config.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or Config.CIRCUIT_RESET_SECONDS
+        self.half_open_max_calls = half_open_max_calls or Config.CIRCUIT_HALF_OPEN_MAX_CALLS
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self.opened = 0
+        self.rejected = 0
+        self.probes = 0
+    
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError; return True if the call is a probe."""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(retry_after=max(1, math.ceil(remaining)))
+                self.state = HALF_OPEN
+                logger.info("Circuit half-open, probing the AI service")
+            
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError()
+                self._probes_in_flight += 1
+                self.probes += 1
+                return True
+            return False
+    
+    def record_success(self, probe=False):
+        with self._lock:
+            self._failures = 0
+            if probe:
+                self._probes_in_flight -= 1
+            if self.state != CLOSED:
+                self.state = CLOSED
+                logger.info("Circuit closed, AI service recovered")
+    
+    def record_failure(self, probe=False):
+        with self._lock:
+            self._failures += 1
+            if probe:
+                self._probes_in_flight -= 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                logger.warning(f"Circuit opened after {self._failures} consecutive upstream failures")
+    
+    def record_ignored(self, probe=False):
+        """Finish a call whose outcome says nothing about upstream health."""
+        if probe:
+            with self._lock:
+                self._probes_in_flight -= 1
+    
+    @contextmanager
+    def guard(self):
+        """Run the with-block as one upstream call through the breaker."""
+        probe = self.before_call()
+        try:
+            yield
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.record_failure(probe)
+            else:
+                self.record_ignored(probe)
+            raise
+        except BaseException:
+            self.record_ignored(probe)
+            raise
+        self.record_success(probe)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'opened': self.opened,
+                'rejected': self.rejected,
+                'probes': self.probes,
+            }
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+def get_circuit_breaker():
+    """Return the process-wide circuit breaker shared by every ResumeRoaster."""
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker()
+        return _breaker
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Resume Roaster Bulk CLI
+Roasts every resume in a directory and writes one JSON record per file to a
+JSONL output. Re-running with the same output file skips resumes that
+already have a record, so an interrupted run picks up where it left off.
+Records holding template ("degraded") output written while the AI service
+was down are always redone. With --retry-failed a path may appear more than
+once; its last record wins.
+
+With --async the model calls run on one event loop over a single connection
+pool, so --concurrency can be in the hundreds without a thread per call.
+
+Usage:
+    python bulk_roast.py resumes/ -o roasts.jsonl --concurrency 8 --rate-limit 30
+    python bulk_roast.py resumes/ -o roasts.jsonl --async --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from extraction import ExtractionPool
+from governor import ConcurrencyGovernor, patient_calls
+
+RESUME_EXTENSIONS = ('.pdf', '.docx', '.txt')
+
+class RateLimiter:
+    """Space out calls so no more than `per_minute` start in any minute."""
+    
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def find_resumes(directory):
+    """Return resume paths under directory, relative to it and sorted."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(RESUME_EXTENSIONS) and not name.startswith('.'):
+                paths.append(os.path.relpath(os.path.join(root, name), directory))
+    return sorted(paths)
+
+def load_checkpoint(output_path, retry_failed=False):
+    """Return the set of resumes that already have a record in the output file.
+    
+    Degraded records (template output from an outage) never count as done.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash can leave a truncated final line; that resume is redone
+                continue
+            if record.get('degraded'):
+                done.discard(record['path'])
+            elif record.get('success') or not retry_failed:
+                done.add(record['path'])
+    return done
+
+def extract_resume(pool, path):
+    """Extract sanitized text from one resume file on the extraction pool."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    resume_text = pool.extract(os.path.basename(path), data)
+    if not resume_text:
+        raise ValueError('Could not extract text from the file')
+    return resume_text
+
+def _open_output(output_path):
+    """Open the output for appending, terminating any truncated last line."""
+    needs_newline = False
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+    out = open(output_path, 'a', encoding='utf-8')
+    if needs_newline:
+        out.write('\n')
+    return out
+
+def run(args):
+    """Roast every pending resume and return (processed, failed) counts."""
+    from ai_service import ResumeRoaster, is_degraded
+    from async_ai_service import AsyncResumeRoaster
+    
+    paths = find_resumes(args.directory)
+    done = load_checkpoint(args.output, args.retry_failed)
+    pending = [path for path in paths if path not in done]
+    
+    print(f"📂 Found {len(paths)} resumes, {len(done)} already done, {len(pending)} to process")
+    if not pending:
+        return 0, 0
+    
+    if args.use_async:
+        roaster = AsyncResumeRoaster(max_in_flight=args.concurrency)
+    else:
+        # The default governor is sized for web serving; this run's cap is --concurrency,
+        # still halved while the provider answers 429
+        governor = ConcurrencyGovernor(initial_limit=args.concurrency, max_limit=args.concurrency)
+        roaster = ResumeRoaster(governor=governor)
+    extraction_pool = ExtractionPool(workers=args.workers)
+    limiter = RateLimiter(args.rate_limit)
+    tokens_before = roaster.token_usage()
+    # Bound how far extraction may run ahead of the model calls
+    in_flight = threading.BoundedSemaphore(args.concurrency * 4)
+    write_lock = threading.Lock()
+    counts = {'processed': 0, 'failed': 0, 'degraded': 0}
+    start_time = time.time()
+    
+    out = _open_output(args.output)
+    
+    def write(path, **fields):
+        record = dict(path=path, **fields)
+        with write_lock:
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            counts['processed'] += 1
+            if not record['success']:
+                counts['failed'] += 1
+            if record.get('degraded'):
+                counts['degraded'] += 1
+            if counts['processed'] % 100 == 0:
+                elapsed = time.time() - start_time
+                print(f"  {counts['processed']}/{len(pending)} done ({counts['processed'] / elapsed:.1f} files/s)")
+    
+    def generate(path, resume_text):
+        try:
+            limiter.wait()
+            call_start = time.time()
+            # Queue for the upstream until the call's deadline instead of being shed
+            with patient_calls():
+                if args.operation == 'improve':
+                    output = {'suggestions': roaster.generate_improvement_suggestions(resume_text)}
+                elif args.operation == 'analyze':
+                    output = dict(roaster.generate_analysis(resume_text, args.roast_type), roast_type=args.roast_type)
+                else:
+                    output = {'roast': roaster.generate_roast(resume_text, args.roast_type),
+                              'roast_type': args.roast_type}
+            write(path, success=True, degraded=is_degraded(*output.values()),
+                  elapsed_seconds=round(time.time() - call_start, 3), **output)
+        except Exception as e:
+            write(path, success=False, error=str(e))
+        finally:
+            in_flight.release()
+    
+    async def agenerate(path, resume_text):
+        try:
+            if limiter.interval:
+                await asyncio.to_thread(limiter.wait)
+            call_start = time.time()
+            with patient_calls():
+                if args.operation == 'improve':
+                    output = {'suggestions': await roaster.generate_improvement_suggestions(resume_text)}
+                elif args.operation == 'analyze':
+                    output = dict(await roaster.generate_analysis(resume_text, args.roast_type),
+                                  roast_type=args.roast_type)
+                else:
+                    output = {'roast': await roaster.generate_roast(resume_text, args.roast_type),
+                              'roast_type': args.roast_type}
+            write(path, success=True, degraded=is_degraded(*output.values()),
+                  elapsed_seconds=round(time.time() - call_start, 3), **output)
+        except Exception as e:
+            write(path, success=False, error=str(e))
+        finally:
+            in_flight.release()
+    
+    if args.use_async:
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        calls = []
+        dispatch = lambda path, text: calls.append(asyncio.run_coroutine_threadsafe(agenerate(path, text), loop))
+    else:
+        llm_pool = ThreadPoolExecutor(max_workers=args.concurrency)
+        dispatch = lambda path, text: llm_pool.submit(generate, path, text)
+    
+    def on_extracted(path, future):
+        try:
+            resume_text = future.result()
+        except Exception as e:
+            write(path, success=False, error=str(e))
+            in_flight.release()
+            return
+        dispatch(path, resume_text)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as extract_pool:
+            for path in pending:
+                in_flight.acquire()
+                future = extract_pool.submit(extract_resume, extraction_pool, os.path.join(args.directory, path))
+                future.add_done_callback(lambda f, path=path: on_extracted(path, f))
+        if args.use_async:
+            for call in calls:
+                call.result()
+            asyncio.run_coroutine_threadsafe(roaster.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+        else:
+            llm_pool.shutdown()
+    finally:
+        out.close()
+        extraction_pool.shutdown()
+    
+    elapsed = time.time() - start_time
+    tokens_after = roaster.token_usage()
+    tokens = sum(tokens_after.values()) - sum(tokens_before.values())
+    print(f"\n📊 Processed {counts['processed']} resumes ({counts['failed']} failed) in {elapsed:.1f}s")
+    print(f"⚡ Throughput: {counts['processed'] / elapsed:.2f} files/s, {tokens / elapsed:.1f} tokens/s")
+    if counts['degraded']:
+        print(f"⚠️  {counts['degraded']} got template output while the AI service was down; "
+              f"re-run the same command to redo them")
+    return counts['processed'], counts['failed']
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Roast a directory of resumes to a JSONL file.")
+    parser.add_argument('directory', help="Directory containing .pdf, .docx and .txt resumes")
+    parser.add_argument('-o', '--output', default='roasts.jsonl', help="JSONL output (also the checkpoint)")
+    parser.add_argument('--operation', choices=['roast', 'improve', 'analyze'], default='roast')
+    parser.add_argument('--roast-type', choices=['gentle', 'standard', 'savage', 'professional'], default='standard')
+    parser.add_argument('--concurrency', type=int, default=Config.BATCH_CONCURRENCY,
+                        help="Maximum concurrent model calls (lowered while the provider rate limits)")
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help="Maximum model calls per minute (0 for no limit)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Extraction worker processes")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="Make model calls from one event loop instead of a thread per call")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Process resumes whose previous record is an error again")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Main bulk roasting function."""
+    args = parse_args(argv)
+    print("🔥 Resume Roaster Bulk CLI 🔥")
+    print("=" * 50)
+    
+    if not os.path.isdir(args.directory):
+        print(f"❌ Error: {args.directory} is not a directory")
+        return 1
+    
+    try:
+        Config.validate_config()
+    except ValueError as e:
+        print(f"❌ Error: {e}")
+        return 1
+    
+    try:
+        run(args)
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted. Re-run the same command to resume.")
+        return 130
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from sqlite_local import LocalConnection
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """Base class for the LRU/TTL caches; tracks hit/miss counters and time saved."""
+    
+    def __init__(self, ttl=None, max_entries=None, name='Response'):
+        self.name = name
+        self.ttl = Config.CACHE_TTL_SECONDS if ttl is None else ttl
+        self.max_entries = Config.CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+    
+    def _record(self, hit, generation_time=0.0):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+                self.time_saved += generation_time
+            else:
+                self.misses += 1
+    
+    def get(self, key):
+        raise NotImplementedError
+    
+    def set(self, key, value, generation_time=0.0):
+        raise NotImplementedError
+    
+    def stats(self):
+        """Return hit/miss counters and the upstream time saved by hits."""
+        with self._stats_lock:
+            hits, misses, time_saved = self.hits, self.misses, self.time_saved
+        total = hits + misses
+        return {
+            'backend': self.backend,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+            'time_saved_seconds': round(time_saved, 3),
+        }
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache with TTL, local to a single worker."""
+    
+    backend = 'memory'
+    
+    def __init__(self, ttl=None, max_entries=None, name='Response'):
+        super().__init__(ttl, max_entries, name)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[2] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            self._record(False)
+            return None
+        self._record(True, entry[1])
+        return entry[0]
+    
+    def set(self, key, value, generation_time=0.0):
+        with self._lock:
+            self._entries[key] = (value, generation_time, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class SQLiteCache(ResponseCache):
+    """On-disk LRU cache with TTL, shared by every worker process on the host."""
+    
+    backend = 'sqlite'
+    
+    def __init__(self, path=None, ttl=None, max_entries=None, name='Response'):
+        super().__init__(ttl, max_entries, name)
+        self.path = path or Config.CACHE_PATH
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._db = LocalConnection(self.path)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    generation_time REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+    
+    def _connect(self):
+        return self._db.get()
+    
+    def _bump(self, conn, name, amount):
+        conn.execute(
+            "INSERT INTO cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+    
+    def get(self, key):
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, generation_time, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[2] > self.ttl:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    row = None
+                if row is None:
+                    self._bump(conn, 'misses', 1)
+                else:
+                    conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._bump(conn, 'hits', 1)
+                    self._bump(conn, 'time_saved', row[1])
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name} cache read failed: {str(e)}")
+            row = None
+        if row is None:
+            self._record(False)
+            return None
+        self._record(True, row[1])
+        return row[0]
+    
+    def set(self, key, value, generation_time=0.0):
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, generation_time, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, generation_time, now, now)
+                )
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+                overflow = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    conn.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                        (overflow,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name} cache write failed: {str(e)}")
+    
+    def stats(self):
+        """Return this worker's counters plus the totals shared by all workers."""
+        stats = super().stats()
+        try:
+            rows = dict(self._connect().execute("SELECT name, value FROM cache_stats").fetchall())
+            entries = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name} cache stats failed: {str(e)}")
+            return stats
+        hits, misses = int(rows.get('hits', 0)), int(rows.get('misses', 0))
+        total = hits + misses
+        stats['shared'] = {
+            'entries': entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+            'time_saved_seconds': round(rows.get('time_saved', 0.0), 3),
+        }
+        return stats
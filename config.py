@@ -10,6 +10,16 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
     
+    # Logging: records are queued to a background thread that writes the console and
+    # a size-rotated LOG_FILE shared by all workers ('' logs to the console only)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()  # json or text
+    LOG_FILE = os.getenv('LOG_FILE', 'logs/app.log')
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+    # Records waiting for the writer thread; more are dropped rather than blocking a request
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    
     # Groq API configuration
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
     GROQ_MODEL = os.getenv('GROQ_MODEL', 'llama3-8b-8192')
@@ -19,12 +29,111 @@ class Config:
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx'}
     
+    # Text extraction worker processes (0 extracts inline in the calling process)
+    EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', str(min(4, os.cpu_count() or 1))))
+    EXTRACTION_TIMEOUT_SECONDS = float(os.getenv('EXTRACTION_TIMEOUT_SECONDS', '15'))
+    EXTRACTION_MAX_MEMORY_MB = int(os.getenv('EXTRACTION_MAX_MEMORY_MB', '512'))
+    EXTRACTION_MAX_TASKS_PER_WORKER = int(os.getenv('EXTRACTION_MAX_TASKS_PER_WORKER', '100'))
+    
+    # Extraction result cache, keyed by a hash of the uploaded bytes
+    EXTRACTION_CACHE_BACKEND = os.getenv('EXTRACTION_CACHE_BACKEND', 'sqlite')  # sqlite, memory or none
+    EXTRACTION_CACHE_PATH = os.getenv('EXTRACTION_CACHE_PATH', 'cache/extractions.sqlite3')
+    EXTRACTION_CACHE_TTL_SECONDS = int(os.getenv('EXTRACTION_CACHE_TTL_SECONDS', '86400'))
+    EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv('EXTRACTION_CACHE_MAX_ENTRIES', '2000'))
+    
     # AI model configuration
     MODEL_TEMPERATURE = float(os.getenv('MODEL_TEMPERATURE', '0.7'))
     MAX_TOKENS = int(os.getenv('MAX_TOKENS', '1024'))
+    # Characters of resume text kept from an upload, and the estimated tokens of it sent
+    # to the model after deduplication and dropping low-value sections (0 sends it all)
+    RESUME_MAX_CHARS = int(os.getenv('RESUME_MAX_CHARS', '16000'))
+    PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '2000'))
+    
+    # Adaptive max_tokens: reserve the observed output length percentile (plus headroom) per
+    # operation and roast type instead of MAX_TOKENS, which stays the upper bound
+    ADAPTIVE_MAX_TOKENS = os.getenv('ADAPTIVE_MAX_TOKENS', 'True').lower() == 'true'
+    ADAPTIVE_MAX_TOKENS_PERCENTILE = float(os.getenv('ADAPTIVE_MAX_TOKENS_PERCENTILE', '99'))
+    ADAPTIVE_MAX_TOKENS_HEADROOM = float(os.getenv('ADAPTIVE_MAX_TOKENS_HEADROOM', '1.25'))
+    ADAPTIVE_MAX_TOKENS_MIN = int(os.getenv('ADAPTIVE_MAX_TOKENS_MIN', '256'))
+    ADAPTIVE_MAX_TOKENS_MIN_SAMPLES = int(os.getenv('ADAPTIVE_MAX_TOKENS_MIN_SAMPLES', '50'))
+    ADAPTIVE_MAX_TOKENS_WINDOW = int(os.getenv('ADAPTIVE_MAX_TOKENS_WINDOW', '500'))
+    OUTPUT_STATS_PATH = os.getenv('OUTPUT_STATS_PATH', 'cache/output_lengths.sqlite3')  # empty keeps them in memory
+    # Optional model per operation, e.g. "roast:gentle=llama-3.1-8b-instant,improve=llama3-70b-8192"
+    GROQ_MODEL_OVERRIDES = os.getenv('GROQ_MODEL_OVERRIDES', '')
+    
+    # Upstream concurrency governor (per process): AIMD limit on in-flight model calls
+    UPSTREAM_CONCURRENCY_INITIAL = int(os.getenv('UPSTREAM_CONCURRENCY_INITIAL', '8'))
+    UPSTREAM_CONCURRENCY_MIN = int(os.getenv('UPSTREAM_CONCURRENCY_MIN', '1'))
+    UPSTREAM_CONCURRENCY_MAX = int(os.getenv('UPSTREAM_CONCURRENCY_MAX', '32'))
+    UPSTREAM_QUEUE_SIZE = int(os.getenv('UPSTREAM_QUEUE_SIZE', '64'))
+    UPSTREAM_QUEUE_TIMEOUT_SECONDS = float(os.getenv('UPSTREAM_QUEUE_TIMEOUT_SECONDS', '10'))
+    UPSTREAM_LATENCY_TARGET_SECONDS = float(os.getenv('UPSTREAM_LATENCY_TARGET_SECONDS', '20'))
+    
+    # Upstream retries, deadline and hedging
+    UPSTREAM_TIMEOUT_SECONDS = float(os.getenv('UPSTREAM_TIMEOUT_SECONDS', '45'))  # stay under gunicorn's 60s
+    UPSTREAM_MAX_ATTEMPTS = int(os.getenv('UPSTREAM_MAX_ATTEMPTS', '3'))
+    UPSTREAM_RETRY_BASE_DELAY = float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', '0.5'))
+    UPSTREAM_RETRY_MAX_DELAY = float(os.getenv('UPSTREAM_RETRY_MAX_DELAY', '8'))
+    UPSTREAM_HEDGE = os.getenv('UPSTREAM_HEDGE', 'False').lower() == 'true'
+    UPSTREAM_HEDGE_PERCENTILE = float(os.getenv('UPSTREAM_HEDGE_PERCENTILE', '95'))
+    UPSTREAM_HEDGE_MIN_SAMPLES = int(os.getenv('UPSTREAM_HEDGE_MIN_SAMPLES', '20'))
+    
+    # Circuit breaker: fail fast while the AI service is down
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+    CIRCUIT_RESET_SECONDS = float(os.getenv('CIRCUIT_RESET_SECONDS', '30'))
+    CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.getenv('CIRCUIT_HALF_OPEN_MAX_CALLS', '1'))
+    # Serve a labelled template response while open (False returns HTTP 503 instead)
+    CIRCUIT_FALLBACK = os.getenv('CIRCUIT_FALLBACK', 'True').lower() == 'true'
+    
+    # Async roaster (async_ai_service.py): connection pool size and in-flight model calls per instance
+    ASYNC_MAX_IN_FLIGHT = int(os.getenv('ASYNC_MAX_IN_FLIGHT', '256'))
+    
+    # Prometheus metrics at /metrics (needs prometheus_client; gunicorn.conf.py sets up multiprocess mode)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    
+    # Request tracing: a span per stage, the last TRACE_BUFFER_SIZE traces kept per process (/debug/traces)
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'True').lower() == 'true'
+    TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '200'))
+    # Requests slower than this are kept in their own buffer, logged with their breakdown and always exported
+    TRACE_SLOW_SECONDS = float(os.getenv('TRACE_SLOW_SECONDS', '5'))
+    TRACE_SLOW_BUFFER_SIZE = int(os.getenv('TRACE_SLOW_BUFFER_SIZE', '50'))
+    # OTLP/JSON lines file ('' disables export); faster requests are exported at TRACE_SAMPLE_RATE
+    TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '')
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+    # Required as X-Debug-Token by /debug/traces; without one the endpoint only answers with FLASK_DEBUG
+    TRACE_DEBUG_TOKEN = os.getenv('TRACE_DEBUG_TOKEN', '')
+    
+    # Response cache configuration
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite')  # sqlite, memory or none
+    CACHE_PATH = os.getenv('CACHE_PATH', 'cache/responses.sqlite3')
+    CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '86400'))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1000'))
+    
+    # Background job configuration
+    JOB_BACKEND = os.getenv('JOB_BACKEND', 'sqlite')  # sqlite or memory
+    JOB_DB_PATH = os.getenv('JOB_DB_PATH', 'cache/jobs.sqlite3')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+    JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '32'))
+    JOB_TTL_SECONDS = int(os.getenv('JOB_TTL_SECONDS', '3600'))
+    
+    # Batch roasting (/api/roast/batch)
+    BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', '500'))
+    BATCH_MAX_TOTAL_BYTES = int(os.getenv('BATCH_MAX_TOTAL_BYTES', 256 * 1024 * 1024))  # uncompressed zip members
+    BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '8'))
     
-    # Rate limiting
+    # Rate limiting: token buckets per client (API key or IP) and per route group
     RATE_LIMIT_PER_MINUTE = int(os.getenv('RATE_LIMIT_PER_MINUTE', '10'))
+    # Comma-separated keys accepted in X-API-Key; any other key is rate limited by IP
+    API_KEYS = [key.strip() for key in os.getenv('API_KEYS', '').split(',') if key.strip()]
+    RATE_LIMIT_ROAST_PER_MINUTE = int(os.getenv('RATE_LIMIT_ROAST_PER_MINUTE', str(RATE_LIMIT_PER_MINUTE)))
+    RATE_LIMIT_IMPROVE_PER_MINUTE = int(os.getenv('RATE_LIMIT_IMPROVE_PER_MINUTE', str(RATE_LIMIT_PER_MINUTE)))
+    RATE_LIMIT_ANALYZE_PER_MINUTE = int(os.getenv('RATE_LIMIT_ANALYZE_PER_MINUTE', str(RATE_LIMIT_PER_MINUTE)))
+    RATE_LIMIT_FORM_PER_MINUTE = int(os.getenv('RATE_LIMIT_FORM_PER_MINUTE', str(RATE_LIMIT_PER_MINUTE)))
+    RATE_LIMIT_BATCH_PER_MINUTE = int(os.getenv('RATE_LIMIT_BATCH_PER_MINUTE', '2'))
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'sqlite')  # sqlite, memory or none
+    RATE_LIMIT_PATH = os.getenv('RATE_LIMIT_PATH', 'cache/ratelimit.sqlite3')
+    # Number of reverse proxies in front of the app whose X-Forwarded-For is trusted
+    TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', '0'))
     
     @staticmethod
     def validate_config():
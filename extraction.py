@@ -0,0 +1,291 @@
+"""
+Process-pool extraction engine.
+
+Text extraction runs in pre-started worker processes so a pathological
+document cannot pin a web worker: each job has a wall-clock timeout after
+which its process is killed and replaced, each process has an address-space
+cap, and workers are recycled after a number of jobs or once their peak RSS
+grows past the cap.
+"""
+import atexit
+import io
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from werkzeug.datastructures import FileStorage
+import metrics
+import tracing
+from config import Config
+from file_processor import extract_resume_text, get_upload_cache, upload_cache_key, MAX_TEXT_LENGTH
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+def _vm_size_bytes():
+    """Current virtual memory size of this process, or None if unknown."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _peak_rss_bytes():
+    if resource is None:
+        return 0
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _worker_main(conn, max_memory_bytes):
+    """Worker process loop: extract text for each job received on conn."""
+    if resource is not None and max_memory_bytes:
+        base = _vm_size_bytes()
+        if base is not None:
+            limit = base + max_memory_bytes
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    
+    while True:
+        try:
+            job = conn.recv()
+        except MemoryError:
+            conn.send(('error', 'The file is too large or complex to process', {}, [], True))
+            break
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        
+        filename, data, max_length = job
+        retire = False
+        timings = {}
+        # The spans go back with the reply and are attached to the requesting trace
+        with tracing.capture() as spans:
+            try:
+                text = extract_resume_text(FileStorage(stream=io.BytesIO(data), filename=filename), max_length,
+                                           timings)
+                reply = ('ok', text)
+            except MemoryError:
+                reply = ('error', 'The file is too large or complex to process')
+                retire = True
+            except ValueError as e:
+                reply = ('error', str(e))
+            except Exception as e:
+                reply = ('error', f'Failed to extract text from the file: {str(e)}')
+        
+        if max_memory_bytes and _peak_rss_bytes() > max_memory_bytes:
+            retire = True
+        conn.send(reply + (timings, spans, retire))
+        if retire:
+            break
+
+class _Worker:
+    """Parent-side handle for one extraction process."""
+    
+    def __init__(self, context, max_memory_bytes):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, max_memory_bytes), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+    
+    def stop(self, kill=False):
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+class ExtractionPool:
+    """Pool of extraction processes with per-job timeouts and memory caps."""
+    
+    def __init__(self, workers=None, timeout=None, max_memory_mb=None, max_tasks_per_worker=None):
+        self.workers = Config.EXTRACTION_WORKERS if workers is None else workers
+        self.timeout = timeout or Config.EXTRACTION_TIMEOUT_SECONDS
+        max_memory_mb = Config.EXTRACTION_MAX_MEMORY_MB if max_memory_mb is None else max_memory_mb
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.max_tasks_per_worker = max_tasks_per_worker or Config.EXTRACTION_MAX_TASKS_PER_WORKER
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._all = []
+        self._pid = None
+        self.completed = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.recycled = 0
+    
+    def extract(self, filename, data, max_length=MAX_TEXT_LENGTH):
+        """Return sanitized text for an uploaded file's bytes.
+        
+        Identical uploads are served from the upload cache without parsing.
+        Raises ValueError if the file cannot be parsed, takes longer than the
+        timeout, or exceeds the memory cap.
+        """
+        file_type = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        metrics.set_labels(file_type=file_type)
+        with tracing.span('extract', file_type=file_type, bytes=len(data)):
+            return self._extract_cached(filename, data, max_length)
+    
+    def _extract_cached(self, filename, data, max_length):
+        cache = get_upload_cache()
+        if cache is None:
+            return self._extract(filename, data, max_length)
+        
+        key = upload_cache_key(filename, data, max_length)
+        cached = cache.get(key)
+        tracing.set_attributes(cache_hit=cached is not None)
+        if cached is not None:
+            return cached
+        
+        if self.workers > 0:
+            # Keep worker start-up out of the parse time credited to cache hits
+            self._ensure_started()
+        start_time = time.time()
+        text = self._extract(filename, data, max_length)
+        if text:
+            cache.set(key, text, time.time() - start_time)
+        return text
+    
+    def _extract(self, filename, data, max_length):
+        if self.workers <= 0:
+            timings = {}
+            try:
+                return extract_resume_text(FileStorage(stream=io.BytesIO(data), filename=filename), max_length,
+                                           timings)
+            finally:
+                self._record_timings(timings)
+        
+        self._ensure_started()
+        # Time spent waiting for a free worker, as opposed to parsing
+        with tracing.span('extract.queue_wait'):
+            worker = self._checkout()
+        start_time = time.time()
+        try:
+            with tracing.span('extract.worker', pid=worker.process.pid):
+                worker.conn.send((filename, data, max_length))
+                finished = worker.conn.poll(self.timeout)
+                if finished:
+                    status, payload, timings, spans, retire = worker.conn.recv()
+                    tracing.attach(spans)
+        except (EOFError, OSError):
+            self._replace(worker, kill=True)
+            with self._lock:
+                self.crashes += 1
+            logger.error(f"Extraction worker crashed while processing {filename}")
+            raise ValueError("Failed to extract text from the file")
+        
+        if not finished:
+            self._replace(worker, kill=True)
+            with self._lock:
+                self.timeouts += 1
+            logger.warning(f"Extraction of {filename} killed after {self.timeout}s")
+            raise ValueError("Timed out extracting text from the file")
+        
+        self._release(worker, retire)
+        with self._lock:
+            self.completed += 1
+        self._record_timings(timings)
+        logger.info(f"Extracted {filename} in {time.time() - start_time:.2f} seconds")
+        
+        if status != 'ok':
+            raise ValueError(payload)
+        return payload
+    
+    def _record_timings(self, timings):
+        """Credit the worker-measured parse and sanitize times to the current request."""
+        for stage, seconds in timings.items():
+            metrics.add_stage(stage, seconds)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'idle': self._idle.qsize(),
+                'completed': self.completed,
+                'timeouts': self.timeouts,
+                'crashes': self.crashes,
+                'recycled': self.recycled,
+            }
+    
+    def shutdown(self):
+        with self._lock:
+            workers, self._all = self._all, []
+            self._idle = queue.Queue()
+            self._pid = None
+        for worker in workers:
+            worker.stop()
+    
+    def _ensure_started(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # First use, or we were forked (e.g. gunicorn preload): start our own workers
+            self._all = []
+            self._idle = queue.Queue()
+            for _ in range(self.workers):
+                self._spawn()
+            self._pid = os.getpid()
+    
+    def _checkout(self):
+        """Take an idle worker, replacing any that died while idle (e.g. OOM-killed)."""
+        for _ in range(self.workers + 1):
+            worker = self._idle.get()
+            if worker.process.is_alive():
+                return worker
+            self._replace(worker, kill=True)
+        raise ValueError("Text extraction is temporarily unavailable")
+    
+    def _spawn(self):
+        worker = _Worker(self._context, self.max_memory_bytes)
+        self._all.append(worker)
+        self._idle.put(worker)
+    
+    def _release(self, worker, retire=False):
+        worker.tasks += 1
+        if retire or worker.tasks >= self.max_tasks_per_worker:
+            with self._lock:
+                self.recycled += 1
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+    
+    def _replace(self, worker, kill=False):
+        worker.stop(kill=kill)
+        with self._lock:
+            if worker in self._all:
+                self._all.remove(worker)
+            self._spawn()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_extraction_pool():
+    """Return the process-wide extraction pool shared by every entry point."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractionPool()
+            atexit.register(_pool.shutdown)
+        return _pool
+
+def extract_uploaded_file(file, max_length=MAX_TEXT_LENGTH):
+    """Read an uploaded file and extract its sanitized text on the shared pool."""
+    with metrics.stage('upload_read'):
+        data = file.read()
+    return get_extraction_pool().extract(os.path.basename(file.filename), data, max_length)
@@ -1,51 +1,143 @@
 import PyPDF2
 import docx
+import hashlib
 import logging
+import re
+import sqlite3
+import threading
+import time
+import zipfile
 from werkzeug.utils import secure_filename
+import tracing
+from cache import MemoryCache, SQLiteCache
 from config import Config
 
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
 logger = logging.getLogger(__name__)
 
+# Longest resume text (after whitespace normalization) kept from an upload;
+# prompt_budget then fits it into the model's token budget
+MAX_TEXT_LENGTH = Config.RESUME_MAX_CHARS
+
+_WHITESPACE = re.compile(r'\s+')
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
 def allowed_file(filename):
     """Check if the file extension is allowed."""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from PDF file with better error handling."""
+def iter_pdf_pages(pdf_file):
+    """Yield the text of each PDF page in order, parsing pages lazily."""
+    reader = PyPDF2.PdfReader(pdf_file)
+    for page in reader.pages:
+        page_text = page.extract_text()
+        if page_text:
+            yield page_text
+
+def _collect_within_budget(chunks, max_chars, source):
+    """Collect text chunks, stopping once their normalized text is longer than max_chars.
+    
+    Chunks read past that point would only be cut off by sanitize_text, so
+    stopping there gives sanitize_text the same result as reading everything.
+    """
+    collected = []
+    normalized_length = 0
+    
+    for chunk in chunks:
+        collected.append(chunk)
+        if max_chars is not None:
+            chunk_length = len(_WHITESPACE.sub(' ', chunk).strip())
+            if chunk_length:
+                # Chunks are joined by a single space once whitespace is collapsed
+                normalized_length += chunk_length + 1
+            if normalized_length > max_chars + 1:
+                logger.info(f"Stopped {source} extraction after {len(collected)} chunks (budget {max_chars} chars)")
+                break
+    
+    return collected
+
+def extract_text_from_pdf(pdf_file, max_chars=None):
+    """Extract text from PDF file with better error handling.
+    
+    With max_chars set, parsing stops once the normalized text is longer than
+    the budget, so sanitize_text gives the same result as for the whole PDF.
+    """
     try:
-        reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        
-        for page_num in range(len(reader.pages)):
-            page = reader.pages[page_num]
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
+        pages = _collect_within_budget(iter_pdf_pages(pdf_file), max_chars, 'PDF')
         
+        text = "\n".join(pages)
         if not text.strip():
             raise ValueError("No text could be extracted from the PDF")
-            
-        return text.strip()
         
+        return text.strip()
+    
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {str(e)}")
         raise ValueError(f"Failed to extract text from PDF: {str(e)}")
 
-def extract_text_from_docx(docx_file):
-    """Extract text from DOCX file."""
+def iter_docx_paragraphs(docx_file):
+    """Yield paragraph text, including table cells, by streaming word/document.xml.
+    
+    Avoids building python-docx's object model; parsed elements are freed as
+    soon as their paragraph has been yielded.
+    """
+    with zipfile.ZipFile(docx_file) as archive:
+        with archive.open('word/document.xml') as document_xml:
+            paragraphs = etree.iterparse(
+                document_xml, events=('end',), tag=_W + 'p',
+                resolve_entities=False, no_network=True,
+            )
+            for _, paragraph in paragraphs:
+                parts = []
+                for element in paragraph.iter(_W + 't', _W + 'tab', _W + 'br', _W + 'cr'):
+                    if element.tag == _W + 't':
+                        if element.text:
+                            parts.append(element.text)
+                    elif element.tag == _W + 'tab':
+                        parts.append('\t')
+                    else:
+                        parts.append('\n')
+                yield ''.join(parts)
+                
+                paragraph.clear()
+                while paragraph.getprevious() is not None:
+                    del paragraph.getparent()[0]
+
+def iter_docx_paragraphs_python_docx(docx_file):
+    """Yield body paragraph text using python-docx (the fallback path)."""
+    for paragraph in docx.Document(docx_file).paragraphs:
+        yield paragraph.text
+
+def extract_text_from_docx(docx_file, max_chars=None):
+    """Extract text from DOCX file.
+    
+    Streams the XML with lxml when available and falls back to python-docx
+    if that fails. With max_chars set, reading stops at the sanitize_text budget.
+    """
     try:
-        doc = docx.Document(docx_file)
-        text = ""
+        paragraphs = None
+        if etree is not None:
+            try:
+                paragraphs = _collect_within_budget(iter_docx_paragraphs(docx_file), max_chars, 'DOCX')
+            except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError) as e:
+                logger.warning(f"Streaming DOCX extraction failed, falling back to python-docx: {str(e)}")
+                docx_file.seek(0)
         
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
+        if paragraphs is None:
+            paragraphs = _collect_within_budget(iter_docx_paragraphs_python_docx(docx_file), max_chars, 'DOCX')
         
+        text = "\n".join(paragraphs)
         if not text.strip():
             raise ValueError("No text could be extracted from the DOCX file")
-            
-        return text.strip()
         
+        return text.strip()
+    
     except Exception as e:
         logger.error(f"Error extracting text from DOCX: {str(e)}")
         raise ValueError(f"Failed to extract text from DOCX: {str(e)}")
@@ -58,7 +150,7 @@ def extract_text_from_txt(txt_file):
         if not text.strip():
             raise ValueError("The text file appears to be empty")
         return text.strip()
-        
+    
     except UnicodeDecodeError:
         # Fallback to other encodings
         txt_file.seek(0)
@@ -71,8 +163,12 @@ def extract_text_from_txt(txt_file):
             logger.error(f"Error reading text file: {str(e)}")
             raise ValueError("Failed to read text file - unsupported encoding")
 
-def extract_text_from_file(file):
-    """Extract text from uploaded file based on its extension."""
+def extract_text_from_file(file, max_chars=None):
+    """Extract text from uploaded file based on its extension.
+    
+    max_chars is a hint that lets extractors stop early once they have more
+    text than sanitize_text will keep.
+    """
     if not file or not file.filename:
         raise ValueError("No file provided")
     
@@ -82,25 +178,77 @@ def extract_text_from_file(file):
     if file_extension == 'txt':
         return extract_text_from_txt(file)
     elif file_extension == 'pdf':
-        return extract_text_from_pdf(file)
+        return extract_text_from_pdf(file, max_chars=max_chars)
     elif file_extension == 'docx':
-        return extract_text_from_docx(file)
+        return extract_text_from_docx(file, max_chars=max_chars)
     else:
         raise ValueError(f"Unsupported file type: {file_extension}")
 
-def sanitize_text(text):
+def sanitize_text(text, max_length=MAX_TEXT_LENGTH):
     """Sanitize extracted text for processing."""
     if not text:
         return ""
     
-    # Remove excessive whitespace and normalize
-    import re
-    text = re.sub(r'\s+', ' ', text.strip())
+    # Collapse whitespace runs, keeping one line break where there was any so
+    # prompt_budget can see lines; the length is the same as collapsing to spaces
+    text = _WHITESPACE.sub(lambda m: '\n' if '\n' in m.group() else ' ', text.strip())
     
     # Limit text length to prevent API issues
-    max_length = 8000  # Reasonable limit for resume text
     if len(text) > max_length:
         text = text[:max_length] + "..."
         logger.warning(f"Text truncated to {max_length} characters")
     
     return text
+
+def extract_resume_text(file, max_length=MAX_TEXT_LENGTH, timings=None):
+    """Extract and sanitize resume text, only parsing as much as sanitize_text keeps.
+    
+    If timings is a dict, the seconds spent in 'extraction' and 'sanitization' are stored in it;
+    both are also traced as spans of the current request.
+    """
+    start_time = time.perf_counter()
+    with tracing.span('extraction'):
+        text = extract_text_from_file(file, max_chars=max_length)
+        tracing.set_attributes(chars=len(text))
+    extracted_time = time.perf_counter()
+    with tracing.span('sanitization'):
+        text = sanitize_text(text, max_length)
+    if timings is not None:
+        timings['extraction'] = extracted_time - start_time
+        timings['sanitization'] = time.perf_counter() - extracted_time
+    return text
+
+def upload_cache_key(filename, data, max_length=MAX_TEXT_LENGTH):
+    """Fast content hash of an upload, qualified by how it will be parsed."""
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    digest = hashlib.blake2b(data, digest_size=16)
+    digest.update(f"\x1f{extension}\x1f{max_length}".encode('utf-8'))
+    return digest.hexdigest()
+
+_upload_cache = None
+_upload_cache_created = False
+_upload_cache_lock = threading.Lock()
+
+def get_upload_cache():
+    """Return the shared upload-hash -> sanitized text cache, or None if disabled."""
+    global _upload_cache, _upload_cache_created
+    with _upload_cache_lock:
+        if _upload_cache_created:
+            return _upload_cache
+        
+        backend = Config.EXTRACTION_CACHE_BACKEND.lower()
+        options = dict(
+            ttl=Config.EXTRACTION_CACHE_TTL_SECONDS,
+            max_entries=Config.EXTRACTION_CACHE_MAX_ENTRIES,
+            name='Extraction',
+        )
+        if backend == 'sqlite':
+            try:
+                _upload_cache = SQLiteCache(path=Config.EXTRACTION_CACHE_PATH, **options)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Falling back to in-memory extraction cache: {str(e)}")
+                _upload_cache = MemoryCache(**options)
+        elif backend == 'memory':
+            _upload_cache = MemoryCache(**options)
+        _upload_cache_created = True
+        return _upload_cache
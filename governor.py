@@ -0,0 +1,190 @@
+"""
+Upstream concurrency governor.
+
+Caps how many model calls this process has in flight. The cap adapts AIMD
+style: it grows by one slot per window of calls that finish under the latency
+target, and halves when the provider answers 429 or calls run slow. Callers
+beyond the cap wait in a bounded queue; when the queue is full, or a caller
+has waited too long, the call is shed immediately instead of piling up.
+
+Batch work with no user waiting on each call (/api/roast/batch, the bulk
+CLI) runs inside patient_calls(): those calls queue outside the bounded
+queue and wait for a slot until their own deadline instead of being shed.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_patient = contextvars.ContextVar('upstream_patient', default=False)
+
+@contextmanager
+def patient_calls():
+    """Within the block, model calls wait for a slot until their deadline rather than being shed."""
+    token = _patient.set(True)
+    try:
+        yield
+    finally:
+        _patient.reset(token)
+
+def is_patient():
+    return _patient.get()
+
+# Weight of the newest sample in the moving average of call latency
+_LATENCY_SMOOTHING = 0.2
+
+class UpstreamOverloadedError(ValueError):
+    """Raised when a model call is shed because the upstream is saturated."""
+    
+    def __init__(self, message="The AI service is busy. Please try again shortly.", retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def is_rate_limit_error(e):
+    """True if an upstream error is the provider telling us to slow down."""
+    return getattr(e, 'status_code', None) == 429 or type(e).__name__ == 'RateLimitError'
+
+class ConcurrencyGovernor:
+    """Adaptive limit on concurrent upstream calls with a bounded wait queue."""
+    
+    def __init__(self, initial_limit=None, min_limit=None, max_limit=None,
+                 max_queue=None, queue_timeout=None, latency_target=None, backoff_ratio=0.5):
+        self.min_limit = min_limit or Config.UPSTREAM_CONCURRENCY_MIN
+        self.max_limit = max_limit or Config.UPSTREAM_CONCURRENCY_MAX
+        initial_limit = initial_limit or Config.UPSTREAM_CONCURRENCY_INITIAL
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial_limit)))
+        self.max_queue = Config.UPSTREAM_QUEUE_SIZE if max_queue is None else max_queue
+        self.queue_timeout = queue_timeout or Config.UPSTREAM_QUEUE_TIMEOUT_SECONDS
+        self.latency_target = latency_target or Config.UPSTREAM_LATENCY_TARGET_SECONDS
+        self.backoff_ratio = backoff_ratio
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._patient_waiting = 0
+        self._last_decrease = 0.0
+        self._latency_avg = None
+        self.completed = 0
+        self.shed = 0
+        self.throttled = 0
+        self.decreases = 0
+    
+    def acquire(self, timeout=None):
+        """Wait for a slot; raise UpstreamOverloadedError if the call is shed.
+        
+        timeout caps the queue wait below the configured queue timeout, e.g.
+        to the time left before the caller's own deadline. Inside
+        patient_calls() only timeout bounds the wait and the queue size does
+        not apply.
+        """
+        patient = is_patient()
+        if patient and timeout is not None:
+            wait = timeout
+        else:
+            wait = self.queue_timeout if timeout is None else min(self.queue_timeout, timeout)
+        deadline = time.monotonic() + wait
+        with self._cond:
+            if self._in_flight < int(self.limit) and not self._waiting:
+                self._in_flight += 1
+                return
+            
+            if not patient and self._waiting >= self.max_queue:
+                self.shed += 1
+                raise UpstreamOverloadedError()
+            
+            if patient:
+                self._patient_waiting += 1
+            else:
+                self._waiting += 1
+            try:
+                while self._in_flight >= int(self.limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed += 1
+                        raise UpstreamOverloadedError()
+                    self._cond.wait(remaining)
+                self._in_flight += 1
+            finally:
+                if patient:
+                    self._patient_waiting -= 1
+                else:
+                    self._waiting -= 1
+    
+    def release(self, latency=None, throttled=False):
+        """Free a slot and feed the call's outcome into the adaptive limit.
+        
+        latency is None for calls that failed for reasons that say nothing
+        about upstream load; those leave the limit unchanged.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.throttled += 1
+            if throttled or (latency is not None and latency > self.latency_target):
+                self._decrease()
+            elif latency is not None:
+                self.completed += 1
+                if self._latency_avg is None:
+                    self._latency_avg = latency
+                else:
+                    self._latency_avg += _LATENCY_SMOOTHING * (latency - self._latency_avg)
+                # Additive increase: roughly one extra slot per `limit` good calls
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+    
+    def _decrease(self):
+        # At most one cut per typical call duration: the 429s of one overload
+        # episode arrive together and should only count once
+        now = time.monotonic()
+        if now - self._last_decrease < (self._latency_avg or 1.0):
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        self.decreases += 1
+        logger.warning(f"Upstream concurrency limit lowered from {previous:.1f} to {self.limit:.1f}")
+    
+    @contextmanager
+    def slot(self, timeout=None):
+        """Hold a slot for the duration of the with-block."""
+        self.acquire(timeout)
+        start_time = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.release(throttled=is_rate_limit_error(e))
+            raise
+        except BaseException:
+            # e.g. a streaming client disconnected (GeneratorExit)
+            self.release()
+            raise
+        self.release(latency=time.monotonic() - start_time)
+    
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': round(self.limit, 2),
+                'in_flight': self._in_flight,
+                'queued': self._waiting,
+                'queued_patient': self._patient_waiting,
+                'queue_capacity': self.max_queue,
+                'latency_avg_seconds': round(self._latency_avg, 3) if self._latency_avg is not None else None,
+                'completed': self.completed,
+                'throttled': self.throttled,
+                'decreases': self.decreases,
+                'shed': self.shed,
+            }
+
+_governor = None
+_governor_lock = threading.Lock()
+
+def get_upstream_governor():
+    """Return the process-wide governor shared by every ResumeRoaster."""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = ConcurrencyGovernor()
+        return _governor
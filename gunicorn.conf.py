@@ -0,0 +1,26 @@
+"""
+gunicorn settings, loaded automatically from the working directory.
+
+Sets up prometheus_client's multiprocess mode: every worker writes its
+metric samples to PROMETHEUS_MULTIPROC_DIR and /metrics sums them, so the
+numbers cover all workers rather than whichever one answered the scrape.
+"""
+import os
+import shutil
+import tempfile
+
+# Must be in the environment before the workers import prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'resume_roaster_metrics'))
+
+def on_starting(server):
+    # Samples left by a previous run would otherwise be added to this one's
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
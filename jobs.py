@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from sqlite_local import LocalConnection
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+class JobQueueFullError(Exception):
+    """Raised when the background pool cannot accept more jobs."""
+
+class MemoryJobStore:
+    """Job records kept in this process; only the submitting worker can answer polls."""
+    
+    def __init__(self, ttl=None):
+        self.ttl = Config.JOB_TTL_SECONDS if ttl is None else ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+    
+    def create(self, job_id):
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': QUEUED,
+                'result': None,
+                'error': None,
+                'created_at': now,
+                'updated_at': now,
+            }
+    
+    def update(self, job_id, status, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(status=status, result=result, error=error, updated_at=time.time())
+    
+    def get(self, job_id):
+        with self._lock:
+            self._purge(time.time())
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+    
+    def _purge(self, now):
+        expired = [job_id for job_id, job in self._jobs.items() if now - job['updated_at'] > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+class SQLiteJobStore:
+    """Job records in a local SQLite file so any gunicorn worker can answer polls."""
+    
+    def __init__(self, path=None, ttl=None):
+        self.ttl = Config.JOB_TTL_SECONDS if ttl is None else ttl
+        self.path = path or Config.JOB_DB_PATH
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._db = LocalConnection(self.path)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+    
+    def _connect(self):
+        return self._db.get()
+    
+    def create(self, job_id):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.ttl,))
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (job_id, QUEUED, now, now)
+            )
+    
+    def update(self, job_id, status, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+    
+    def get(self, job_id):
+        row = self._connect().execute(
+            "SELECT job_id, status, result, error, created_at, updated_at FROM jobs WHERE job_id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None or time.time() - row[5] > self.ttl:
+            return None
+        return {
+            'job_id': row[0],
+            'status': row[1],
+            'result': json.loads(row[2]) if row[2] else None,
+            'error': row[3],
+            'created_at': row[4],
+            'updated_at': row[5],
+        }
+
+def create_job_store(backend=None):
+    """Create the job store selected by Config.JOB_BACKEND."""
+    backend = (backend or Config.JOB_BACKEND).lower()
+    if backend == 'sqlite':
+        try:
+            return SQLiteJobStore()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Falling back to in-memory job store: {str(e)}")
+    return MemoryJobStore()
+
+class JobManager:
+    """Run slow work on a bounded background pool and track it by job id."""
+    
+    def __init__(self, store=None, max_workers=None, max_pending=None):
+        self.store = store if store is not None else create_job_store()
+        self.max_workers = max_workers or Config.JOB_WORKERS
+        self.max_pending = max_pending or Config.JOB_QUEUE_SIZE
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+    
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) and return the new job id.
+        
+        fn must return a JSON-serialisable result. ValueErrors are reported as
+        the job's error message; anything else is logged and reported generically.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise JobQueueFullError("Too many jobs in progress. Please try again shortly.")
+        
+        with self._lock:
+            self.pending += 1
+        job_id = uuid.uuid4().hex
+        try:
+            self.store.create(job_id)
+            self._executor.submit(self._run, job_id, fn, args, kwargs)
+        except Exception:
+            self._release()
+            raise
+        return job_id
+    
+    def get(self, job_id):
+        return self.store.get(job_id)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'capacity': self.max_pending,
+                'pending': self.pending,
+                'rejected': self.rejected,
+            }
+    
+    def _run(self, job_id, fn, args, kwargs):
+        try:
+            self.store.update(job_id, RUNNING)
+            result = fn(*args, **kwargs)
+            self.store.update(job_id, SUCCEEDED, result=result)
+        except ValueError as e:
+            self.store.update(job_id, FAILED, error=str(e))
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            self.store.update(job_id, FAILED, error='An unexpected error occurred')
+        finally:
+            self._release()
+    
+    def _release(self):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
@@ -0,0 +1,160 @@
+"""
+Prometheus metrics for the upload routes.
+
+Each tracked request gets a RequestMetrics record in a context variable.
+The upload parsing, the extraction pool, the prompt builders and the
+roasters add the time they spend in their stage, the model tokens and the
+file type / roast type labels to the current record; when the request
+finishes everything is observed at once, so every stage carries the same
+route, file_type and roast_type labels. A stage that runs more than once in
+a request (the two model calls of /api/roast-and-improve) is summed.
+
+With several worker processes (gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR)
+each worker writes its samples to that directory and /metrics sums them.
+Without prometheus_client, or with METRICS_ENABLED=False, recording is a no-op.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+ENABLED = Config.METRICS_ENABLED and prometheus_client is not None
+
+# Label values are bounded so arbitrary form input cannot create new series
+FILE_TYPES = set(Config.ALLOWED_EXTENSIONS)
+ROAST_TYPES = {'standard', 'gentle', 'savage', 'professional'}
+
+_LABELS = ('route', 'file_type', 'roast_type')
+_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60)
+_TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 1500, 2000, 3000, 4000, 8000)
+
+if ENABLED:
+    REQUEST_SECONDS = prometheus_client.Histogram(
+        'resume_roaster_request_duration_seconds', 'Total request time',
+        _LABELS + ('status',), buckets=_SECONDS_BUCKETS,
+    )
+    STAGE_SECONDS = prometheus_client.Histogram(
+        'resume_roaster_stage_duration_seconds',
+        'Time per request in each stage (upload_read, extraction, sanitization, prompt_build, upstream)',
+        ('stage',) + _LABELS, buckets=_SECONDS_BUCKETS,
+    )
+    TOKENS = prometheus_client.Histogram(
+        'resume_roaster_tokens', 'Model tokens per request (direction is prompt or completion)',
+        ('direction',) + _LABELS, buckets=_TOKEN_BUCKETS,
+    )
+
+class RequestMetrics:
+    """Stage timings, tokens and labels collected for one request."""
+    
+    def __init__(self, route):
+        self.route = route
+        self.file_type = 'none'
+        self.roast_type = 'none'
+        self.stages = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.start_time = time.perf_counter()
+        self.finished = False
+        # Fan-out and executor threads share the record with the request thread
+        self._lock = threading.Lock()
+    
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+    
+    def add_tokens(self, prompt_tokens, completion_tokens):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+    
+    def finish(self, status):
+        """Observe everything recorded for the request; later calls do nothing."""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+            stages = dict(self.stages)
+        
+        labels = (self.route, self.file_type, self.roast_type)
+        REQUEST_SECONDS.labels(*labels, str(status)).observe(time.perf_counter() - self.start_time)
+        for stage, seconds in stages.items():
+            STAGE_SECONDS.labels(stage, *labels).observe(seconds)
+        if self.prompt_tokens or self.completion_tokens:
+            TOKENS.labels('prompt', *labels).observe(self.prompt_tokens)
+            TOKENS.labels('completion', *labels).observe(self.completion_tokens)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+def start_request(route):
+    """Start recording a request to route; None stops recording in this context."""
+    request_metrics = RequestMetrics(route) if ENABLED and route is not None else None
+    _current.set(request_metrics)
+    return request_metrics
+
+def current():
+    """Return the RequestMetrics of the request being handled, if it is tracked."""
+    return _current.get()
+
+def set_labels(file_type=None, roast_type=None):
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return
+    if file_type is not None:
+        request_metrics.file_type = file_type if file_type in FILE_TYPES else 'other'
+    if roast_type is not None:
+        request_metrics.roast_type = roast_type if roast_type in ROAST_TYPES else 'other'
+
+def add_stage(stage, seconds):
+    request_metrics = _current.get()
+    if request_metrics is not None:
+        request_metrics.add_stage(stage, seconds)
+
+def add_tokens(prompt_tokens, completion_tokens):
+    request_metrics = _current.get()
+    if request_metrics is not None:
+        request_metrics.add_tokens(prompt_tokens, completion_tokens)
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as stage name of the current request."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage(name, time.perf_counter() - start_time)
+
+def timed(name):
+    """Decorator timing every call of a plain or async function as stage name."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def render():
+    """Return (body, content type) for the /metrics endpoint, summed over workers if multiprocess."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
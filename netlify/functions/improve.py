@@ -110,11 +110,20 @@ def handler(event, context):
             'headers': headers,
             'body': json.dumps({
                 'success': True,
-                'suggestions': suggestions
+                'suggestions': suggestions,
+                'degraded': getattr(suggestions, 'degraded', False)
             })
         }
         
     except ValueError as e:
+        retry_after = getattr(e, 'retry_after', None)
+        if retry_after is not None:
+            # The AI service is overloaded or its circuit breaker is open
+            return {
+                'statusCode': 503,
+                'headers': {**headers, 'Retry-After': str(retry_after)},
+                'body': json.dumps({'error': str(e)})
+            }
         return {
             'statusCode': 400,
             'headers': headers,
@@ -121,11 +121,20 @@ def handler(event, context):
             'body': json.dumps({
                 'success': True,
                 'roast': roast_output,
-                'roast_type': roast_type
+                'roast_type': roast_type,
+                'degraded': getattr(roast_output, 'degraded', False)
             })
         }
         
     except ValueError as e:
+        retry_after = getattr(e, 'retry_after', None)
+        if retry_after is not None:
+            # The AI service is overloaded or its circuit breaker is open
+            return {
+                'statusCode': 503,
+                'headers': {**headers, 'Retry-After': str(retry_after)},
+                'body': json.dumps({'error': str(e)})
+            }
         return {
             'statusCode': 400,
             'headers': headers,
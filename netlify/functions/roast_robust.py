@@ -1,5 +1,29 @@
 import json
 import os
+import time
+
+# Minimal circuit breaker shared by warm invocations: after repeated AI
+# failures, skip the call for a cool-down and serve the mock roast at once
+FAILURE_THRESHOLD = 3
+COOL_DOWN_SECONDS = 30
+_consecutive_failures = 0
+_open_until = 0.0
+
+def _circuit_open():
+    return time.time() < _open_until
+
+def _record_result(ok):
+    global _consecutive_failures, _open_until
+    if ok:
+        _consecutive_failures = 0
+        return
+    _consecutive_failures += 1
+    if _consecutive_failures >= FAILURE_THRESHOLD:
+        # After the cool-down the next request is the half-open probe
+        _open_until = time.time() + COOL_DOWN_SECONDS
+
+def _mock_roast(resume_text, roast_type):
+    return f"🔥 Mock Roast ({roast_type} style):\n\nWell, well, well... someone decided to share their resume! While I can't access the AI service right now, I can tell you that any resume submitted here shows courage. That's already better than most! Your {len(resume_text)} characters of professional history await proper roasting once the AI is connected. For now, consider this a gentle warm-up! 😊"
 
 def handler(event, context):
     """
@@ -58,42 +82,51 @@ def handler(event, context):
                 'body': json.dumps({'error': 'GROQ_API_KEY not configured'})
             }
         
-        # Try to import and use Groq
-        try:
-            from groq import Groq
-            
-            client = Groq(api_key=api_key)
+        # While the circuit is open, skip the AI call and serve the mock roast at once
+        degraded = _circuit_open()
+        if degraded:
+            roast_content = _mock_roast(resume_text, roast_type)
+        else:
+            # Try to import and use Groq
+            try:
+                from groq import Groq
+                
+                client = Groq(api_key=api_key, timeout=20, max_retries=1)
+                
+                # Build prompt based on roast type
+                prompts = {
+                    'gentle': 'Please provide gentle, humorous critique of this resume with constructive feedback.',
+                    'savage': 'Absolutely roast this resume! Be brutally honest and hilariously harsh.',
+                    'professional': 'Provide professional yet humorous analysis with constructive criticism.',
+                    'standard': 'Roast this resume with humor and insight, pointing out flaws entertainingly.'
+                }
+                
+                prompt = f"{prompts.get(roast_type, prompts['standard'])}\n\nResume:\n{resume_text}"
+                
+                response = client.chat.completions.create(
+                    messages=[
+                        {"role": "system", "content": "You are a witty resume critic who provides humorous but constructive feedback."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    model="llama3-8b-8192",
+                    temperature=0.7,
+                    max_tokens=1024
+                )
+                
+                if response.choices:
+                    roast_content = response.choices[0].message.content
+                else:
+                    roast_content = "The AI seems speechless... which might say something about your resume! 😅"
+                _record_result(True)
+                
+            except ImportError:
+                roast_content = _mock_roast(resume_text, roast_type)
+                degraded = True
             
-            # Build prompt based on roast type
-            prompts = {
-                'gentle': 'Please provide gentle, humorous critique of this resume with constructive feedback.',
-                'savage': 'Absolutely roast this resume! Be brutally honest and hilariously harsh.',
-                'professional': 'Provide professional yet humorous analysis with constructive criticism.',
-                'standard': 'Roast this resume with humor and insight, pointing out flaws entertainingly.'
-            }
-            
-            prompt = f"{prompts.get(roast_type, prompts['standard'])}\n\nResume:\n{resume_text}"
-            
-            response = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are a witty resume critic who provides humorous but constructive feedback."},
-                    {"role": "user", "content": prompt}
-                ],
-                model="llama3-8b-8192",
-                temperature=0.7,
-                max_tokens=1024
-            )
-            
-            if response.choices:
-                roast_content = response.choices[0].message.content
-            else:
-                roast_content = "The AI seems speechless... which might say something about your resume! 😅"
-            
-        except ImportError:
-            roast_content = f"🔥 Mock Roast ({roast_type} style):\n\nWell, well, well... someone decided to share their resume! While I can't access the AI service right now, I can tell you that any resume submitted here shows courage. That's already better than most! Your {len(resume_text)} characters of professional history await proper roasting once the AI is connected. For now, consider this a gentle warm-up! 😊"
-        
-        except Exception as e:
-            roast_content = f"🤖 AI Hiccup Alert!\n\nThe roasting AI seems to have choked on your resume (which might be feedback in itself! 😄). Error: {str(e)}\n\nBut hey, at least the function is working! Try again, or maybe your resume is just too good to roast? 🔥"
+            except Exception as e:
+                _record_result(False)
+                degraded = True
+                roast_content = f"🤖 AI Hiccup Alert!\n\nThe roasting AI seems to have choked on your resume (which might be feedback in itself! 😄). Error: {str(e)}\n\nBut hey, at least the function is working! Try again, or maybe your resume is just too good to roast? 🔥"
         
         return {
             'statusCode': 200,
@@ -101,7 +134,8 @@ def handler(event, context):
             'body': json.dumps({
                 'success': True,
                 'roast': roast_content,
-                'roast_type': roast_type
+                'roast_type': roast_type,
+                'degraded': degraded
             })
         }
         
@@ -0,0 +1,264 @@
+"""
+Prompt token budgeting for resume text.
+
+Runs between file_processor.sanitize_text and the prompt builders. A resume
+already within PROMPT_TOKEN_BUDGET is passed through untouched. Otherwise
+repeated lines (page headers and footers) and boilerplate (page numbers,
+separator rules, "references available on request") are removed first; if
+the resume is still over budget, low-value sections such as references and
+hobbies are dropped, then the remaining sections are trimmed from their ends
+so every section keeps its opening lines.
+
+Token counts are estimates: there is no tokenizer for the hosted models in
+this package, so words, numbers and symbols are counted the way a BPE
+vocabulary roughly splits them.
+"""
+import functools
+import logging
+import re
+import threading
+from collections import Counter, namedtuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_|\n")
+# An explicit "Page N (of M)" at the end of a line is always a page marker; a bare "N/M" or
+# "N of M" only when the rest of the line recurs with different numbers (a running footer),
+# since dates ("01/2019 - 03/2021") and grades ("GPA 3.8/4") end the same way
+_PAGE_MARKER = re.compile(r'\s*[-|,]?\s*page\s*\d+(?:\s*(?:of|/)\s*\d+)?\s*$', re.IGNORECASE)
+_PAGE_COUNTER = re.compile(r'\s*[-|,]?\s*(?<![\d./])(\d+)\s*(?:of|/)\s*\d+\s*$', re.IGNORECASE)
+_SEPARATOR_RUN = re.compile(r'([-_=*~.•·|])\1{3,}')
+_SPACES = re.compile(r' {2,}')
+_BOILERPLATE = re.compile(
+    r'^(?:page\s*\d+(?:\s*(?:of|/)\s*\d+)?|\d+\s*(?:of|/)\s*\d+|-\s*\d+\s*-|curriculum\s+vitae|r[eé]sum[eé]|confidential'
+    r'|references?\s+(?:are\s+)?(?:available\s+)?(?:up)?on\s+request\.?|i\s+hereby\s+declare\b.*'
+    r'|[-_=*~.•·|\s]*)$',
+    re.IGNORECASE,
+)
+
+# Short lines (job titles, dates) legitimately recur, so they only count as a running
+# header or footer when they carry a page number or appear on this many lines
+_SHORT_LINE = 80
+_SHORT_LINE_REPEATS = 3
+
+# Section headings and how much they are worth to the model (lowest are dropped first)
+CORE = 3
+SECTION_PRIORITIES = {
+    'references': 0, 'referees': 0, 'declaration': 0,
+    'personal details': 0, 'personal information': 0, 'personal data': 0,
+    'hobbies': 1, 'interests': 1, 'hobbies and interests': 1, 'activities': 1,
+    'extracurricular activities': 1,
+    'volunteering': 2, 'volunteer experience': 2, 'languages': 2, 'awards': 2, 'honors': 2,
+    'honours': 2, 'awards and honors': 2, 'publications': 2, 'certifications': 2,
+    'licenses and certifications': 2, 'courses': 2, 'training': 2,
+    'summary': CORE, 'professional summary': CORE, 'profile': CORE, 'about me': CORE, 'objective': CORE,
+    'experience': CORE, 'work experience': CORE, 'professional experience': CORE,
+    'employment history': CORE, 'work history': CORE, 'skills': CORE, 'technical skills': CORE,
+    'education': CORE, 'projects': CORE, 'achievements': CORE,
+}
+
+# Room kept for the note listing omitted sections
+_NOTE_TOKENS = 20
+
+CompressedResume = namedtuple('CompressedResume', ['text', 'tokens_before', 'tokens_after', 'dropped_sections'])
+
+def estimate_tokens(text):
+    """Estimate how many model tokens text costs.
+
+    Additive over lines: the estimate for lines joined by newlines is the sum
+    of the per-line estimates plus one per newline.
+    """
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text or ""):
+        if piece.isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif piece.isalpha():
+            tokens += 1 + (len(piece) - 1) // 6
+        else:
+            tokens += 1
+    return tokens
+
+def _heading_priority(line):
+    """Return the section priority if line is a known section heading, else None."""
+    if len(line) > 40:
+        return None
+    name = re.sub(r'[^a-z ]', '', line.lower().replace('&', ' and '))
+    return SECTION_PRIORITIES.get(' '.join(name.split()))
+
+def _clean_lines(text):
+    """Split into lines without separator runs, boilerplate or repeated lines."""
+    lines = []
+    for line in text.split('\n'):
+        line = _SPACES.sub(' ', _SEPARATOR_RUN.sub(' ', line)).strip()
+        if not _BOILERPLATE.match(line.lower()):
+            lines.append(line)
+
+    # Page numbers seen after each line prefix that ends in a bare counter
+    counters = {}
+    for line in lines:
+        match = _PAGE_COUNTER.search(line)
+        if match:
+            counters.setdefault(line[:match.start()].lower(), set()).add(match.group(1))
+
+    unpaged_lines = []
+    paged = set()
+    for line in lines:
+        unpaged = _PAGE_MARKER.sub('', line)
+        match = _PAGE_COUNTER.search(unpaged) if unpaged == line else None
+        if match and len(counters[line[:match.start()].lower()]) > 1:
+            unpaged = line[:match.start()]
+        if unpaged != line:
+            if not unpaged:
+                continue
+            line = unpaged
+            paged.add(line.lower())
+        unpaged_lines.append(line)
+    lines = unpaged_lines
+
+    counts = Counter(line.lower() for line in lines)
+    seen = set()
+    kept = []
+    for line in lines:
+        key = line.lower()
+        if key in seen and _heading_priority(line) is None and (
+                len(line) > _SHORT_LINE or key in paged or counts[key] >= _SHORT_LINE_REPEATS):
+            continue
+        seen.add(key)
+        kept.append(line)
+    return kept
+
+def _split_sections(lines):
+    """Group lines into [title, priority, lines] sections; text before the first heading is core."""
+    sections = [[None, CORE, []]]
+    for line in lines:
+        priority = _heading_priority(line)
+        if priority is not None:
+            sections.append([line, priority, [line]])
+        else:
+            sections[-1][2].append(line)
+    return [section for section in sections if section[2]]
+
+def _cut_line(line, budget):
+    """Cut one line at a word boundary so it fits in budget tokens."""
+    kept = []
+    used = 0
+    for word in line.split(' '):
+        used += estimate_tokens(word)
+        if used > budget:
+            break
+        kept.append(word)
+    return ' '.join(kept)
+
+def _fit_sections(sections, budget):
+    """Drop low-value sections, then trim the largest sections, until within budget.
+
+    Returns (lines, dropped section titles).
+    """
+    # Each line costs its tokens plus the newline joining it to the next
+    costs = [[estimate_tokens(line) + 1 for line in section[2]] for section in sections]
+    sections = [section + [line_costs, sum(line_costs)] for section, line_costs in zip(sections, costs)]
+    total = sum(section[4] for section in sections) - 1
+
+    dropped = []
+    # Lowest priority first; among equals, later sections go first
+    order = sorted(range(len(sections)), key=lambda i: (sections[i][1], -i))
+    for section in [sections[i] for i in order]:
+        if total <= budget or section[1] >= CORE:
+            break
+        sections = [s for s in sections if s is not section]
+        total -= section[4]
+        dropped.append(section[0])
+
+    while sections and total > budget:
+        largest = max(sections, key=lambda s: s[4])
+        if len(largest[2]) > 1:
+            largest[2].pop()
+            cost = largest[3].pop()
+            largest[4] -= cost
+            total -= cost
+            continue
+        if len(sections) > 1:
+            sections = [s for s in sections if s is not largest]
+            total -= largest[4]
+            continue
+        largest[2][0] = _cut_line(largest[2][0], budget)
+        break
+
+    return [line for section in sections for line in section[2]], dropped
+
+@functools.lru_cache(maxsize=256)
+def compress_resume(text, token_budget=None):
+    """Fit sanitized resume text into token_budget estimated tokens.
+
+    Returns a CompressedResume with the text and the before/after estimates.
+    A budget of 0 disables compression.
+    """
+    token_budget = Config.PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    tokens_before = estimate_tokens(text)
+    if not text or token_budget <= 0 or tokens_before <= token_budget:
+        return CompressedResume(text, tokens_before, tokens_before, ())
+
+    lines = _clean_lines(text)
+    compressed = "\n".join(lines)
+    dropped = []
+    if estimate_tokens(compressed) > token_budget:
+        lines, dropped = _fit_sections(_split_sections(lines), max(1, token_budget - _NOTE_TOKENS))
+        compressed = "\n".join(lines)
+        omitted = [title for title in dropped if title]
+        if omitted:
+            compressed += f"\n[Omitted to fit length: {', '.join(omitted)}]"
+
+    return CompressedResume(compressed, tokens_before, estimate_tokens(compressed), tuple(dropped))
+
+class PromptBudgetStats:
+    """Running totals of estimated resume tokens before and after compression."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.compressed = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.sections_dropped = 0
+
+    def record(self, result):
+        with self._lock:
+            self.prompts += 1
+            self.tokens_before += result.tokens_before
+            self.tokens_after += result.tokens_after
+            if result.tokens_after < result.tokens_before:
+                self.compressed += 1
+            self.sections_dropped += len(result.dropped_sections)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'budget': Config.PROMPT_TOKEN_BUDGET,
+                'prompts': self.prompts,
+                'compressed': self.compressed,
+                'tokens_before': self.tokens_before,
+                'tokens_after': self.tokens_after,
+                'saved_ratio': round(1 - self.tokens_after / self.tokens_before, 3) if self.tokens_before else 0.0,
+                'sections_dropped': self.sections_dropped,
+            }
+
+_stats = None
+_stats_lock = threading.Lock()
+
+def get_prompt_budget_stats():
+    """Return the process-wide compression counters shared by every roaster."""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = PromptBudgetStats()
+        return _stats
+
+def fit_resume(text):
+    """Compress resume text for a prompt, recording and logging the token counts."""
+    result = compress_resume(text)
+    get_prompt_budget_stats().record(result)
+    if result.tokens_after < result.tokens_before:
+        logger.info(f"Resume compressed from ~{result.tokens_before} to ~{result.tokens_after} tokens"
+                    + (f", dropped {len(result.dropped_sections)} sections" if result.dropped_sections else ""))
+    return result.text
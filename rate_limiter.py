@@ -0,0 +1,121 @@
+import hashlib
+import hmac
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from config import Config
+from sqlite_local import LocalConnection
+
+logger = logging.getLogger(__name__)
+
+# Buckets idle this long are full again and can be forgotten
+_STALE_SECONDS = 3600
+
+def client_key(remote_addr, api_key=None, api_keys=None):
+    """Identify a client by API key when it is one of API_KEYS, otherwise by IP address.
+    
+    Unknown keys are ignored; otherwise a client could send a fresh key with every
+    request and never run out of tokens.
+    """
+    api_keys = Config.API_KEYS if api_keys is None else api_keys
+    if api_key and _is_known_key(api_key, api_keys):
+        return 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]
+    return 'ip:' + (remote_addr or 'unknown')
+
+def _is_known_key(api_key, api_keys):
+    candidate = api_key.encode('utf-8', 'surrogateescape')
+    # Constant-time comparison, and no early exit, so timing does not reveal a key prefix
+    matches = [hmac.compare_digest(candidate, key.encode('utf-8')) for key in api_keys]
+    return any(matches)
+
+def _refill(tokens, updated_at, now, capacity, rate):
+    return min(capacity, tokens + (now - updated_at) * rate)
+
+class MemoryRateLimiter:
+    """Token buckets held in this process; each gunicorn worker counts separately."""
+    
+    backend = 'memory'
+    
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    def acquire(self, key, per_minute, cost=1):
+        """Take `cost` tokens from the bucket; return (allowed, retry_after_seconds)."""
+        capacity, rate = float(per_minute), per_minute / 60.0
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated_at, now, capacity, rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > 10000:
+                self._prune(now)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+    
+    def _prune(self, now):
+        stale = [key for key, (_, updated_at) in self._buckets.items() if now - updated_at > _STALE_SECONDS]
+        for key in stale:
+            del self._buckets[key]
+
+class SQLiteRateLimiter:
+    """Token buckets in a local SQLite file shared by every worker process."""
+    
+    backend = 'sqlite'
+    
+    def __init__(self, path=None):
+        self.path = path or Config.RATE_LIMIT_PATH
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode so the read-modify-write in acquire runs in one BEGIN IMMEDIATE
+        self._db = LocalConnection(self.path, timeout=1, synchronous='OFF', isolation_level=None)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL) WITHOUT ROWID"
+        )
+    
+    def _connect(self):
+        return self._db.get()
+    
+    def acquire(self, key, per_minute, cost=1):
+        """Take `cost` tokens from the bucket; return (allowed, retry_after_seconds)."""
+        capacity, rate = float(per_minute), per_minute / 60.0
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(row[0], row[1], now, capacity, rate) if row else capacity
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, tokens, now)
+            )
+            if random.random() < 0.001:
+                conn.execute("DELETE FROM buckets WHERE updated_at < ?", (now - _STALE_SECONDS,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+def create_rate_limiter(backend=None):
+    """Create the limiter selected by Config.RATE_LIMIT_BACKEND, or None if disabled."""
+    backend = (backend or Config.RATE_LIMIT_BACKEND).lower()
+    if backend == 'sqlite':
+        try:
+            return SQLiteRateLimiter()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Falling back to in-memory rate limiter: {str(e)}")
+            return MemoryRateLimiter()
+    if backend == 'memory':
+        return MemoryRateLimiter()
+    return None
@@ -0,0 +1,78 @@
+"""
+Retry, deadline and hedging helpers for upstream model calls.
+
+Transient provider errors (429, 5xx, dropped connections) are retried with
+full-jitter exponential backoff, but never past the caller's deadline.
+LatencyTracker keeps recent call latencies so slow calls can be hedged with
+a duplicate request once the p95 has elapsed.
+"""
+import random
+import threading
+from collections import deque
+from config import Config
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {'APIConnectionError', 'APITimeoutError', 'ConnectError', 'ReadTimeout', 'RemoteProtocolError'}
+
+class DeadlineExceededError(ValueError):
+    """Raised when a model call cannot finish within the request's deadline."""
+    
+    def __init__(self, message="The AI service did not respond in time"):
+        super().__init__(message)
+
+def is_retryable(e):
+    """True for upstream errors worth another attempt."""
+    status = getattr(e, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return type(e).__name__ in RETRYABLE_ERROR_NAMES or isinstance(e, (ConnectionError, TimeoutError))
+
+def retry_after_seconds(e):
+    """Return the provider's Retry-After hint from an error response, if any."""
+    response = getattr(e, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+class RetryPolicy:
+    """How many times to try an upstream call and how long to wait in between."""
+    
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None):
+        self.max_attempts = max_attempts or Config.UPSTREAM_MAX_ATTEMPTS
+        self.base_delay = Config.UPSTREAM_RETRY_BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = Config.UPSTREAM_RETRY_MAX_DELAY if max_delay is None else max_delay
+    
+    def should_retry(self, attempt, error):
+        return attempt < self.max_attempts and is_retryable(error)
+    
+    def delay(self, attempt, error=None):
+        """Full-jitter backoff for the wait after the given (1-based) attempt."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        hint = retry_after_seconds(error) if error is not None else None
+        if hint is not None:
+            delay = max(delay, min(hint, self.max_delay))
+        return delay
+
+class LatencyTracker:
+    """Sliding window of recent call latencies."""
+    
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+    
+    def percentile(self, q, min_samples=1):
+        """Return the q-th percentile (0-100), or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))
+        return samples[index]
@@ -0,0 +1,32 @@
+"""
+Per-thread SQLite connections for the on-disk stores (response and extraction
+caches, jobs, rate limits, output length stats).
+
+A SQLite connection must not be shared between threads or carried across a
+fork (gunicorn --preload opens the stores before forking its workers), so
+every thread gets its own connection and reopens it in a new process.
+"""
+import os
+import sqlite3
+import threading
+
+class LocalConnection:
+    """WAL-mode connections to one database file, one per thread and per process."""
+    
+    def __init__(self, path, timeout=5, synchronous='NORMAL', isolation_level=''):
+        self.path = path
+        self.timeout = timeout
+        self.synchronous = synchronous
+        self.isolation_level = isolation_level
+        self._local = threading.local()
+    
+    def get(self):
+        """Return this thread's connection, opening it on first use and after a fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=self.isolation_level)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
@@ -1,10 +1,10 @@
 import streamlit as st
 import os
 from groq import Groq
-import PyPDF2
-import docx
 from io import BytesIO
 import time
+from extraction import get_extraction_pool
+from file_processor import allowed_file
 
 # Page config
 st.set_page_config(
@@ -79,30 +79,6 @@ def get_groq_client():
         st.stop()
     return Groq(api_key=api_key)
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from PDF file."""
-    try:
-        reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
-    except Exception as e:
-        st.error(f"Error reading PDF: {str(e)}")
-        return ""
-
-def extract_text_from_docx(docx_file):
-    """Extract text from DOCX file."""
-    try:
-        doc = docx.Document(docx_file)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text.strip()
-    except Exception as e:
-        st.error(f"Error reading DOCX: {str(e)}")
-        return ""
-
 def generate_roast(client, resume_text, roast_type):
     """Generate roast using Groq API."""
     prompts = {
@@ -242,18 +218,17 @@ def main():
     
     # Process uploaded file
     if uploaded_file is not None:
-        file_type = uploaded_file.type
-        
-        if file_type == "application/pdf":
-            resume_text = extract_text_from_pdf(uploaded_file)
-        elif file_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            resume_text = extract_text_from_docx(uploaded_file)
-        elif file_type == "text/plain":
-            resume_text = str(uploaded_file.read(), "utf-8")
-        else:
+        if not allowed_file(uploaded_file.name):
             st.error("Unsupported file type!")
             return
         
+        # Extract on the shared process pool so a bad file cannot hang the app
+        try:
+            resume_text = get_extraction_pool().extract(uploaded_file.name, uploaded_file.getvalue())
+        except ValueError as e:
+            st.error(f"Error reading file: {str(e)}")
+            resume_text = ""
+        
         st.session_state.resume_text = resume_text
         
         if resume_text:
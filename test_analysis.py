@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the combined roast + suggestions response
+"""
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from ai_service import ResumeRoaster, parse_analysis
+from breaker import CircuitBreaker
+from cache import MemoryCache
+from config import Config
+from governor import ConcurrencyGovernor
+from token_policy import OutputLengthPolicy
+
+RESUME = 'Software Developer with 3 years experience in Python and JavaScript. Worked at ABC Company.'
+
+class FakeCompletions:
+    """Stands in for client.chat.completions, answering every call with the same text."""
+    
+    def __init__(self, content, delay=0.0):
+        self.content = content
+        self.delay = delay
+        self.calls = 0
+        self.timeouts = []
+    
+    def create(self, **kwargs):
+        self.calls += 1
+        self.timeouts.append(kwargs.get('timeout'))
+        time.sleep(self.delay)
+        choice = SimpleNamespace(message=SimpleNamespace(content=self.content), finish_reason='stop')
+        return SimpleNamespace(choices=[choice], usage=SimpleNamespace(prompt_tokens=100, completion_tokens=50))
+
+@pytest.fixture
+def make_roaster(monkeypatch):
+    """Build a roaster on a fake model with its own cache, governor, breaker and in-memory length stats."""
+    monkeypatch.setattr(Config, 'GROQ_API_KEY', Config.GROQ_API_KEY or 'test')
+    
+    def make(content, delay=0.0):
+        roaster = ResumeRoaster(cache=MemoryCache(), governor=ConcurrencyGovernor(), breaker=CircuitBreaker(),
+                                output_policy=OutputLengthPolicy(path=''))
+        completions = FakeCompletions(content, delay)
+        roaster.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        return roaster, completions
+    return make
+
+def test_parse_both_markers():
+    assert parse_analysis("===ROAST===\nNice try.\n===SUGGESTIONS===\nAdd numbers.") == ('Nice try.', 'Add numbers.')
+
+def test_parse_without_roast_marker():
+    """Text before the suggestions marker is the roast when the ROAST marker is missing."""
+    assert parse_analysis("Nice try.\n\n## ===SUGGESTIONS===\nAdd numbers.") == ('Nice try.', 'Add numbers.')
+
+def test_parse_without_any_marker():
+    assert parse_analysis("Nice try.") == ('Nice try.', None)
+    assert parse_analysis("") == (None, None)
+
+def test_parse_suggestions_only():
+    assert parse_analysis("===SUGGESTIONS===\nAdd numbers.") == (None, 'Add numbers.')
+
+def test_analysis_without_roast_marker_is_served_and_cached(make_roaster):
+    roaster, completions = make_roaster("Nice try.\n===SUGGESTIONS===\nAdd numbers.")
+    for _ in range(2):
+        assert roaster.generate_analysis(RESUME) == {'roast': 'Nice try.', 'suggestions': 'Add numbers.'}
+    assert completions.calls == 1
+
+def test_analysis_without_roast_is_not_cached(make_roaster):
+    """A response with no roast fails the request, and a retry goes back to the model."""
+    roaster, completions = make_roaster("===SUGGESTIONS===\nAdd numbers.")
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            roaster.generate_analysis(RESUME)
+    assert completions.calls == 2
+
+def test_missing_suggestions_are_requested_within_the_same_deadline(make_roaster):
+    roaster, completions = make_roaster("===ROAST===\nNice try.", delay=0.2)
+    result = roaster.generate_analysis(RESUME, timeout=5)
+    assert result['roast'] == 'Nice try.'
+    assert completions.calls == 2
+    # The follow-up call only gets what the first one left of the 5 seconds
+    assert completions.timeouts[1] <= 5 - 0.2
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
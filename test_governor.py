@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for the upstream concurrency governor
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from governor import ConcurrencyGovernor, UpstreamOverloadedError, patient_calls
+
+def _run_calls(patient, calls=10):
+    """Start `calls` 50ms calls at once against a governor with 2 slots and a queue of 1."""
+    governor = ConcurrencyGovernor(initial_limit=2, min_limit=1, max_limit=2, max_queue=1, queue_timeout=0.1)
+    results = []
+    
+    def call():
+        try:
+            if patient:
+                with patient_calls(), governor.slot(timeout=5):
+                    time.sleep(0.05)
+            else:
+                with governor.slot(timeout=5):
+                    time.sleep(0.05)
+            results.append('ok')
+        except UpstreamOverloadedError:
+            results.append('shed')
+    
+    threads = [threading.Thread(target=call) for _ in range(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_excess_calls_are_shed():
+    assert 'shed' in _run_calls(patient=False)
+
+def test_patient_calls_wait_instead_of_being_shed():
+    """Batch and bulk calls queue until their deadline."""
+    assert _run_calls(patient=True) == ['ok'] * 10
+
+if __name__ == "__main__":
+    test_excess_calls_are_shed()
+    test_patient_calls_wait_instead_of_being_shed()
+    print("✅ Governor tests passed")
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for fitting resume text into the prompt token budget
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from prompt_budget import compress_resume, estimate_tokens
+
+RESUME = "\n".join([
+    "Jane Doe",
+    "EXPERIENCE",
+    "Senior Engineer, Acme Corp 01/2019 - 03/2021",
+    "Engineer, Initech 2 of 3 teams migrated",
+    "EDUCATION",
+    "BSc Computer Science, GPA 3.8/4",
+    "Grade 17/20",
+])
+
+def test_text_within_budget_is_untouched():
+    text = RESUME + "\nPage 1 of 2"
+    result = compress_resume(text, estimate_tokens(text))
+    assert result.text == text
+    assert result.tokens_after == result.tokens_before
+
+def test_date_ranges_and_grades_survive_cleaning():
+    """Trailing "N/M" and "N of M" are kept unless they number pages."""
+    filler = "\n".join(f"Led project {i} delivering measurable results for customers" for i in range(40))
+    text = RESUME + "\n" + filler
+    result = compress_resume(text, estimate_tokens(text) - 5)
+    for line in ("Senior Engineer, Acme Corp 01/2019 - 03/2021", "BSc Computer Science, GPA 3.8/4",
+                 "Grade 17/20", "Engineer, Initech 2 of 3 teams migrated"):
+        assert line in result.text.split("\n")
+
+def test_page_markers_are_removed():
+    pages = [f"Led project {i} delivering measurable results for customers" for i in range(40)]
+    text = "\n".join(pages[:20] + ["Page 1 of 2", "Jane Doe - Resume 1/2"]
+                     + pages[20:] + ["Page 2 of 2", "Jane Doe - Resume 2/2"])
+    result = compress_resume(text, estimate_tokens(text) - 5)
+    lines = result.text.split("\n")
+    assert "Jane Doe - Resume" in lines
+    assert not any("Page" in line or line.endswith("/2") for line in lines)
+
+if __name__ == "__main__":
+    test_text_within_budget_is_untouched()
+    test_date_ranges_and_grades_survive_cleaning()
+    test_page_markers_are_removed()
+    print("✅ Prompt budget tests passed")
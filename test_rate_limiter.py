@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Tests for per-client rate limiting
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from rate_limiter import MemoryRateLimiter, client_key
+
+API_KEYS = ['team-a-key', 'team-b-key']
+
+def test_known_key_gets_its_own_bucket():
+    """A configured API key is keyed by the key, not the address it comes from."""
+    assert client_key('10.0.0.1', 'team-a-key', API_KEYS) == client_key('10.0.0.2', 'team-a-key', API_KEYS)
+    assert client_key('10.0.0.1', 'team-a-key', API_KEYS) != client_key('10.0.0.1', 'team-b-key', API_KEYS)
+    assert client_key('10.0.0.1', 'team-a-key', API_KEYS).startswith('key:')
+
+def test_unknown_key_falls_back_to_ip():
+    """Keys that are not configured are ignored."""
+    assert client_key('10.0.0.1', 'made-up', API_KEYS) == 'ip:10.0.0.1'
+    assert client_key('10.0.0.1', 'team-a-key', []) == 'ip:10.0.0.1'
+    assert client_key('10.0.0.1', None, API_KEYS) == 'ip:10.0.0.1'
+
+def test_rotating_keys_do_not_bypass_the_limit():
+    """A client sending a fresh X-API-Key on every request still runs out of tokens."""
+    limiter = MemoryRateLimiter()
+    results = [limiter.acquire(f"roast:{client_key('10.0.0.1', f'rotating-{i}', API_KEYS)}", 3)[0]
+               for i in range(5)]
+    assert results == [True, True, True, False, False]
+
+if __name__ == "__main__":
+    test_known_key_gets_its_own_bucket()
+    test_unknown_key_falls_back_to_ip()
+    test_rotating_keys_do_not_bypass_the_limit()
+    print("✅ Rate limiter tests passed")
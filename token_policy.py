@@ -0,0 +1,195 @@
+"""
+Adaptive max_tokens per operation and roast type.
+
+A single global MAX_TOKENS makes a short gentle roast reserve the same
+generation budget as a long improvement report. OutputLengthPolicy records
+the reported completion length of every finished call, keyed by model,
+operation and roast type, and reserves the recent p99 length plus headroom
+instead, never more than the configured budget. Outputs cut off at
+max_tokens push the key back to the full budget. Streamed calls report no
+usage, so only their truncations (exactly max_tokens long) are recorded.
+Samples are persisted in SQLite so every worker, and the next deploy,
+starts from the same distribution.
+
+GROQ_MODEL_OVERRIDES optionally routes an operation to another model, e.g.
+"roast:gentle=llama-3.1-8b-instant,improve=llama3-70b-8192".
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque, namedtuple
+from config import Config
+from sqlite_local import LocalConnection
+
+logger = logging.getLogger(__name__)
+
+# Share of recent outputs allowed to hit max_tokens before a key reverts to the full budget
+_MAX_TRUNCATION_RATE = 0.01
+# How often samples written by other workers are read back
+_REFRESH_SECONDS = 30
+
+OutputBudget = namedtuple('OutputBudget', ['model', 'max_tokens', 'key'])
+
+def parse_model_overrides(value):
+    """Parse "operation[:roast_type]=model,..." into a dict."""
+    overrides = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            target, model = item.split('=', 1)
+            if target.strip() and model.strip():
+                overrides[target.strip()] = model.strip()
+    return overrides
+
+class OutputLengthPolicy:
+    """Chooses the model and max_tokens for a call from observed output lengths."""
+    
+    def __init__(self, path=None, window=None, min_samples=None, percentile=None, headroom=None):
+        self.path = Config.OUTPUT_STATS_PATH if path is None else path
+        self.window = window or Config.ADAPTIVE_MAX_TOKENS_WINDOW
+        self.min_samples = min_samples or Config.ADAPTIVE_MAX_TOKENS_MIN_SAMPLES
+        self.percentile = percentile or Config.ADAPTIVE_MAX_TOKENS_PERCENTILE
+        self.headroom = headroom or Config.ADAPTIVE_MAX_TOKENS_HEADROOM
+        self.enabled = Config.ADAPTIVE_MAX_TOKENS
+        self.overrides = parse_model_overrides(Config.GROQ_MODEL_OVERRIDES)
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._chosen = {}
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._db = LocalConnection(self.path)
+        if self.path:
+            try:
+                directory = os.path.dirname(self.path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory, exist_ok=True)
+                with self._connect() as conn:
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS output_lengths (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            key TEXT NOT NULL,
+                            tokens INTEGER NOT NULL,
+                            truncated INTEGER NOT NULL,
+                            pid INTEGER NOT NULL,
+                            created_at REAL NOT NULL
+                        )
+                    """)
+                    conn.execute("CREATE INDEX IF NOT EXISTS output_lengths_key ON output_lengths (key, id)")
+                self._load(own_rows=True)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Output length stats kept in memory only: {str(e)}")
+                self.path = None
+    
+    def _connect(self):
+        return self._db.get()
+    
+    def choose(self, operation, roast_type=None, default_max_tokens=None):
+        """Return the OutputBudget (model, max_tokens, stats key) for one call."""
+        model = (self.overrides.get(f"{operation}:{roast_type}") or self.overrides.get(operation)
+                 or Config.GROQ_MODEL)
+        key = f"{model}/{operation}" + (f":{roast_type}" if roast_type else "")
+        default_max_tokens = default_max_tokens or Config.MAX_TOKENS
+        max_tokens = self._max_tokens(key, default_max_tokens) if self.enabled else default_max_tokens
+        with self._lock:
+            self._chosen[key] = max_tokens
+        return OutputBudget(model, max_tokens, key)
+    
+    def _max_tokens(self, key, default_max_tokens):
+        self._refresh()
+        with self._lock:
+            samples = list(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return default_max_tokens
+        if sum(1 for _, truncated in samples if truncated) > len(samples) * _MAX_TRUNCATION_RATE:
+            return default_max_tokens
+        
+        lengths = sorted(tokens for tokens, _ in samples)
+        index = min(len(lengths) - 1, int(math.ceil(self.percentile / 100.0 * len(lengths))) - 1)
+        wanted = math.ceil(lengths[max(0, index)] * self.headroom)
+        return max(min(Config.ADAPTIVE_MAX_TOKENS_MIN, default_max_tokens), min(default_max_tokens, wanted))
+    
+    def record(self, key, completion_tokens, truncated=False):
+        """Add the length of one finished completion to the key's distribution."""
+        if not key or not completion_tokens:
+            return
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append((completion_tokens, bool(truncated)))
+        if not self.path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO output_lengths (key, tokens, truncated, pid, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, completion_tokens, int(bool(truncated)), os.getpid(), time.time())
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Output length sample not saved: {str(e)}")
+    
+    def _refresh(self):
+        """Pick up samples other workers saved since the last refresh."""
+        if not self.path:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._refreshed_at < _REFRESH_SECONDS:
+                return
+            self._refreshed_at = now
+        try:
+            self._load()
+            self._prune()
+        except sqlite3.Error as e:
+            logger.warning(f"Output length stats refresh failed: {str(e)}")
+    
+    def _load(self, own_rows=False):
+        query = "SELECT id, key, tokens, truncated FROM output_lengths WHERE id > ?"
+        params = [self._last_id]
+        if not own_rows:
+            # This process's samples were added to memory when they were recorded
+            query += " AND pid != ?"
+            params.append(os.getpid())
+        rows = self._connect().execute(query + " ORDER BY id", params).fetchall()
+        with self._lock:
+            for row_id, key, tokens, truncated in rows:
+                self._samples.setdefault(key, deque(maxlen=self.window)).append((tokens, bool(truncated)))
+                self._last_id = max(self._last_id, row_id)
+    
+    def _prune(self):
+        """Keep only the newest window samples per key on disk."""
+        with self._connect() as conn:
+            keys = [row[0] for row in conn.execute("SELECT DISTINCT key FROM output_lengths")]
+            for key in keys:
+                conn.execute(
+                    "DELETE FROM output_lengths WHERE key = ? AND id IN "
+                    "(SELECT id FROM output_lengths WHERE key = ? ORDER BY id DESC LIMIT -1 OFFSET ?)",
+                    (key, key, self.window)
+                )
+    
+    def stats(self):
+        """Return the output length distribution and current max_tokens per key."""
+        with self._lock:
+            snapshot = {key: list(samples) for key, samples in self._samples.items()}
+            chosen = dict(self._chosen)
+        stats = {}
+        for key, samples in sorted(snapshot.items()):
+            lengths = sorted(tokens for tokens, _ in samples)
+            stats[key] = {
+                'samples': len(lengths),
+                'p50': lengths[len(lengths) // 2],
+                'p99': lengths[min(len(lengths) - 1, int(math.ceil(0.99 * len(lengths))) - 1)],
+                'truncated': sum(1 for _, truncated in samples if truncated),
+                'max_tokens': chosen.get(key),
+            }
+        return {'enabled': self.enabled, 'keys': stats}
+
+_policy = None
+_policy_lock = threading.Lock()
+
+def get_output_policy():
+    """Return the process-wide output length policy shared by every roaster."""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = OutputLengthPolicy()
+        return _policy
@@ -0,0 +1,385 @@
+"""
+Request tracing.
+
+Each tracked request starts a trace whose root span covers the whole
+request. The upload parsing, extraction pool, file_processor and roasters
+open a child span per stage under whichever span is current (a context
+variable, so fan-out threads that copy the context nest correctly).
+Extraction worker processes capture their spans and send them back with
+the text, so parsing shows up under the request that uploaded the file.
+
+Finished traces go into a per-process ring buffer served by /debug/traces.
+Requests slower than TRACE_SLOW_SECONDS are also kept in a separate buffer,
+so a burst of fast requests cannot push them out. They are logged with
+their stage breakdown and always written to TRACE_EXPORT_PATH, if set;
+faster requests are written at TRACE_SAMPLE_RATE. The export file holds one
+OTLP/JSON export request per line, as read by the OpenTelemetry
+collector's otlpjsonfile receiver.
+
+Outside a trace (tracing disabled, background jobs) spans are no-ops.
+"""
+import contextvars
+import functools
+import hmac
+import inspect
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from config import Config
+from utils import SharedRotatingFileHandler, get_request_id
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = 'resume-roaster'
+
+class Span:
+    """One timed stage of a request."""
+    
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'start_ns', 'end_ns', 'error')
+    
+    def __init__(self, name, trace_id, parent_id=None, attributes=None, start_ns=None, span_id=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id or f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.error = None
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def end(self, error=None, end_ns=None):
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+        if error is not None and self.error is None:
+            self.error = str(error) or type(error).__name__
+    
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'attributes': dict(self.attributes),
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'error': self.error,
+        }
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+class Trace:
+    """The spans of one request; spans that end after the request has finished are dropped."""
+    
+    def __init__(self, name, request_id=None, **attributes):
+        self.trace_id = uuid.uuid4().hex
+        self.request_id = request_id
+        self.root = Span(name, self.trace_id, attributes=attributes)
+        self.finished = False
+        self._spans = [self.root]
+        # Extraction and hedge threads add spans alongside the request thread
+        self._lock = threading.Lock()
+    
+    def add(self, span):
+        with self._lock:
+            if not self.finished:
+                self._spans.append(span)
+    
+    def finish(self, error=None):
+        """End the root span; return False if the trace was already finished."""
+        with self._lock:
+            if self.finished:
+                return False
+            self.finished = True
+        self.root.end(error)
+        return True
+    
+    @property
+    def spans(self):
+        with self._lock:
+            return sorted(self._spans, key=lambda span: span.start_ns)
+    
+    @property
+    def duration_seconds(self):
+        return self.root.duration_ms / 1000
+    
+    def breakdown(self):
+        """Top-level stages and their milliseconds, e.g. "extract 812ms, llm 11020ms"."""
+        return ", ".join(f"{span.name} {span.duration_ms:.0f}ms" for span in self.spans
+                         if span.parent_id == self.root.span_id)
+    
+    def to_dict(self, spans=True):
+        summary = {
+            'trace_id': self.trace_id,
+            'request_id': self.request_id,
+            'name': self.root.name,
+            'start': datetime.fromtimestamp(self.root.start_ns / 1e9, timezone.utc).isoformat(timespec='milliseconds'),
+            'duration_ms': round(self.root.duration_ms, 1),
+            'status': self.root.attributes.get('http.status_code'),
+            'error': self.root.error,
+        }
+        if spans:
+            summary['spans'] = [dict(span.to_dict(), offset_ms=round((span.start_ns - self.root.start_ns) / 1e6, 1),
+                                     duration_ms=round(span.duration_ms, 1)) for span in self.spans]
+        return summary
+    
+    def to_otlp(self):
+        """The trace as an OTLP/JSON ExportTraceServiceRequest."""
+        spans = []
+        for span in self.spans:
+            attributes = dict(span.attributes, request_id=self.request_id) if span is self.root else span.attributes
+            entry = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                # SERVER for the request, INTERNAL for its stages
+                'kind': 2 if span is self.root else 1,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns or span.start_ns),
+                'attributes': [{'key': key, 'value': _otlp_value(value)}
+                               for key, value in attributes.items() if value is not None],
+                'status': {'code': 2, 'message': span.error} if span.error else {},
+            }
+            if span.parent_id:
+                entry['parentSpanId'] = span.parent_id
+            spans.append(entry)
+        return {'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}},
+                {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}},
+            ]},
+            'scopeSpans': [{'scope': {'name': 'resume_roaster.tracing'}, 'spans': spans}],
+        }]}
+
+class TraceBuffer:
+    """Recent and slow traces of this process, plus the optional OTLP file export."""
+    
+    def __init__(self, size=None, slow_size=None, slow_seconds=None, sample_rate=None, export_path=None):
+        self.recent = deque(maxlen=size or Config.TRACE_BUFFER_SIZE)
+        self.slow = deque(maxlen=slow_size or Config.TRACE_SLOW_BUFFER_SIZE)
+        self.slow_seconds = Config.TRACE_SLOW_SECONDS if slow_seconds is None else slow_seconds
+        self.sample_rate = Config.TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.export_path = Config.TRACE_EXPORT_PATH if export_path is None else export_path
+        self._exporter = None
+        self._exporter_pid = None
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.slow_recorded = 0
+        self.exported = 0
+        self.export_errors = 0
+    
+    def record(self, trace):
+        slow = 0 < self.slow_seconds <= trace.duration_seconds
+        with self._lock:
+            self.recent.append(trace)
+            self.recorded += 1
+            if slow:
+                self.slow.append(trace)
+                self.slow_recorded += 1
+        
+        if slow:
+            logger.warning(f"Slow request {trace.root.name} took {trace.duration_seconds:.2f}s: {trace.breakdown()}",
+                           extra={'trace_id': trace.trace_id})
+        if self.export_path and (slow or random.random() < self.sample_rate):
+            self._export(trace)
+    
+    def _export(self, trace):
+        try:
+            with self._lock:
+                # Each process (and each forked worker) opens its own descriptors
+                if self._exporter_pid != os.getpid():
+                    self._exporter = SharedRotatingFileHandler(self.export_path, Config.LOG_MAX_BYTES,
+                                                               Config.LOG_BACKUP_COUNT)
+                    self._exporter_pid = os.getpid()
+                exporter = self._exporter
+            exporter.write((json.dumps(trace.to_otlp(), separators=(',', ':')) + '\n').encode('utf-8'))
+            with self._lock:
+                self.exported += 1
+        except (OSError, ValueError, TypeError) as e:
+            with self._lock:
+                self.export_errors += 1
+            logger.warning(f"Could not export trace {trace.trace_id}: {str(e)}")
+    
+    def list(self, slow=False, limit=None):
+        """Trace summaries, newest first."""
+        with self._lock:
+            traces = list(self.slow if slow else self.recent)
+        traces.reverse()
+        return [trace.to_dict(spans=False) for trace in traces[:limit]]
+    
+    def find(self, trace_or_request_id):
+        with self._lock:
+            traces = list(self.recent) + list(self.slow)
+        for trace in reversed(traces):
+            if trace_or_request_id in (trace.trace_id, trace.request_id):
+                return trace
+        return None
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'recorded': self.recorded,
+                'slow': self.slow_recorded,
+                'exported': self.exported,
+                'export_errors': self.export_errors,
+                'slow_seconds': self.slow_seconds,
+            }
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def get_trace_buffer():
+    """Return the process-wide trace buffer."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = TraceBuffer()
+        return _buffer
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+_current_span = contextvars.ContextVar('span', default=None)
+
+def start_trace(name, **attributes):
+    """Start tracing the request being handled as name; None stops tracing in this context."""
+    trace = Trace(name, get_request_id(), **attributes) if Config.TRACING_ENABLED and name is not None else None
+    _current_trace.set(trace)
+    _current_span.set(trace.root if trace is not None else None)
+    return trace
+
+def current_trace():
+    return _current_trace.get()
+
+def finish_trace(trace, status=None, error=None):
+    """End a trace and hand it to the buffer; later calls do nothing."""
+    if trace is None:
+        return
+    if status is not None:
+        trace.root.set(**{'http.status_code': status})
+    if trace.finish(error):
+        get_trace_buffer().record(trace)
+
+@contextmanager
+def span(name, **attributes):
+    """Time the enclosed block as a child of the current span; yields the Span or None.
+    
+    The block must not span a generator's yields, which may resume in another context.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, trace.trace_id, parent.span_id if parent is not None else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.end(error=e)
+        raise
+    finally:
+        current.end()
+        _current_span.reset(token)
+        trace.add(current)
+
+def traced(name):
+    """Decorator running every call of a plain or async function in a span called name."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def set_attributes(**attributes):
+    """Add attributes to the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+def add_span(name, start_ns, end_ns, **attributes):
+    """Record a stage that was timed elsewhere as a child of the current span."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    parent = _current_span.get()
+    recorded = Span(name, trace.trace_id, parent.span_id if parent is not None else None, attributes, start_ns)
+    recorded.end(end_ns=end_ns)
+    trace.add(recorded)
+
+@contextmanager
+def capture():
+    """Collect the spans opened inside the block as dicts, for attach() in another process."""
+    captured = []
+    if not Config.TRACING_ENABLED:
+        yield captured
+        return
+    trace = Trace('capture')
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    try:
+        yield captured
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        for recorded in trace.spans[1:]:
+            data = recorded.to_dict()
+            if data['parent_id'] == trace.root.span_id:
+                data['parent_id'] = None
+            captured.append(data)
+
+def attach(spans):
+    """Add spans from capture() under the current span."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    parent = _current_span.get()
+    for data in spans:
+        recorded = Span(data['name'], trace.trace_id, data['parent_id'] or (parent.span_id if parent else None),
+                        data['attributes'], data['start_ns'], data['span_id'])
+        recorded.end(data['error'], data['end_ns'])
+        trace.add(recorded)
+
+def debug_allowed(token):
+    """Whether /debug/traces may answer: in debug mode, or with the configured X-Debug-Token."""
+    if not Config.TRACING_ENABLED:
+        return False
+    if Config.TRACE_DEBUG_TOKEN:
+        return token is not None and hmac.compare_digest(token, Config.TRACE_DEBUG_TOKEN)
+    return Config.DEBUG
+
+def debug_view(trace_id=None, slow=False, limit=50):
+    """Body and status code for /debug/traces (summaries) or /debug/traces/<trace or request id>."""
+    buffer = get_trace_buffer()
+    if trace_id:
+        trace = buffer.find(trace_id)
+        if trace is None:
+            return {'error': 'Trace not found'}, 404
+        return trace.to_dict(), 200
+    return {'process': os.getpid(), 'stats': buffer.stats(), 'traces': buffer.list(slow, limit)}, 200
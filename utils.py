@@ -1,36 +1,288 @@
+import atexit
+import contextlib
+import contextvars
+import copy
+import functools
+import inspect
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+import metrics
+from config import Config
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no file locking, fine for the single-process dev server
+    fcntl = None
+
+# Id of the request being handled, stamped on every log record it emits
+_request_id = contextvars.ContextVar('request_id', default=None)
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+def new_request_id(incoming=None):
+    """Start a request: reuse a well-formed incoming X-Request-ID or make one, and return it."""
+    request_id = incoming if incoming and _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    return request_id
+
+def get_request_id():
+    """Return the id of the request being handled, or None outside a request."""
+    return _request_id.get()
+
+# Attributes every LogRecord has; anything else was passed in extra= and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line with the request id and any extra= fields."""
+    
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """The classic single-line format with the request id added."""
+    
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s')
+    
+    def format(self, record):
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = '-'
+        return super().format(record)
+
+class SharedRotatingFileHandler(logging.Handler):
+    """Size-rotated log file that several worker processes can append to.
+    
+    Every write and rotation happens under an exclusive lock on PATH.lock, and
+    a process finding the file rotated by another reopens it, so lines are
+    never interleaved and a full file is rotated exactly once.
+    """
+    
+    def __init__(self, path, max_bytes, backup_count):
+        super().__init__()
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._stream = None
+        self._lock_file = None
+        self.reopen()
+    
+    def reopen(self):
+        """Open fresh file descriptors; a forked child must not share the parent's lock."""
+        self.close_files()
+        self._lock_file = open(self.path + '.lock', 'a')
+        self._stream = open(self.path, 'ab')
+    
+    def close_files(self):
+        for f in (self._stream, self._lock_file):
+            if f is not None:
+                f.close()
+        self._stream = self._lock_file = None
+    
+    @contextlib.contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+    
+    def _rotate(self):
+        self._stream.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+            self._stream = open(self.path, 'ab')
+        else:
+            self._stream = open(self.path, 'wb')
+    
+    def emit(self, record):
+        try:
+            self.write((self.format(record) + '\n').encode('utf-8'))
+        except Exception:
+            self.handleError(record)
+    
+    def write(self, line):
+        """Append one line of bytes, rotating first if it would overflow the file."""
+        with self.lock, self._locked():
+            # Another process may have rotated the file since our last write
+            try:
+                moved = os.stat(self.path).st_ino != os.fstat(self._stream.fileno()).st_ino
+            except FileNotFoundError:
+                moved = True
+            if moved:
+                self._stream.close()
+                self._stream = open(self.path, 'ab')
+            size = os.fstat(self._stream.fileno()).st_size
+            if self.max_bytes > 0 and size > 0 and size + len(line) > self.max_bytes:
+                self._rotate()
+            self._stream.write(line)
+            self._stream.flush()
+    
+    def close(self):
+        with self.lock:
+            self.close_files()
+        super().close()
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the listener thread; drops (and counts) them if the queue is full."""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        # Runs on the logging thread: capture its request id and render what cannot cross threads
+        record = copy.copy(record)
+        record.request_id = _request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_logging_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+
+def _restart_after_fork():
+    """The listener thread does not survive fork (gunicorn --preload); start a new one."""
+    global _listener, _logging_lock
+    _logging_lock = threading.Lock()
+    if _listener is None:
+        return
+    log_queue = queue.Queue(Config.LOG_QUEUE_SIZE)
+    for handler in _listener.handlers:
+        if isinstance(handler, SharedRotatingFileHandler):
+            handler.reopen()
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _logging_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def logging_stats():
+    return {
+        'queued': _queue_handler.queue.qsize() if _queue_handler else 0,
+        'dropped': _queue_handler.dropped if _queue_handler else 0,
+    }
 
 def setup_logging():
-    """Setup logging configuration."""
-    
-    # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-    
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(f'logs/app_{datetime.now().strftime("%Y%m%d")}.log'),
-            logging.StreamHandler()
-        ]
-    )
+    """Route all logging through a queue to a listener thread that formats and writes it.
+    
+    Request threads only enqueue records; JSON (or text) formatting, the console
+    and the size-rotated LOG_FILE are handled by the listener.
+    """
+    global _queue_handler, _listener
+    
+    with _logging_lock:
+        if _listener is None:
+            formatter = JSONFormatter() if Config.LOG_FORMAT == 'json' else TextFormatter()
+            handlers = [logging.StreamHandler()]
+            if Config.LOG_FILE:
+                handlers.append(SharedRotatingFileHandler(Config.LOG_FILE, Config.LOG_MAX_BYTES,
+                                                          Config.LOG_BACKUP_COUNT))
+            for handler in handlers:
+                handler.setFormatter(formatter)
+            
+            log_queue = queue.Queue(Config.LOG_QUEUE_SIZE)
+            _queue_handler = NonBlockingQueueHandler(log_queue)
+            _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+            _listener.start()
+            
+            root = logging.getLogger()
+            root.setLevel(Config.LOG_LEVEL)
+            root.addHandler(_queue_handler)
+            atexit.register(stop_logging)
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=_restart_after_fork)
     
     return logging.getLogger(__name__)
 
+def _request_timings(start_time):
+    """Total milliseconds so far plus the stage timings recorded for the request."""
+    timings = {'duration_ms': round((time.perf_counter() - start_time) * 1000, 1)}
+    request_metrics = metrics.current()
+    if request_metrics is not None and request_metrics.stages:
+        stages = dict(request_metrics.stages)
+        timings['stages_ms'] = {stage: round(seconds * 1000, 1) for stage, seconds in stages.items()}
+    return timings
+
 def log_request(func):
-    """Decorator to log requests."""
+    """Decorator to log requests with their duration; works on plain and async handlers."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            logger = logging.getLogger(__name__)
+            logger.info(f"Request to {func.__name__} started")
+            start_time = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+                timings = _request_timings(start_time)
+                logger.info(f"Request to {func.__name__} completed successfully in {timings['duration_ms']:.0f}ms",
+                            extra=timings)
+                return result
+            except Exception as e:
+                logger.error(f"Request to {func.__name__} failed: {str(e)}", extra=_request_timings(start_time))
+                raise
+        return async_wrapper
+    
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         logger = logging.getLogger(__name__)
         logger.info(f"Request to {func.__name__} started")
+        start_time = time.perf_counter()
         try:
             result = func(*args, **kwargs)
-            logger.info(f"Request to {func.__name__} completed successfully")
+            timings = _request_timings(start_time)
+            logger.info(f"Request to {func.__name__} completed successfully in {timings['duration_ms']:.0f}ms",
+                        extra=timings)
             return result
         except Exception as e:
-            logger.error(f"Request to {func.__name__} failed: {str(e)}")
+            logger.error(f"Request to {func.__name__} failed: {str(e)}", extra=_request_timings(start_time))
             raise
     return wrapper